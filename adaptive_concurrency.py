@@ -0,0 +1,158 @@
+import math
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import List, Optional
+
+# Responses that mean the server wants us to slow down
+THROTTLE_STATUSES = (429, 503)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def retry_after_seconds(headers) -> Optional[float]:
+    """Delay requested by a ``Retry-After`` header (seconds or HTTP date), if any"""
+    value = headers.get('Retry-After') if headers is not None else None
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveConcurrency:
+    """AIMD controller for the number of requests in flight.
+
+    Latencies are collected in windows of at least ``window`` responses (or one
+    response per slot, whichever is more). At the end of a window the limit
+    grows by one if it was fully used, p95 latency stayed within
+    ``latency_tolerance`` of the best p95 seen, and 5xx errors stayed rare.
+    Rising latency shrinks it gently, and a 429, 503 or timeout cuts it by
+    ``backoff`` at once - but only once per round trip, so a burst of throttled
+    responses to requests that were already in flight counts as one signal.
+    ``Retry-After`` pauses new requests until the server's deadline.
+    """
+
+    def __init__(self, initial: int = 8, min_limit: int = 1, max_limit: int = 64, window: int = 20,
+                 latency_tolerance: float = 1.5, max_error_rate: float = 0.05, backoff: float = 0.5):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.window = window
+        self.latency_tolerance = latency_tolerance
+        self.max_error_rate = max_error_rate
+        self.backoff = backoff
+
+        self.in_flight = 0
+        self.peak_limit = int(self.limit)
+        self.baseline_p95: Optional[float] = None
+        self.last_p95 = 1.0
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.throttled = 0
+        self._reset_window()
+        self.lock = threading.Lock()
+
+    def _reset_window(self):
+        self.samples: List[float] = []
+        self.errors = 0
+        self.saturated = False
+
+    @property
+    def current_limit(self) -> int:
+        return int(self.limit)
+
+    def pause_remaining(self) -> float:
+        """Seconds left before new requests may start (``Retry-After``)"""
+        return max(0.0, self.paused_until - time.monotonic())
+
+    def try_acquire(self) -> bool:
+        """Take a slot if fewer than ``current_limit`` requests are in flight"""
+        with self.lock:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            if self.in_flight >= int(self.limit):
+                self.saturated = True
+            return True
+
+    def acquire(self, cancelled: Optional[threading.Event] = None, poll: float = 0.02) -> bool:
+        """Blocking slot for requests made outside a FetchEngine, after any ``Retry-After`` pause.
+
+        Gives up (returning False) once ``cancelled`` is set.
+        """
+        while cancelled is None or not cancelled.is_set():
+            pause = self.pause_remaining()
+            if pause > 0:
+                time.sleep(min(pause, poll) if cancelled else pause)
+            elif self.try_acquire():
+                return True
+            else:
+                time.sleep(poll)
+        return False
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def observe(self, latency: float, status: Optional[int] = None, timed_out: bool = False,
+                retry_after: Optional[float] = None):
+        """Feed one finished request into the controller"""
+        with self.lock:
+            now = time.monotonic()
+            if retry_after:
+                self.paused_until = max(self.paused_until, now + retry_after)
+
+            if timed_out or status in THROTTLE_STATUSES:
+                self.throttled += 1
+                # Requests sent before the last cut were sent under the old limit
+                if now - self.last_decrease >= self.last_p95:
+                    self._decrease(now, self.backoff)
+                return
+
+            if status is not None and status >= 500:
+                self.errors += 1
+            self.samples.append(latency)
+            if len(self.samples) >= max(self.window, int(self.limit)):
+                self._end_window(now)
+
+    def _decrease(self, now: float, factor: float):
+        self.limit = max(float(self.min_limit), self.limit * factor)
+        self.last_decrease = now
+        self._reset_window()
+
+    def _end_window(self, now: float):
+        p95 = percentile(self.samples, 95)
+        error_rate = self.errors / len(self.samples)
+        self.last_p95 = p95
+
+        if self.baseline_p95 is None:
+            self.baseline_p95 = p95
+        elif error_rate > self.max_error_rate:
+            self._decrease(now, 0.75)
+            return
+        elif p95 > self.baseline_p95 * self.latency_tolerance:
+            # Latency is queueing up; let the baseline creep up in case the server just got slower
+            self.baseline_p95 *= 1.05
+            self._decrease(now, 0.9)
+            return
+        else:
+            self.baseline_p95 = min(self.baseline_p95, p95)
+
+        if self.saturated and error_rate <= self.max_error_rate:
+            self.limit = min(float(self.max_limit), self.limit + 1)
+            self.peak_limit = max(self.peak_limit, int(self.limit))
+        self._reset_window()
+
+    def describe(self) -> str:
+        p95 = f'{self.last_p95 * 1000:.0f}ms' if self.baseline_p95 is not None else 'n/a'
+        return f'{self.current_limit} in flight (peak {self.peak_limit}, p95 {p95}, throttled {self.throttled})'
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the shared content cleaner.
+
+Runs the original per-extractor clean_content implementations and the
+precompiled ContentCleaner profiles over every chapter in a folder, checks
+that both produce identical output, and reports the speedup. Each chapter is
+cleaned as-is and with typical ad/boilerplate markup spliced in.
+
+Usage: python benchmark_cleaning.py [chapters_folder] [repeats]
+"""
+
+import os
+import re
+import sys
+import time
+
+from content_cleaner import FIXED_CLEANER, MISSING_CLEANER
+
+AD_SNIPPETS = [
+    '<script async src="https://pagead2.googlesyndication.com/pagead/js/adsbygoogle.js" crossorigin="anonymous"></script>',
+    '<ins class="adsbygoogle" data-ad-client="ca-pub-1" data-ad-slot="2"></ins>',
+    '(adsbygoogle = window.adsbygoogle || []).push({});',
+    'Report chapter  \t  bad translation',
+    'Words:2345  Update:2023/01/05  12:30:45',
+]
+
+
+def legacy_fixed_clean(content):
+    """clean_content from fixed_extractor.py before the shared cleaner"""
+    unwanted_patterns = [
+        r'Remember the mobile version:.*',
+        r'<script.*?</script>',
+        r'<ins.*?</ins>',
+        r'adsbygoogle',
+        r'googlesyndication',
+        r'data-ad-.*?=".*?"',
+        r'crossorigin="anonymous"',
+    ]
+    for pattern in unwanted_patterns:
+        content = re.sub(pattern, '', content, flags=re.DOTALL | re.IGNORECASE)
+    content = re.sub(r'\n\s*\n\s*\n+', '\n\n', content)
+    content = re.sub(r'[ \t]+', ' ', content)
+    return content.strip()
+
+
+def legacy_missing_clean(content):
+    """clean_content from single_chapter_missing_extract.py before the shared cleaner"""
+    content = re.sub(r'<script[^>]*>.*?</script>', '', content, flags=re.DOTALL | re.IGNORECASE)
+    content = re.sub(r'<ins[^>]*>.*?</ins>', '', content, flags=re.DOTALL | re.IGNORECASE)
+    unwanted_patterns = [
+        r'adsbygoogle.*?push\(\{\}\);',
+        r'pagead2\.googlesyndication\.com.*',
+        r'data-ad-[^=]*="[^"]*"',
+        r'crossorigin="anonymous"',
+        r'async=""',
+        r'Report.*?bad translation',
+        r'Select text and click.*Report.*',
+        r'Words:\d+.*?Update:\d+/\d+/\d+.*?\d+:\d+:\d+',
+    ]
+    for pattern in unwanted_patterns:
+        content = re.sub(pattern, '', content, flags=re.DOTALL | re.IGNORECASE)
+    content = re.sub(r'\n\s*\n\s*\n+', '\n\n', content)
+    content = re.sub(r'[ \t]+', ' ', content)
+    return content.strip()
+
+
+def load_inputs(folder):
+    inputs = []
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith('.txt'):
+            continue
+        with open(os.path.join(folder, name), encoding='utf-8') as f:
+            body = f.read().split('\n', 2)[-1]
+        inputs.append(body)
+        # Same chapter with ads, tabs and extra blank lines spliced between paragraphs
+        paragraphs = body.split('\n\n')
+        for i, snippet in enumerate(AD_SNIPPETS):
+            position = (i + 1) * len(paragraphs) // (len(AD_SNIPPETS) + 1)
+            paragraphs.insert(position, snippet + '\n\n\t')
+        inputs.append('\n\n'.join(paragraphs))
+    return inputs
+
+
+def time_cleaner(clean, inputs, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        outputs = [clean(text) for text in inputs]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, outputs
+
+
+def main():
+    folder = sys.argv[1] if len(sys.argv) >= 2 else 'Extracted_Chapters_Fixed'
+    repeats = int(sys.argv[2]) if len(sys.argv) >= 3 else 3
+
+    print("🐉 Dragon Talisman - Content Cleaning Benchmark")
+    print("=" * 60)
+
+    inputs = load_inputs(folder)
+    if not inputs:
+        print(f"❌ No chapter files found in {folder}")
+        return
+    print(f"📄 {len(inputs)} inputs from {folder}, best of {repeats} runs\n")
+
+    identical = True
+    for label, legacy, cleaner in (('fixed', legacy_fixed_clean, FIXED_CLEANER),
+                                   ('missing', legacy_missing_clean, MISSING_CLEANER)):
+        legacy_time, legacy_outputs = time_cleaner(legacy, inputs, repeats)
+        new_time, new_outputs = time_cleaner(cleaner.clean, inputs, repeats)
+        mismatches = sum(1 for a, b in zip(legacy_outputs, new_outputs) if a != b)
+        identical = identical and mismatches == 0
+
+        print(f"🧹 {label} profile")
+        print(f"   legacy:  {legacy_time * 1000:8.1f} ms ({legacy_time / len(inputs) * 1e6:.0f} µs/chapter)")
+        print(f"   shared:  {new_time * 1000:8.1f} ms ({new_time / len(inputs) * 1e6:.0f} µs/chapter)")
+        print(f"   speedup: {legacy_time / new_time:.1f}x | mismatched outputs: {mismatches}")
+
+    print("\n" + ("✅ Outputs are identical" if identical else "❌ Outputs differ from the legacy cleaners"))
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
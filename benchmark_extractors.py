@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of the extractors against a local replay server.
+
+Recorded pages (Html_Cache, or pages rebuilt from Extracted_Chapters_Fixed when
+nothing is recorded) are served by replay_server.ReplayServer with configurable
+latency, jitter, stalls, 500 errors and 429 throttling; --mirror adds a second
+server with a different page layout for the hedged mirror requests of the
+fixed and pipelined extractors. Each extractor runs in its own
+process with a throw-away output folder, and chapters/sec, per-chapter latency
+percentiles (per page request), peak RSS and CPU time are reported. Every run is appended to
+benchmark_results.jsonl and compared with the last run of the same settings,
+so regressions between versions show up.
+
+Usage: python benchmark_extractors.py [--chapters 200] [--latency 0.05] [--error-rate 0.02] ...
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from adaptive_concurrency import percentile
+from mirror_fetch import Source
+from replay_server import ReplayServer, load_recorded_pages, synthesize_pages
+
+EXTRACTORS = ('fixed', 'pipelined', 'missing')
+RESULTS_FILE = 'benchmark_results.jsonl'
+# Layout of the stand-in mirror's pages, which the primary's containers do not match
+MIRROR_CONTAINER = 'class="chapter-text"'
+
+
+def build_extractor(kind, base_url, output_folder, workers, rate, streaming=False, mirrors=None):
+    if kind == 'missing':
+        from single_chapter_missing_extract import MissingChapterExtractor
+        return MissingChapterExtractor(base_url=base_url, output_folder=output_folder, max_in_flight=workers,
+                                       requests_per_second=rate, use_cache=False)
+    if kind == 'pipelined':
+        from pipeline_extractor import PipelinedExtractor
+        return PipelinedExtractor(base_url=base_url, output_folder=output_folder, max_workers=workers,
+                                  requests_per_second=rate, use_cache=False, streaming=streaming, mirrors=mirrors)
+    from fixed_extractor import FixedChapterExtractor
+    return FixedChapterExtractor(base_url=base_url, output_folder=output_folder, max_workers=workers,
+                                 requests_per_second=rate, use_cache=False, streaming=streaming, mirrors=mirrors)
+
+
+def run_extractor(kind, base_url, chapters, workers, rate, streaming, results, mirror_url=None):
+    """Child process: run one extractor over the chapters and report its numbers"""
+    work_dir = tempfile.mkdtemp(prefix='extractor_benchmark_')
+    try:
+        latencies = []
+        with redirect_stdout(io.StringIO()):
+            mirrors = [Source('mirror', mirror_url + '/book/{chapter}', ['.chapter-text'])] if mirror_url else None
+            extractor = build_extractor(kind, base_url, os.path.join(work_dir, 'Extracted_Chapters_Fixed'),
+                                        workers, rate, streaming, mirrors)
+            # Injected failures should be retried within the benchmark, not 30s later
+            extractor.manifest.backoff_base = 0.25
+            extractor.manifest.backoff_max = 2.0
+
+            # Every extractor fetches through fetch_page, so that is where request latency is taken
+            fetch_page = extractor.fetch_page
+
+            def timed_fetch(chapter_num, *args):
+                start = time.perf_counter()
+                try:
+                    return fetch_page(chapter_num, *args)
+                finally:
+                    latencies.append(time.perf_counter() - start)
+
+            extractor.fetch_page = timed_fetch
+
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+            if kind == 'missing':
+                extractor.extract_missing_chapters(chapters)
+            else:
+                extractor.extract_chapters_parallel(chapters[0], chapters[-1], resume=False)
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+
+        completed = len(extractor.manifest.completed(chapters))
+        extractor.manifest.close()
+        hedger = getattr(extractor, 'hedger', None)
+
+        peak_rss_mb = None
+        if resource:
+            children = resource.getrusage(resource.RUSAGE_CHILDREN)
+            cpu += children.ru_utime + children.ru_stime
+            # ru_maxrss is in kilobytes on Linux and bytes on macOS
+            scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+            peak_rss_mb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, children.ru_maxrss) / scale
+
+        results.put({
+            'chapters': len(chapters),
+            'completed': completed,
+            'seconds': round(wall, 3),
+            'chapters_per_second': round(completed / wall, 2) if wall else 0.0,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+            'p95_ms': round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+            'p99_ms': round(percentile(latencies, 99) * 1000, 1) if latencies else None,
+            'requests': len(latencies),
+            'cpu_seconds': round(cpu, 3),
+            'peak_rss_mb': round(peak_rss_mb, 1) if peak_rss_mb is not None else None,
+            'hedged': hedger.hedges if hedger else None,
+            'mirror_wins': hedger.wins.get('mirror', 0) if hedger else None,
+        })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def previous_run(results_file, config):
+    """Most recent stored run with the same settings"""
+    if not os.path.exists(results_file):
+        return None
+    previous = None
+    with open(results_file, encoding='utf-8') as f:
+        for line in f:
+            try:
+                run = json.loads(line)
+            except ValueError:
+                continue
+            if run.get('config') == config:
+                previous = run
+    return previous
+
+
+def change(new, old):
+    if new is None or not old:
+        return ''
+    return f' ({(new - old) / old * 100:+.0f}%)'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the extractors against a local replay server')
+    parser.add_argument('--pages', default='Html_Cache', help='HTML cache folder with recorded pages')
+    parser.add_argument('--chapters-folder', default='Extracted_Chapters_Fixed',
+                        help='chapter files to rebuild pages from when nothing is recorded')
+    parser.add_argument('--chapters', type=int, default=200, help='number of chapters to extract')
+    parser.add_argument('--extractors', default=','.join(EXTRACTORS), help=f'comma-separated: {", ".join(EXTRACTORS)}')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=0, help='requests/sec per host (0 = unlimited)')
+    parser.add_argument('--latency', type=float, default=0.05, help='server latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.02, help='+/- latency jitter in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 500')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='fraction of requests answered with 429')
+    parser.add_argument('--stall-rate', type=float, default=0.0,
+                        help='fraction of primary requests held for --stall-seconds first')
+    parser.add_argument('--stall-seconds', type=float, default=5.0)
+    parser.add_argument('--mirror', action='store_true',
+                        help='fixed/pipelined: hedge slow requests to a second local server with another layout')
+    parser.add_argument('--streaming', action='store_true',
+                        help='fixed/pipelined: stop each download once the content container has closed')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--results', default=RESULTS_FILE, help='JSON lines file the results are appended to')
+    args = parser.parse_args()
+
+    print("🐉 Dragon Talisman - Extractor Benchmark (local replay server)")
+    print("=" * 60)
+
+    pages = load_recorded_pages(args.pages)
+    source = args.pages
+    if len(pages) < args.chapters and os.path.isdir(args.chapters_folder):
+        pages = synthesize_pages(args.chapters_folder, limit=args.chapters)
+        source = f'{args.chapters_folder} (rebuilt pages)'
+    if not pages:
+        print(f"❌ No pages found in {args.pages} or {args.chapters_folder}")
+        return
+
+    chapters = sorted(pages)[:args.chapters]
+    # The fixed extractors take a contiguous range, so stop at the first gap
+    chapters = [chapter_num for i, chapter_num in enumerate(chapters) if chapter_num == chapters[0] + i]
+    extractors = [kind.strip() for kind in args.extractors.split(',') if kind.strip() in EXTRACTORS]
+
+    config = {
+        'chapters': len(chapters), 'workers': args.workers, 'rate': args.rate, 'latency': args.latency,
+        'jitter': args.jitter, 'error_rate': args.error_rate, 'throttle_rate': args.throttle_rate,
+        'streaming': args.streaming,
+    }
+    # Only recorded when used, so earlier runs without them still count as the same settings
+    if args.stall_rate:
+        config.update(stall_rate=args.stall_rate, stall_seconds=args.stall_seconds)
+    if args.mirror:
+        config['mirror'] = True
+    print(f"📄 Chapters {chapters[0]}-{chapters[-1]} from {source}")
+    print(f"🌐 Latency {args.latency * 1000:.0f}±{args.jitter * 1000:.0f}ms, "
+          f"{args.error_rate:.0%} errors, {args.throttle_rate:.0%} throttled, {args.workers} workers")
+    if args.stall_rate:
+        print(f"🐢 {args.stall_rate:.0%} of requests stall for {args.stall_seconds:g}s")
+    if args.mirror:
+        print("🪞 Slow requests are hedged to a mirror server (fixed and pipelined)")
+    print()
+    mirror_pages = ({num: page.replace(b'id="showReading"', MIRROR_CONTAINER.encode('ascii'), 1)
+                     for num, page in pages.items()} if args.mirror else None)
+
+    previous = previous_run(args.results, config)
+    run = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'revision': git_revision(), 'config': config,
+           'results': {}}
+
+    context = multiprocessing.get_context('spawn')
+    print(f"{'extractor':<11}{'ch/s':>8}{'done':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'CPU s':>8}{'RSS MB':>8}")
+    for kind in extractors:
+        mirror = None
+        if mirror_pages and kind != 'missing':
+            mirror = ReplayServer(mirror_pages, latency=args.latency, jitter=args.jitter, seed=args.seed + 1).start()
+        with ReplayServer(pages, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                          throttle_rate=args.throttle_rate, seed=args.seed, stall_rate=args.stall_rate,
+                          stall_seconds=args.stall_seconds) as server:
+            results = context.Queue()
+            process = context.Process(target=run_extractor,
+                                      args=(kind, f'{server.url}/s/Dragon-Talisman', chapters, args.workers,
+                                            args.rate, args.streaming, results, mirror.url if mirror else None))
+            process.start()
+            while True:
+                try:
+                    result = results.get(timeout=1)
+                    break
+                except queue.Empty:
+                    if not process.is_alive():
+                        raise RuntimeError(f'{kind} benchmark exited with code {process.exitcode}')
+            process.join()
+            result['server_responses'] = {str(status): count for status, count in sorted(server.counts.items())}
+        if mirror:
+            mirror.stop()
+
+        run['results'][kind] = result
+        rss = f"{result['peak_rss_mb']:.0f}" if result['peak_rss_mb'] is not None else 'n/a'
+        print(f"{kind:<11}{result['chapters_per_second']:>8.1f}{result['completed']:>5}/{result['chapters']:<3}"
+              f"{result['p50_ms']:>8.0f}{result['p95_ms']:>9.0f}{result['p99_ms']:>9.0f}"
+              f"{result['cpu_seconds']:>8.1f}{rss:>8}"
+              + (f"   {result['hedged']} hedged, {result['mirror_wins']} won by the mirror" if mirror else ""))
+
+    with open(args.results, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(run) + '\n')
+    print(f"\n💾 Results appended to {args.results}")
+
+    if previous:
+        print(f"📈 Compared with {previous.get('revision') or 'previous run'} ({previous['timestamp']}):")
+        for kind, result in run['results'].items():
+            old = previous['results'].get(kind)
+            if old:
+                print(f"   {kind:<10} ch/s {result['chapters_per_second']:.1f}"
+                      f"{change(result['chapters_per_second'], old['chapters_per_second'])}, "
+                      f"p95 {result['p95_ms']:.0f}ms{change(result['p95_ms'], old['p95_ms'])}, "
+                      f"CPU {result['cpu_seconds']:.1f}s{change(result['cpu_seconds'], old['cpu_seconds'])}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n🛑 Benchmark interrupted by user")
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Compare the HTML parser backends on saved chapter pages.
+
+Pages are read from the raw HTML cache (Html_Cache/objects) or from any folder
+of .html files. Each backend parses every page, reads the title and the first
+content container, and is timed; its output is checked against html.parser.
+
+Usage: python benchmark_parsers.py [pages_folder] [repeats]
+"""
+
+import os
+import sys
+import time
+
+from parser_backends import CONTAINERS, available_backends, parse_page
+
+BASELINE = 'html.parser'
+
+
+def load_pages(folder):
+    pages = []
+    for root, _, files in os.walk(folder):
+        for name in sorted(files):
+            if name.endswith('.html'):
+                with open(os.path.join(root, name), 'rb') as f:
+                    pages.append(f.read())
+    return pages
+
+
+def extract(html, backend):
+    page = parse_page(html, backend)
+    container = page.first_container(CONTAINERS)
+    return page.title, container.sentences if container else None
+
+
+def benchmark(pages, backend, repeats):
+    outputs = []
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        outputs = [extract(html, backend) for html in pages]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, outputs
+
+
+def main():
+    folder = sys.argv[1] if len(sys.argv) >= 2 else os.path.join('Html_Cache', 'objects')
+    repeats = int(sys.argv[2]) if len(sys.argv) >= 3 else 3
+
+    print("🐉 Dragon Talisman - Parser Backend Benchmark")
+    print("=" * 60)
+
+    pages = load_pages(folder)
+    if not pages:
+        print(f"❌ No .html pages found in {folder}. Run an extraction first to fill the cache.")
+        return
+
+    total_bytes = sum(len(html) for html in pages)
+    print(f"📄 {len(pages)} pages ({total_bytes / 1024 / 1024:.1f} MB), best of {repeats} runs")
+    print(f"🔧 Backends: {', '.join(available_backends())}\n")
+
+    baseline_time, baseline = benchmark(pages, BASELINE, repeats)
+
+    print(f"{'backend':<15}{'ms/page':>10}{'pages/s':>10}{'speedup':>10}{'matches':>12}")
+    for backend in available_backends():
+        if backend == BASELINE:
+            elapsed, outputs = baseline_time, baseline
+        else:
+            elapsed, outputs = benchmark(pages, backend, repeats)
+        matches = sum(1 for a, b in zip(outputs, baseline) if a == b)
+        print(f"{backend:<15}{elapsed / len(pages) * 1000:>10.2f}{len(pages) / elapsed:>10.1f}"
+              f"{baseline_time / elapsed:>9.1f}x{matches:>7}/{len(pages)}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n🛑 Benchmark interrupted by user")
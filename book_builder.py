@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Assemble the chapters into an EPUB and single-file text/HTML books.
+
+Each book chapter comes from True_Refining when it has been refined, and
+otherwise from its raw chapter(s) in Extracted_Chapters_Fixed (refined N is
+raw N+3, or whatever chapter_alignment.json says). Every chapter is rendered
+to an XHTML document once and cached, deflated, under Book_Cache/ by the hash
+of its text; a rebuild after editing one chapter only renders that chapter
+and copies the cached compressed bytes of all the others straight into the
+EPUB. The ZIP container is written as a stream, one entry at a time, so the
+whole book is never held in memory.
+
+Usage:
+    python book_builder.py                             # Book/Dragon_Talisman.epub, .html and .txt
+    python book_builder.py --formats epub --end 100    # chapters 1-100 only
+    python book_builder.py --refined-only              # skip chapters that are not refined yet
+"""
+
+import argparse
+import hashlib
+import html
+import os
+import re
+import struct
+import time
+import uuid
+import zlib
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from chapter_alignment import RESULT_FILE as ALIGNMENT_FILE, load_raw_mapping, raw_chapters_for
+from run_manifest import CHAPTER_FILE_PATTERN
+
+BOOK_TITLE = 'Dragon Talisman'
+BOOK_FOLDER = 'Book'
+CACHE_FOLDER = 'Book_Cache'
+# Bump when the XHTML layout changes, so every cached chapter is rendered again
+RENDER_VERSION = 1
+FORMATS = ('epub', 'html', 'txt')
+
+RAW_TITLE = re.compile(r'^chapter\s+\d+\s*[:\-–]?\s*', re.IGNORECASE)
+SCENE_BREAK = re.compile(r'^(?:-{3,}|\*{3,}|(?:\* ){2,}\*)$')
+# Characters that are not allowed anywhere in an XML document
+NOT_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+STYLESHEET = """body { font-family: serif; line-height: 1.5; margin: 0 5%; }
+h2 { text-align: center; margin: 2em 0 1em; }
+p { text-indent: 1.5em; margin: 0 0 0.6em; }
+hr { border: none; text-align: center; margin: 1.5em 0; }
+hr:after { content: "* * *"; }
+"""
+
+# Local file header, central directory entry and end of central directory records
+LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+CENTRAL_ENTRY = struct.Struct('<IHHHHHHIIIHHHHHII')
+END_RECORD = struct.Struct('<IHHHHIIH')
+# Every entry is dated 1980-01-01 00:00, so unchanged chapters give identical bytes
+DOS_TIME, DOS_DATE = 0, (1 << 5) | 1
+STORED, DEFLATED = 0, 8
+
+
+class BookChapter:
+    __slots__ = ('number', 'title', 'body', 'source', 'digest')
+
+    def __init__(self, number: int, title: str, body: str, source: str):
+        self.number = number
+        self.title = title
+        self.body = body
+        self.source = source
+        # Render cache key: anything that changes the chapter's XHTML changes this
+        key = f'{RENDER_VERSION}\n{number}\n{title}\n{body}'
+        self.digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    @property
+    def file_name(self) -> str:
+        return f'chapter_{self.number:04d}.xhtml'
+
+
+def read_chapter_file(path: str) -> Optional[Tuple[str, str]]:
+    """``(title, body)`` of a chapter file, with or without a ``===`` underline and BOM"""
+    try:
+        with open(path, encoding='utf-8-sig') as f:
+            text = f.read()
+    except OSError:
+        return None
+    title, _, rest = text.partition('\n')
+    body = rest.split('\n', 1)[-1] if rest.startswith('=') else rest
+    return title.strip(), body.strip()
+
+
+def chapter_numbers(folder: str) -> List[int]:
+    if not os.path.isdir(folder):
+        return []
+    return sorted(int(match.group(1)) for match in map(CHAPTER_FILE_PATTERN.match, os.listdir(folder)) if match)
+
+
+def collect_chapters(refined_folder: str = 'True_Refining', raw_folder: str = 'Extracted_Chapters_Fixed',
+                     start: int = 1, end: Optional[int] = None, refined_only: bool = False,
+                     alignment_path: str = ALIGNMENT_FILE) -> Tuple[List[BookChapter], List[int]]:
+    """Book chapters in order, and the chapter numbers that have no source at all"""
+    refined = set(chapter_numbers(refined_folder))
+    mapping, offset = load_raw_mapping(alignment_path)
+    if end is None:
+        raw_numbers = chapter_numbers(raw_folder)
+        last_raw = max(raw_numbers) - offset if raw_numbers and not refined_only else 0
+        end = max(max(refined, default=0), last_raw)
+
+    chapters, missing = [], []
+    for number in range(start, end + 1):
+        if number in refined:
+            title, body = read_chapter_file(os.path.join(refined_folder, f'Chapter_{number:03d}.txt'))
+            chapters.append(BookChapter(number, title, body, 'refined'))
+            continue
+        raw_nums = raw_chapters_for(number, mapping, offset)
+        parts = [read_chapter_file(os.path.join(raw_folder, f'Chapter_{raw_num:03d}.txt')) for raw_num in raw_nums]
+        if refined_only or not all(parts):
+            missing.append(number)
+            continue
+        # Raw titles carry the raw number ("Chapter 504"); keep any name but use the book's number
+        name = RAW_TITLE.sub('', parts[0][0])
+        title = f'Chapter {number}: {name}' if name else f'Chapter {number}'
+        chapters.append(BookChapter(number, title, '\n\n'.join(body for _, body in parts),
+                                    'raw ' + ', '.join(f'{raw_num:03d}' for raw_num in raw_nums)))
+    return chapters, missing
+
+
+def render_section(chapter: BookChapter) -> str:
+    """The chapter as an HTML ``<section>``, shared by the EPUB and the single-file HTML"""
+    lines = [f'<section class="chapter" id="chapter-{chapter.number}">',
+             f'<h2>{html.escape(NOT_XML.sub("", chapter.title))}</h2>']
+    for line in chapter.body.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if SCENE_BREAK.match(line):
+            lines.append('<hr/>')
+        else:
+            lines.append(f'<p>{html.escape(NOT_XML.sub("", line), quote=False)}</p>')
+    lines.append('</section>')
+    return '\n'.join(lines)
+
+
+def render_xhtml(chapter: BookChapter) -> str:
+    return (f'<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n'
+            f'<html xmlns="http://www.w3.org/1999/xhtml" lang="en" xml:lang="en">\n'
+            f'<head>\n<title>{html.escape(NOT_XML.sub("", chapter.title))}</title>\n'
+            f'<link rel="stylesheet" type="text/css" href="style.css"/>\n</head>\n'
+            f'<body>\n{render_section(chapter)}\n</body>\n</html>\n')
+
+
+def deflate(data: bytes) -> bytes:
+    """Raw deflate stream, as stored in a ZIP entry"""
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+class RenderCache:
+    """Rendered chapter XHTML, deflated, in ``Book_Cache/<sha[:2]>/<sha>.z`` keyed by ``BookChapter.digest``.
+
+    Each file holds the CRC-32 and size of the XHTML followed by its raw
+    deflate stream, which is exactly what a ZIP entry needs.
+    """
+
+    HEADER = struct.Struct('<II')
+
+    def __init__(self, cache_folder: str = CACHE_FOLDER):
+        self.cache_folder = cache_folder
+        # Digests rendered or found in the cache during this build
+        self.rendered = set()
+        self.reused = set()
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.cache_folder, digest[:2], digest + '.z')
+
+    def get(self, chapter: BookChapter) -> Tuple[int, int, bytes]:
+        """``(crc32, size, deflated XHTML)`` of a chapter, rendering it only if its text is new"""
+        path = self._path(chapter.digest)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            crc, size = self.HEADER.unpack_from(data)
+            self.reused.add(chapter.digest)
+            return crc, size, data[self.HEADER.size:]
+        except (OSError, struct.error):
+            pass
+
+        xhtml = render_xhtml(chapter).encode('utf-8')
+        crc, size, compressed = zlib.crc32(xhtml), len(xhtml), deflate(xhtml)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self.HEADER.pack(crc, size) + compressed)
+        os.replace(tmp_path, path)
+        self.rendered.add(chapter.digest)
+        return crc, size, compressed
+
+    def section(self, chapter: BookChapter) -> str:
+        """The chapter's ``<section>``, inflated back out of the cached XHTML"""
+        _, _, compressed = self.get(chapter)
+        xhtml = zlib.decompress(compressed, -15).decode('utf-8')
+        return xhtml[xhtml.index('<section'):xhtml.rindex('</section>') + len('</section>')]
+
+    def prune(self, live: List[str]) -> int:
+        """Delete cached chapters whose text no longer exists"""
+        keep = {digest + '.z' for digest in live}
+        removed = 0
+        for root, _, names in os.walk(self.cache_folder):
+            for name in names:
+                if name not in keep:
+                    os.remove(os.path.join(root, name))
+                    removed += 1
+        return removed
+
+
+class ZipStreamWriter:
+    """Writes a ZIP file front to back: each entry goes out as soon as it is added.
+
+    Entries can be added already deflated (``add_deflated``), which is how
+    cached chapters are copied in without being compressed again.
+    """
+
+    def __init__(self, f: BinaryIO):
+        self.f = f
+        self.offset = 0
+        self.central: List[bytes] = []
+
+    def _write(self, data: bytes):
+        self.f.write(data)
+        self.offset += len(data)
+
+    def add_deflated(self, name: str, crc: int, size: int, compressed: bytes, method: int = DEFLATED):
+        encoded = name.encode('utf-8')
+        self.central.append(CENTRAL_ENTRY.pack(0x02014b50, 20, 20, 0x800, method, DOS_TIME, DOS_DATE, crc,
+                                               len(compressed), size, len(encoded), 0, 0, 0, 0, 0, self.offset)
+                            + encoded)
+        self._write(LOCAL_HEADER.pack(0x04034b50, 20, 0x800, method, DOS_TIME, DOS_DATE, crc, len(compressed),
+                                      size, len(encoded), 0) + encoded)
+        self._write(compressed)
+
+    def add(self, name: str, data: bytes, compress: bool = True):
+        if compress:
+            self.add_deflated(name, zlib.crc32(data), len(data), deflate(data))
+        else:
+            self.add_deflated(name, zlib.crc32(data), len(data), data, STORED)
+
+    def close(self):
+        directory = b''.join(self.central)
+        start = self.offset
+        self._write(directory)
+        self._write(END_RECORD.pack(0x06054b50, 0, 0, len(self.central), len(self.central), len(directory),
+                                    start, 0))
+
+
+def _package_files(chapters: List[BookChapter], book_id: str) -> Dict[str, str]:
+    """container.xml, the package document and both tables of contents"""
+    modified = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+    title = html.escape(BOOK_TITLE)
+    container = ('<?xml version="1.0" encoding="utf-8"?>\n'
+                 '<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">\n'
+                 '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>'
+                 '</rootfiles>\n</container>\n')
+
+    manifest = ['<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>',
+                '<item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>',
+                '<item id="css" href="style.css" media-type="text/css"/>']
+    spine, nav, ncx = [], [], []
+    for position, chapter in enumerate(chapters, 1):
+        item_id = f'c{chapter.number}'
+        chapter_title = html.escape(NOT_XML.sub('', chapter.title))
+        manifest.append(f'<item id="{item_id}" href="{chapter.file_name}" media-type="application/xhtml+xml"/>')
+        spine.append(f'<itemref idref="{item_id}"/>')
+        nav.append(f'<li><a href="{chapter.file_name}">{chapter_title}</a></li>')
+        ncx.append(f'<navPoint id="n{chapter.number}" playOrder="{position}"><navLabel><text>{chapter_title}'
+                   f'</text></navLabel><content src="{chapter.file_name}"/></navPoint>')
+
+    opf = ('<?xml version="1.0" encoding="utf-8"?>\n'
+           '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id">\n'
+           '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">\n'
+           f'<dc:identifier id="book-id">urn:uuid:{book_id}</dc:identifier>\n'
+           f'<dc:title>{title}</dc:title>\n<dc:language>en</dc:language>\n'
+           f'<meta property="dcterms:modified">{modified}</meta>\n</metadata>\n'
+           '<manifest>\n' + '\n'.join(manifest) + '\n</manifest>\n'
+           '<spine toc="ncx">\n' + '\n'.join(spine) + '\n</spine>\n</package>\n')
+    nav_doc = ('<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n'
+               '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="en">\n'
+               f'<head><title>{title}</title></head>\n<body>\n<nav epub:type="toc" id="toc"><h1>Contents</h1>\n<ol>\n'
+               + '\n'.join(nav) + '\n</ol>\n</nav>\n</body>\n</html>\n')
+    toc = ('<?xml version="1.0" encoding="utf-8"?>\n'
+           '<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">\n'
+           f'<head><meta name="dtb:uid" content="urn:uuid:{book_id}"/></head>\n'
+           f'<docTitle><text>{title}</text></docTitle>\n<navMap>\n' + '\n'.join(ncx) + '\n</navMap>\n</ncx>\n')
+    return {'META-INF/container.xml': container, 'OEBPS/content.opf': opf, 'OEBPS/nav.xhtml': nav_doc,
+            'OEBPS/toc.ncx': toc, 'OEBPS/style.css': STYLESHEET}
+
+
+def _write_atomically(path: str, write):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def write_epub(path: str, chapters: List[BookChapter], cache: RenderCache):
+    # Same identifier on every build, so readers treat a rebuild as a new version of the same book
+    book_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f'dragon-talisman/{chapters[0].number}-{chapters[-1].number}'))
+
+    def write(f):
+        archive = ZipStreamWriter(f)
+        # The mimetype entry must come first and uncompressed for readers to recognise the file
+        archive.add('mimetype', b'application/epub+zip', compress=False)
+        for name, text in _package_files(chapters, book_id).items():
+            archive.add(name, text.encode('utf-8'))
+        for chapter in chapters:
+            archive.add_deflated('OEBPS/' + chapter.file_name, *cache.get(chapter))
+        archive.close()
+
+    _write_atomically(path, write)
+
+
+def write_html(path: str, chapters: List[BookChapter], cache: RenderCache):
+    def write(f):
+        f.write((f'<!DOCTYPE html>\n<html lang="en">\n<head>\n<meta charset="utf-8"/>\n'
+                 f'<title>{html.escape(BOOK_TITLE)}</title>\n<style>\n{STYLESHEET}</style>\n</head>\n<body>\n'
+                 f'<h1>{html.escape(BOOK_TITLE)}</h1>\n<nav id="toc">\n<ol>\n').encode('utf-8'))
+        for chapter in chapters:
+            f.write(f'<li><a href="#chapter-{chapter.number}">{html.escape(chapter.title)}</a></li>\n'.encode('utf-8'))
+        f.write(b'</ol>\n</nav>\n')
+        for chapter in chapters:
+            f.write((cache.section(chapter) + '\n').encode('utf-8'))
+        f.write(b'</body>\n</html>\n')
+
+    _write_atomically(path, write)
+
+
+def write_text(path: str, chapters: List[BookChapter]):
+    def write(f):
+        f.write(f'{BOOK_TITLE}\n{"=" * len(BOOK_TITLE)}\n'.encode('utf-8'))
+        for chapter in chapters:
+            f.write(f'\n\n{chapter.title}\n{"=" * len(chapter.title)}\n\n{chapter.body}\n'.encode('utf-8'))
+
+    _write_atomically(path, write)
+
+
+def build_book(chapters: List[BookChapter], formats: Iterator[str], out_folder: str = BOOK_FOLDER,
+               cache: Optional[RenderCache] = None, name: str = 'Dragon_Talisman') -> Dict[str, str]:
+    """Write the requested formats, returning format -> output path"""
+    cache = cache or RenderCache()
+    writers = {'epub': lambda path: write_epub(path, chapters, cache),
+               'html': lambda path: write_html(path, chapters, cache),
+               'txt': lambda path: write_text(path, chapters)}
+    outputs = {}
+    for book_format in formats:
+        outputs[book_format] = os.path.join(out_folder, f'{name}.{book_format}')
+        writers[book_format](outputs[book_format])
+    return outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build EPUB, HTML and text books from the chapter folders')
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=list(FORMATS))
+    parser.add_argument('--start', type=int, default=1, help='first book chapter (default: 1)')
+    parser.add_argument('--end', type=int, help='last book chapter (default: the last available one)')
+    parser.add_argument('--refined', default='True_Refining')
+    parser.add_argument('--raw', default='Extracted_Chapters_Fixed')
+    parser.add_argument('--refined-only', action='store_true', help='leave out chapters that are not refined yet')
+    parser.add_argument('--out', default=BOOK_FOLDER, help=f'output folder (default: {BOOK_FOLDER})')
+    parser.add_argument('--cache', default=CACHE_FOLDER)
+    args = parser.parse_args()
+
+    print("🐉 Dragon Talisman - Book Builder")
+    print("=" * 50)
+
+    started = time.perf_counter()
+    chapters, missing = collect_chapters(args.refined, args.raw, args.start, args.end, args.refined_only)
+    if not chapters:
+        print("❌ No chapters to build")
+        return
+    refined = sum(1 for chapter in chapters if chapter.source == 'refined')
+    print(f"📚 {len(chapters)} chapters ({refined} refined, {len(chapters) - refined} raw) "
+          f"read in {time.perf_counter() - started:.2f}s")
+    if missing:
+        shown = ', '.join(map(str, missing[:10])) + (' ...' if len(missing) > 10 else '')
+        print(f"⚠️ {len(missing)} chapters left out (no source): {shown}")
+
+    cache = RenderCache(args.cache)
+    outputs = build_book(chapters, args.formats, args.out, cache)
+    for book_format, path in outputs.items():
+        print(f"   {book_format:<5} {path} ({os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+
+    # Only a whole-book build knows which cached chapters are stale
+    whole_book = args.start == 1 and args.end is None and not args.refined_only
+    removed = cache.prune([chapter.digest for chapter in chapters]) if whole_book else 0
+    print(f"\n✅ Built in {time.perf_counter() - started:.2f}s: {len(cache.rendered)} chapters rendered, "
+          f"{len(cache.reused - cache.rendered)} reused from {args.cache}"
+          + (f", {removed} stale removed" if removed else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,11 @@ def main():
     print("🐉 Dragon Talisman - Find & Extract Missing Chapters")
     print("=" * 60)
     
+    # --archive writes into Extracted_Chapters_Fixed.pack, like the archive mode of fixed_extractor.py
+    archive = '--archive' in sys.argv
+    if archive:
+        sys.argv.remove('--archive')
+    
     # Get range from command line or use defaults
     if len(sys.argv) >= 3:
         try:
@@ -21,30 +26,45 @@ def main():
             end_range = int(sys.argv[2])
             print(f"📊 Using command line range: {start_range}-{end_range}")
         except ValueError:
-            print("❌ Invalid arguments. Usage: python find_and_extract_missing.py [start] [end]")
+            print("❌ Invalid arguments. Usage: python find_and_extract_missing.py [start] [end] [workers] [requests/sec] [--archive]")
             return
     else:
         # Ask user for range
         try:
             start_range = int(input("Enter start chapter number (default: 1): ") or "1")
-            end_range = int(input("Enter end chapter number (default: 1200): ") or "1200")
+            end_input = input("Enter end chapter number (default: last chapter in the table of contents): ").strip()
+            end_range = int(end_input) if end_input else None
         except ValueError:
-            print("❌ Invalid input. Using defaults: 1-1200")
-            start_range, end_range = 1, 1200
+            print("❌ Invalid input. Using defaults: all chapters in the table of contents")
+            start_range, end_range = 1, None
+    
     
-    print(f"🔍 Scanning for missing chapters in range {start_range}-{end_range}...")
+    # Optional concurrency settings: in-flight requests and requests/sec per host
+    try:
+        workers = int(sys.argv[3]) if len(sys.argv) >= 4 else 4
+        rate = float(sys.argv[4]) if len(sys.argv) >= 5 else 2.0
+    except ValueError:
+        print("❌ Invalid concurrency arguments. Using defaults: 4 workers, 2 requests/sec")
+        workers, rate = 4, 2.0
     
     # Initialize extractor
-    extractor = MissingChapterExtractor()
+    extractor = MissingChapterExtractor(max_in_flight=workers, requests_per_second=rate, archive=archive)
+    
+    # The table of contents says which chapters exist, so only those can be missing
+    extractor.discover_chapters()
+    if end_range is None:
+        end_range = max(extractor.index.chapters) if extractor.index else 1200
+    
+    print(f"🔍 Scanning for missing, failed or suspect chapters in range {start_range}-{end_range}...")
     
-    # Find missing chapters
+    # Find missing chapters (the run manifest also reports failed and suspiciously short ones)
     missing_chapters = extractor.find_missing_chapters(start_range, end_range)
     
     if not missing_chapters:
         print("✅ Great! No missing chapters found in the specified range.")
         return
     
-    print(f"\n📋 Found {len(missing_chapters)} missing chapters:")
+    print(f"\n📋 Found {len(missing_chapters)} chapters to (re-)extract:")
     
     # Group consecutive chapters for better display
     groups = []
@@ -78,7 +98,8 @@ def main():
         print("❌ Extraction cancelled.")
         return
     
-    print(f"\n🚀 Starting extraction of {len(missing_chapters)} missing chapters...")
+    print(f"\n🚀 Starting extraction of {len(missing_chapters)} missing chapters "
+          f"({workers} in parallel, {rate:g} requests/sec)...")
     print("⏱️  This may take a few minutes depending on the number of chapters.")
     
     # Extract missing chapters
@@ -93,10 +114,11 @@ def main():
     print("=" * 60)
     print(f"✅ Successfully extracted: {successful} chapters")
     print(f"❌ Failed extractions: {failed} chapters")
-    print(f"📁 Files saved in: {os.path.abspath(extractor.output_folder)}")
+    for sink in extractor.sinks:
+        print(f"📁 {sink.describe()}")
     
     if failed > 0:
-        print(f"\n❌ Failed chapters (you can retry these with the single extractor):")
+        print(f"\n❌ Failed chapters after all retries (run this script again to resume them):")
         for chapter_num, result in results.items():
             if not result['success']:
                 print(f"   Chapter {chapter_num}: {result['message']}")
@@ -0,0 +1,141 @@
+"""
+Helpers for the JSON state files kept next to the chapter folders.
+
+Several tools can run at once against the same files (fixed_extractor.py while
+bulk_chapter_missing_extract.py fills gaps, say), so a file that is read,
+merged and written back is updated under ``locked(path)``, and ``write_json``
+writes to a temporary file of its own before replacing the target.
+
+``scan_cached`` runs a per-chapter analysis over chapter folders and caches
+its results by SHA-256 of the chapter file, so only new or edited chapters are
+analysed again (in a process pool when there are enough of them). It is shared
+by glossary_check.py, integrity_scan.py and corpus_stats.py.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from run_manifest import CHAPTER_FILE_PATTERN
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Below this many new or edited chapters, starting a process pool costs more than it saves
+POOL_THRESHOLD = 8
+
+
+@contextmanager
+def locked(path: str):
+    """Hold an exclusive lock on ``path`` (through ``path.lock``) across processes"""
+    with open(path + '.lock', 'a+b') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def read_json(path: str) -> dict:
+    """Contents of a JSON file, or {} when it is missing or unreadable"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_json(path: str, data, **dump_options):
+    """Replace ``path`` atomically, through a temporary file no other writer uses"""
+    directory, name = os.path.split(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=directory, prefix=name + '.', suffix='.tmp',
+                                     delete=False) as f:
+        tmp_path = f.name
+        try:
+            json.dump(data, f, **dump_options)
+        except BaseException:
+            f.close()
+            os.unlink(tmp_path)
+            raise
+    os.replace(tmp_path, path)
+
+
+def hash_folder(folder: str) -> Dict[int, Tuple[str, str]]:
+    """Chapter number -> (path, SHA-256 of the file)"""
+    chapters = {}
+    if not os.path.isdir(folder):
+        return chapters
+    for name in os.listdir(folder):
+        match = CHAPTER_FILE_PATTERN.match(name)
+        if match:
+            path = os.path.join(folder, name)
+            with open(path, 'rb') as f:
+                chapters[int(match.group(1))] = (path, hashlib.sha256(f.read()).hexdigest())
+    return chapters
+
+
+def _load_cache(cache_path: str, version) -> Tuple[Dict[str, Any], Dict[str, List[str]]]:
+    # Results by SHA-256, and the SHA-256s of each folder's chapters when it was last scanned
+    data = read_json(cache_path)
+    if data.get('version') != version:
+        return {}, {}
+    return data.get('results', {}), data.get('folders', {})
+
+
+def scan_cached(folders: List[str], func: Callable[[str], Any], cache_path: Optional[str], version,
+                workers: Optional[int] = None, initializer: Optional[Callable] = None, initargs: tuple = (),
+                chunksize: int = 8) -> Tuple[List[Dict[int, Any]], int]:
+    """``func(path)`` per chapter number for each folder, and how many chapters it had to be run on.
+
+    Results are cached in ``cache_path`` (None: no cache) under the file's
+    SHA-256; a different ``version`` discards them. Several folders can share
+    one cache file: results are kept while any folder scanned with it still
+    has a chapter with that SHA-256. ``func`` must be a
+    module-level function so worker processes can run it, after
+    ``initializer(*initargs)`` when given.
+    """
+    cached = _load_cache(cache_path, version)[0] if cache_path else {}
+    hashed = [hash_folder(folder) for folder in folders]
+
+    to_scan = sorted({(path, digest) for chapters in hashed for path, digest in chapters.values()
+                      if digest not in cached})
+    if len(to_scan) >= POOL_THRESHOLD and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as pool:
+            for (_, digest), result in zip(to_scan, pool.map(func, [path for path, _ in to_scan],
+                                                             chunksize=chunksize)):
+                cached[digest] = result
+    else:
+        if initializer:
+            initializer(*initargs)
+        for path, digest in to_scan:
+            cached[digest] = func(path)
+
+    if cache_path:
+        with locked(cache_path):
+            # Another run may have saved results (or scanned other folders) in the meantime
+            results, folder_digests = _load_cache(cache_path, version)
+            results.update(cached)
+            for folder, chapters in zip(folders, hashed):
+                folder_digests[os.path.abspath(folder)] = sorted({digest for _, digest in chapters.values()})
+            folder_digests = {folder: digests for folder, digests in folder_digests.items() if os.path.isdir(folder)}
+            # Only keep entries for files that still exist, so the cache does not grow with every edit
+            live = {digest for digests in folder_digests.values() for digest in digests}
+            kept = {digest: result for digest, result in results.items() if digest in live}
+            write_json(cache_path, {'version': version, 'folders': folder_digests, 'results': kept},
+                       ensure_ascii=False)
+    return [{num: cached[digest] for num, (_, digest) in sorted(chapters.items())} for chapters in hashed], len(to_scan)
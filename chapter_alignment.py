@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Raw <-> refined chapter alignment with MinHash signatures and an LSH index.
+
+Refined chapters are not numbered like the raw ones (raw Chapter_014.txt is
+refined Chapter 11), and a refined chapter may merge several raw chapters or
+a raw chapter may be split over several refined ones. Every chapter is
+reduced to its set of 3-word shingles and a 128-value MinHash signature
+(one-permutation hashing: each shingle is hashed once). Raw signatures go
+into a banded LSH index, so each refined chapter is only compared with the
+few raw chapters it collides with instead of all of them.
+
+A refined and a raw chapter are aligned when enough of either one is
+estimated to be contained in the other. Merged raw chapters have to be
+consecutive, and refined chapters rewritten too freely to match are placed
+by order between their aligned neighbours. The result is written to
+chapter_alignment.json.
+
+Usage: python chapter_alignment.py [--raw Extracted_Chapters_Fixed] [--refined True_Refining]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from run_manifest import CHAPTER_FILE_PATTERN
+
+SHINGLE_WORDS = 3
+NUM_HASHES = 128
+# 64 bands of 2 rows: pairs with a Jaccard similarity around 0.12 and up become candidates
+BANDS = 64
+ROWS = NUM_HASHES // BANDS
+# Share of a chapter's shingles that must appear in the other chapter; unrelated chapters share ~3%
+MIN_CONTAINMENT = 0.12
+
+# Refined chapter N was made from raw chapter N + 3 (PromptForQuality.txt: raw 004 = refined 001)
+DEFAULT_RAW_OFFSET = 3
+
+CACHE_FILE = 'chapter_alignment_cache.json'
+RESULT_FILE = 'chapter_alignment.json'
+
+WORD = re.compile(r'[a-z0-9]+')
+EMPTY = (1 << 64) - 1
+
+
+def chapter_files(folder: str) -> Dict[int, str]:
+    files = {}
+    for name in os.listdir(folder):
+        match = CHAPTER_FILE_PATTERN.match(name)
+        if match:
+            files[int(match.group(1))] = os.path.join(folder, name)
+    return files
+
+
+def shingle_hashes(text: str, size: int = SHINGLE_WORDS) -> set:
+    """64-bit hashes of the chapter body's word shingles (the title and its underline are skipped)"""
+    body = text.split('\n', 2)[-1] if text.count('\n') >= 2 else text
+    words = WORD.findall(body.lower())
+    return {int.from_bytes(hashlib.blake2b(' '.join(words[i:i + size]).encode('utf-8'), digest_size=8).digest(),
+                           'little')
+            for i in range(max(0, len(words) - size + 1))}
+
+
+def minhash(hashes: set, num_hashes: int = NUM_HASHES) -> List[int]:
+    """One-permutation MinHash: the low bits of a hash pick its bin, the rest compete for that bin's minimum.
+
+    Empty bins borrow the value of the next non-empty bin (rotation
+    densification) so that signatures of small sets stay comparable.
+    """
+    signature = [EMPTY] * num_hashes
+    for value in hashes:
+        slot = value % num_hashes
+        rest = value // num_hashes
+        if rest < signature[slot]:
+            signature[slot] = rest
+    if hashes and EMPTY in signature:
+        filled = [i for i, value in enumerate(signature) if value != EMPTY]
+        for i in range(num_hashes):
+            if signature[i] == EMPTY:
+                donor = next((j for j in filled if j > i), filled[0])
+                signature[i] = signature[donor] + (donor - i) % num_hashes * (1 << 58)
+    return signature
+
+
+def jaccard(a: List[int], b: List[int]) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def containment(similarity: float, size: int, other_size: int) -> float:
+    """Estimated share of a set of ``size`` that lies in the other set, from their Jaccard similarity"""
+    if not size:
+        return 0.0
+    # |A n B| = J / (1 + J) * (|A| + |B|)
+    return min(1.0, similarity / (1 + similarity) * (size + other_size) / size)
+
+
+class ChapterSketch:
+    """MinHash signature and shingle count of one chapter file"""
+
+    __slots__ = ('chapter_num', 'sha256', 'size', 'signature')
+
+    def __init__(self, chapter_num: int, sha256: str, size: int, signature: List[int]):
+        self.chapter_num = chapter_num
+        self.sha256 = sha256
+        self.size = size
+        self.signature = signature
+
+
+def sketch_folder(folder: str, cache: Dict[str, list]) -> Dict[int, ChapterSketch]:
+    """Sketches of every chapter in a folder, reusing cached ones for unchanged files"""
+    sketches = {}
+    for chapter_num, path in sorted(chapter_files(folder).items()):
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if digest not in cache:
+            hashes = shingle_hashes(data.decode('utf-8', errors='replace'))
+            cache[digest] = [len(hashes), minhash(hashes)]
+        size, signature = cache[digest]
+        sketches[chapter_num] = ChapterSketch(chapter_num, digest, size, signature)
+    return sketches
+
+
+class LshIndex:
+    """Banded LSH: chapters whose signatures agree on every row of some band share a bucket"""
+
+    def __init__(self, bands: int = BANDS, rows: int = ROWS):
+        self.bands = bands
+        self.rows = rows
+        self.buckets: Dict[Tuple[int, tuple], List[int]] = {}
+
+    def _keys(self, signature: List[int]):
+        for band in range(self.bands):
+            yield band, tuple(signature[band * self.rows:(band + 1) * self.rows])
+
+    def add(self, key: int, signature: List[int]):
+        for bucket in self._keys(signature):
+            self.buckets.setdefault(bucket, []).append(key)
+
+    def candidates(self, signature: List[int]) -> set:
+        found = set()
+        for bucket in self._keys(signature):
+            found.update(self.buckets.get(bucket, ()))
+        return found
+
+
+class Alignment:
+    """Refined -> raw chapter mapping, including merges and splits"""
+
+    def __init__(self):
+        # refined chapter -> [(raw chapter, similarity, share of raw in refined, share of refined in raw)]
+        self.links: Dict[int, List[Tuple[int, float, float, float]]] = {}
+        # Refined chapters placed by their position between aligned neighbours rather than by similarity
+        self.inferred: set = set()
+        self.compared = 0
+
+    def raw_span(self, refined_num: int) -> List[int]:
+        return sorted(raw_num for raw_num, *_ in self.links.get(refined_num, []))
+
+    def raw_to_refined(self) -> Dict[int, List[int]]:
+        mapping: Dict[int, List[int]] = {}
+        for refined_num in sorted(self.links):
+            for raw_num in self.raw_span(refined_num):
+                mapping.setdefault(raw_num, []).append(refined_num)
+        return mapping
+
+    def merges(self) -> Dict[int, List[int]]:
+        """Refined chapters made from more than one raw chapter"""
+        return {num: self.raw_span(num) for num in self.links if len(self.links[num]) > 1}
+
+    def splits(self) -> Dict[int, List[int]]:
+        """Raw chapters spread over more than one refined chapter"""
+        return {num: refined for num, refined in self.raw_to_refined().items() if len(refined) > 1}
+
+    def next_raw_chapter(self) -> Optional[int]:
+        """First raw chapter after the last one that has been refined"""
+        raw = self.raw_to_refined()
+        return max(raw) + 1 if raw else None
+
+    def to_dict(self) -> dict:
+        return {
+            'refined_to_raw': {str(num): self.raw_span(num) for num in sorted(self.links)},
+            'raw_to_refined': {str(num): refined for num, refined in sorted(self.raw_to_refined().items())},
+            'links': {str(num): [{'raw': raw_num, 'similarity': round(similarity, 3),
+                                  'raw_covered': round(raw_share, 3), 'refined_covered': round(refined_share, 3)}
+                                 for raw_num, similarity, raw_share, refined_share in sorted(links)]
+                      for num, links in sorted(self.links.items())},
+            'inferred': sorted(self.inferred),
+            'next_raw_chapter': self.next_raw_chapter(),
+        }
+
+
+def _consecutive_run(links: List[Tuple[int, float, float, float]]) -> List[Tuple[int, float, float, float]]:
+    """Links around the strongest one whose raw chapters are consecutive; a merge never skips chapters"""
+    links = sorted(links)
+    best = max(range(len(links)), key=lambda i: max(links[i][2], links[i][3]))
+    start = end = best
+    while start > 0 and links[start - 1][0] == links[start][0] - 1:
+        start -= 1
+    while end + 1 < len(links) and links[end + 1][0] == links[end][0] + 1:
+        end += 1
+    return links[start:end + 1]
+
+
+def _fill_gaps(alignment: Alignment, raw: Dict[int, ChapterSketch], refined: Dict[int, ChapterSketch]):
+    """Place runs of unaligned refined chapters one-to-one on the raw chapters between their neighbours"""
+    numbers = sorted(refined)
+    i = 0
+    while i < len(numbers):
+        if alignment.links[numbers[i]]:
+            i += 1
+            continue
+        run_end = i
+        while run_end + 1 < len(numbers) and not alignment.links[numbers[run_end + 1]]:
+            run_end += 1
+        run = numbers[i:run_end + 1]
+        i = run_end + 1
+        if run[0] == numbers[0] or run_end + 1 >= len(numbers):
+            continue
+
+        after = alignment.raw_span(numbers[i - len(run) - 1])[-1]
+        before = alignment.raw_span(numbers[i])[0]
+        gap = [raw_num for raw_num in range(after + 1, before) if raw_num in raw]
+        if len(gap) != len(run):
+            continue
+        for refined_num, raw_num in zip(run, gap):
+            similarity = jaccard(refined[refined_num].signature, raw[raw_num].signature)
+            alignment.links[refined_num] = [(raw_num, similarity,
+                                             containment(similarity, raw[raw_num].size, refined[refined_num].size),
+                                             containment(similarity, refined[refined_num].size, raw[raw_num].size))]
+            alignment.inferred.add(refined_num)
+
+
+def align(raw: Dict[int, ChapterSketch], refined: Dict[int, ChapterSketch],
+          min_containment: float = MIN_CONTAINMENT) -> Alignment:
+    index = LshIndex()
+    for chapter_num, sketch in raw.items():
+        if sketch.size:
+            index.add(chapter_num, sketch.signature)
+
+    alignment = Alignment()
+    for refined_num, sketch in sorted(refined.items()):
+        links = []
+        for raw_num in index.candidates(sketch.signature):
+            alignment.compared += 1
+            other = raw[raw_num]
+            similarity = jaccard(sketch.signature, other.signature)
+            raw_share = containment(similarity, other.size, sketch.size)
+            refined_share = containment(similarity, sketch.size, other.size)
+            if max(raw_share, refined_share) >= min_containment:
+                links.append((raw_num, similarity, raw_share, refined_share))
+        alignment.links[refined_num] = _consecutive_run(links) if links else []
+    _fill_gaps(alignment, raw, refined)
+    return alignment
+
+
+def load_raw_mapping(alignment_path: str = RESULT_FILE) -> Tuple[Dict[int, List[int]], int]:
+    """Known refined -> raw chapters from chapter_alignment.py, and the offset to continue with"""
+    try:
+        with open(alignment_path, encoding='utf-8') as f:
+            mapping = {int(num): raw for num, raw in json.load(f).get('refined_to_raw', {}).items() if raw}
+    except (OSError, ValueError):
+        return {}, DEFAULT_RAW_OFFSET
+    if not mapping:
+        return {}, DEFAULT_RAW_OFFSET
+    last = max(mapping)
+    return mapping, mapping[last][-1] - last
+
+
+def raw_chapters_for(refined_num: int, mapping: Dict[int, List[int]], offset: int) -> List[int]:
+    return mapping.get(refined_num) or [refined_num + offset]
+
+
+def load_cache(cache_path: str) -> Dict[str, list]:
+    try:
+        with open(cache_path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get('shingle_words') != SHINGLE_WORDS or data.get('num_hashes') != NUM_HASHES:
+        return {}
+    return data.get('sketches', {})
+
+
+def save_json(path: str, data: dict):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def format_span(chapters: List[int]) -> str:
+    if not chapters:
+        return '-'
+    if chapters == list(range(chapters[0], chapters[-1] + 1)):
+        return str(chapters[0]) if len(chapters) == 1 else f'{chapters[0]}-{chapters[-1]}'
+    return ', '.join(map(str, chapters))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Map refined chapters to the raw chapters they were made from')
+    parser.add_argument('--raw', default='Extracted_Chapters_Fixed')
+    parser.add_argument('--refined', default='True_Refining')
+    parser.add_argument('--min-containment', type=float, default=MIN_CONTAINMENT)
+    parser.add_argument('--output', default=RESULT_FILE)
+    args = parser.parse_args()
+
+    print("🐉 Dragon Talisman - Raw/Refined Chapter Alignment")
+    print("=" * 50)
+
+    cache = load_cache(CACHE_FILE)
+    raw = sketch_folder(args.raw, cache)
+    refined = sketch_folder(args.refined, cache)
+    live = {sketch.sha256 for sketch in list(raw.values()) + list(refined.values())}
+    save_json(CACHE_FILE, {'shingle_words': SHINGLE_WORDS, 'num_hashes': NUM_HASHES,
+                           'sketches': {digest: value for digest, value in cache.items() if digest in live}})
+
+    alignment = align(raw, refined, args.min_containment)
+    print(f"📄 {len(refined)} refined and {len(raw)} raw chapters, {alignment.compared} candidate pairs compared "
+          f"(instead of {len(refined) * len(raw)})\n")
+
+    for refined_num in sorted(alignment.links):
+        links = sorted(alignment.links[refined_num])
+        details = ', '.join(f'{raw_num} ({raw_share:.0%} of raw)' for raw_num, _, raw_share, _ in links)
+        if refined_num in alignment.inferred:
+            details += ' - placed by order, too rewritten to match'
+        print(f"   Refined {refined_num:>4} ← raw {format_span(alignment.raw_span(refined_num)):<10} {details}")
+
+    unaligned = [num for num, links in alignment.links.items() if not links]
+    if unaligned:
+        print(f"\n⚠️ No raw source found for refined chapters: {format_span(sorted(unaligned))}")
+    for refined_num, span in sorted(alignment.merges().items()):
+        print(f"🔗 Refined {refined_num} merges raw chapters {format_span(span)}")
+    for raw_num, refined_nums in sorted(alignment.splits().items()):
+        print(f"✂️ Raw {raw_num} is split over refined chapters {format_span(refined_nums)}")
+    if alignment.next_raw_chapter():
+        print(f"\n➡️ Next raw chapter to refine: {alignment.next_raw_chapter()}")
+
+    save_json(args.output, alignment.to_dict())
+    print(f"💾 Alignment saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Packed chapter archive: a whole chapter folder in one file with random access.
+
+Layout (little-endian):
+    header   magic, version, chapter count, index offset, dead bytes (32 bytes)
+    blobs    chapter files, each stored raw or zlib-compressed
+    index    one fixed-size entry per chapter, sorted by chapter number:
+             chapter, flags, blob offset, stored length, raw length, SHA-256
+
+Readers memory-map the file and binary-search the index, so chapter N (or a
+range) is read without touching any other chapter. Writers only ever append:
+new blobs and a new index go after the current index, and the header is
+switched to the new index last, so an open reader keeps a consistent view
+and a crash loses at most the chapters since the last commit.
+
+Usage:
+    python chapter_archive.py pack Extracted_Chapters_Fixed [--compress]
+    python chapter_archive.py list|verify|compact Extracted_Chapters_Fixed.pack
+    python chapter_archive.py cat Extracted_Chapters_Fixed.pack 13
+    python chapter_archive.py unpack Extracted_Chapters_Fixed.pack Some_Folder
+"""
+
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from run_manifest import CHAPTER_FILE_PATTERN
+
+MAGIC = b'DTPACK\x00\x00'
+VERSION = 1
+HEADER = struct.Struct('<8sIIQQ')
+ENTRY = struct.Struct('<IIQII32s')
+
+# Entry flags
+COMPRESSED = 1
+
+
+def archive_path_for(folder: str) -> str:
+    """Archive a chapter folder packs into: Extracted_Chapters_Fixed -> Extracted_Chapters_Fixed.pack"""
+    return os.path.abspath(folder).rstrip(os.sep) + '.pack'
+
+
+def chapter_filename(chapter_num: int) -> str:
+    return f'Chapter_{chapter_num:03d}.txt'
+
+
+class ArchiveEntry:
+    """Index entry of one stored chapter"""
+
+    __slots__ = ('chapter_num', 'flags', 'offset', 'length', 'raw_length', 'sha256')
+
+    def __init__(self, chapter_num: int, flags: int, offset: int, length: int, raw_length: int, sha256: bytes):
+        self.chapter_num = chapter_num
+        self.flags = flags
+        self.offset = offset
+        self.length = length
+        self.raw_length = raw_length
+        self.sha256 = sha256
+
+    @property
+    def compressed(self) -> bool:
+        return bool(self.flags & COMPRESSED)
+
+    def pack(self) -> bytes:
+        return ENTRY.pack(self.chapter_num, self.flags, self.offset, self.length, self.raw_length, self.sha256)
+
+
+def _read_header(data) -> Tuple[int, int, int]:
+    magic, version, count, index_offset, dead_bytes = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError('Not a chapter archive')
+    if version != VERSION:
+        raise ValueError(f'Unsupported chapter archive version {version}')
+    return count, index_offset, dead_bytes
+
+
+class ChapterArchive:
+    """Read-only, memory-mapped view of a chapter archive.
+
+    The index is binary-searched in place, so opening the archive reads only
+    the header; chapters are decoded on demand. The view is the archive as it
+    was when opened; reopen it to see chapters committed since.
+    """
+
+    def __init__(self, archive_path: str, verify: bool = False):
+        self.archive_path = archive_path
+        self.verify = verify
+        self.file = open(archive_path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.count, self.index_offset, self.dead_bytes = _read_header(self.map)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self) -> 'ChapterArchive':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, chapter_num: int) -> bool:
+        return self.entry(chapter_num) is not None
+
+    def _entry_at(self, position: int) -> ArchiveEntry:
+        return ArchiveEntry(*ENTRY.unpack_from(self.map, self.index_offset + position * ENTRY.size))
+
+    def _chapter_at(self, position: int) -> int:
+        return struct.unpack_from('<I', self.map, self.index_offset + position * ENTRY.size)[0]
+
+    def _bisect(self, chapter_num: int) -> int:
+        """Position of the first entry with a chapter number >= ``chapter_num``"""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._chapter_at(middle) < chapter_num:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def entry(self, chapter_num: int) -> Optional[ArchiveEntry]:
+        position = self._bisect(chapter_num)
+        if position < self.count and self._chapter_at(position) == chapter_num:
+            return self._entry_at(position)
+        return None
+
+    def entries(self) -> Iterator[ArchiveEntry]:
+        for position in range(self.count):
+            yield self._entry_at(position)
+
+    def chapter_numbers(self) -> List[int]:
+        return [self._chapter_at(position) for position in range(self.count)]
+
+    def stored_bytes(self, entry: ArchiveEntry) -> bytes:
+        """Blob of an entry exactly as stored (compressed or not)"""
+        return self.map[entry.offset:entry.offset + entry.length]
+
+    def read_entry(self, entry: ArchiveEntry) -> bytes:
+        data = self.stored_bytes(entry)
+        if entry.compressed:
+            data = zlib.decompress(data)
+        if self.verify and hashlib.sha256(data).digest() != entry.sha256:
+            raise ValueError(f'Chapter {entry.chapter_num} is corrupt (hash mismatch)')
+        return data
+
+    def read_bytes(self, chapter_num: int) -> Optional[bytes]:
+        """Stored chapter file contents, or None if the chapter is not in the archive"""
+        entry = self.entry(chapter_num)
+        return self.read_entry(entry) if entry else None
+
+    def get(self, chapter_num: int) -> Optional[str]:
+        data = self.read_bytes(chapter_num)
+        return data.decode('utf-8') if data is not None else None
+
+    def __getitem__(self, chapter_num: int) -> str:
+        text = self.get(chapter_num)
+        if text is None:
+            raise KeyError(chapter_num)
+        return text
+
+    def range(self, start: Optional[int] = None, end: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        """``(chapter number, text)`` for the stored chapters from ``start`` to ``end`` inclusive"""
+        position = self._bisect(start) if start is not None else 0
+        while position < self.count:
+            entry = self._entry_at(position)
+            if end is not None and entry.chapter_num > end:
+                break
+            yield entry.chapter_num, self.read_entry(entry).decode('utf-8')
+            position += 1
+
+    def check(self) -> List[int]:
+        """Chapter numbers whose stored contents no longer match their hash"""
+        corrupt = []
+        for entry in self.entries():
+            try:
+                data = self.stored_bytes(entry)
+                data = zlib.decompress(data) if entry.compressed else data
+            except zlib.error:
+                corrupt.append(entry.chapter_num)
+                continue
+            if hashlib.sha256(data).digest() != entry.sha256:
+                corrupt.append(entry.chapter_num)
+        return corrupt
+
+
+class ArchiveWriter:
+    """Appends chapters to an archive, creating it if needed.
+
+    Chapters are written immediately; the index is rewritten ("committed")
+    every ``commit_every`` new chapters and on ``close()``. Re-adding a
+    chapter supersedes the older copy, which becomes dead space until
+    ``compact()``. Safe to call from several threads.
+    """
+
+    def __init__(self, archive_path: str, compress: bool = False, level: int = 6, commit_every: int = 50):
+        self.archive_path = archive_path
+        self.compress = compress
+        self.level = level
+        self.commit_every = commit_every
+        self.lock = threading.Lock()
+        self.entries: Dict[int, ArchiveEntry] = {}
+        self.pending = 0
+
+        if os.path.exists(archive_path) and os.path.getsize(archive_path) > 0:
+            self.file = open(archive_path, 'r+b')
+            header = self.file.read(HEADER.size)
+            count, self.index_offset, self.dead_bytes = _read_header(header)
+            self.file.seek(self.index_offset)
+            index = self.file.read(count * ENTRY.size)
+            for position in range(count):
+                entry = ArchiveEntry(*ENTRY.unpack_from(index, position * ENTRY.size))
+                self.entries[entry.chapter_num] = entry
+            # Anything after the committed index was never committed (e.g. an interrupted run)
+            self.index_length = count * ENTRY.size
+            self.file.truncate(self.index_offset + self.index_length)
+        else:
+            self.file = open(archive_path, 'w+b')
+            self.index_offset = HEADER.size
+            self.index_length = 0
+            self.dead_bytes = 0
+            self._write_header()
+
+    @classmethod
+    def beside(cls, output_folder: str, **kwargs) -> 'ArchiveWriter':
+        """Archive written next to (instead of into) a chapter output folder"""
+        return cls(archive_path_for(output_folder), **kwargs)
+
+    def _write_header(self):
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, len(self.entries), self.index_offset, self.dead_bytes))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def _append_blob(self, chapter_num: int, data: bytes, stored: bytes, flags: int) -> bool:
+        digest = hashlib.sha256(data).digest()
+        previous = self.entries.get(chapter_num)
+        if previous and previous.sha256 == digest:
+            return False
+
+        self.file.seek(0, os.SEEK_END)
+        offset = self.file.tell()
+        self.file.write(stored)
+        self.entries[chapter_num] = ArchiveEntry(chapter_num, flags, offset, len(stored), len(data), digest)
+        if previous:
+            self.dead_bytes += previous.length
+        self.pending += 1
+        if self.pending >= self.commit_every:
+            self._commit()
+        return True
+
+    def add(self, chapter_num: int, data: bytes) -> bool:
+        """Store a chapter file's contents; False if the archive already holds identical contents"""
+        stored, flags = data, 0
+        if self.compress:
+            packed = zlib.compress(data, self.level)
+            # Tiny or incompressible chapters are cheaper to keep raw
+            if len(packed) < len(data):
+                stored, flags = packed, COMPRESSED
+        with self.lock:
+            return self._append_blob(chapter_num, data, stored, flags)
+
+    def add_chapter(self, chapter_num: int, title_text: str, content: str) -> bool:
+        """Store a chapter in the same layout the extractors write to Chapter_NNN.txt"""
+        text = f'{title_text}\n' + '=' * len(title_text) + '\n\n' + content
+        return self.add(chapter_num, text.encode('utf-8'))
+
+    def add_stored(self, entry: ArchiveEntry, stored: bytes):
+        """Copy an entry from another archive without recompressing it"""
+        with self.lock:
+            self.file.seek(0, os.SEEK_END)
+            offset = self.file.tell()
+            self.file.write(stored)
+            self.entries[entry.chapter_num] = ArchiveEntry(entry.chapter_num, entry.flags, offset, len(stored),
+                                                           entry.raw_length, entry.sha256)
+            self.pending += 1
+
+    def _commit(self):
+        if not self.pending:
+            return
+        self.file.seek(0, os.SEEK_END)
+        index_offset = self.file.tell()
+        self.file.write(b''.join(self.entries[num].pack() for num in sorted(self.entries)))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+        # The superseded index is dead space from now on; switching the header publishes the new one
+        self.dead_bytes += self.index_length
+        self.index_offset = index_offset
+        self.index_length = len(self.entries) * ENTRY.size
+        self._write_header()
+        self.pending = 0
+
+    def commit(self):
+        """Write the index so readers see every chapter added so far"""
+        with self.lock:
+            self._commit()
+
+    def close(self):
+        with self.lock:
+            self._commit()
+            self.file.close()
+
+    def __enter__(self) -> 'ArchiveWriter':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def pack_folder(folder: str, archive_path: Optional[str] = None, compress: bool = False, level: int = 6) -> int:
+    """Pack every Chapter_NNN.txt in a folder into a fresh archive; returns the number of chapters"""
+    archive_path = archive_path or archive_path_for(folder)
+    chapters = {}
+    for name in os.listdir(folder):
+        match = CHAPTER_FILE_PATTERN.match(name)
+        if match:
+            chapters[int(match.group(1))] = os.path.join(folder, name)
+
+    tmp_path = archive_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    with ArchiveWriter(tmp_path, compress=compress, level=level, commit_every=len(chapters) + 1) as writer:
+        for chapter_num in sorted(chapters):
+            with open(chapters[chapter_num], 'rb') as f:
+                writer.add(chapter_num, f.read())
+    os.replace(tmp_path, archive_path)
+    return len(chapters)
+
+
+def unpack_archive(archive_path: str, folder: str) -> int:
+    """Write every archived chapter back out as Chapter_NNN.txt; returns the number of chapters"""
+    os.makedirs(folder, exist_ok=True)
+    with ChapterArchive(archive_path, verify=True) as archive:
+        for entry in archive.entries():
+            with open(os.path.join(folder, chapter_filename(entry.chapter_num)), 'wb') as f:
+                f.write(archive.read_entry(entry))
+        return len(archive)
+
+
+def compact_archive(archive_path: str) -> int:
+    """Rewrite an archive without superseded chapters and indexes; returns the bytes reclaimed"""
+    size_before = os.path.getsize(archive_path)
+    tmp_path = archive_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    with ChapterArchive(archive_path) as archive:
+        with ArchiveWriter(tmp_path, commit_every=len(archive) + 1) as writer:
+            for entry in archive.entries():
+                writer.add_stored(entry, archive.stored_bytes(entry))
+    os.replace(tmp_path, archive_path)
+    return size_before - os.path.getsize(archive_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pack chapter folders into a single indexed archive')
+    commands = parser.add_subparsers(dest='command', required=True)
+    pack = commands.add_parser('pack', help='pack a chapter folder')
+    pack.add_argument('folder')
+    pack.add_argument('archive', nargs='?', help='archive path (default: <folder>.pack)')
+    pack.add_argument('--compress', action='store_true', help='zlib-compress each chapter')
+    pack.add_argument('--level', type=int, default=6, help='zlib level (default: 6)')
+    unpack = commands.add_parser('unpack', help='write the chapters back out as files')
+    unpack.add_argument('archive')
+    unpack.add_argument('folder')
+    for name, help_text in (('list', 'list stored chapters'), ('verify', 'check every chapter against its hash'),
+                            ('compact', 'drop superseded chapters and indexes')):
+        commands.add_parser(name, help=help_text).add_argument('archive')
+    cat = commands.add_parser('cat', help='print chapters')
+    cat.add_argument('archive')
+    cat.add_argument('start', type=int)
+    cat.add_argument('end', type=int, nargs='?')
+    args = parser.parse_args()
+
+    if args.command == 'pack':
+        archive_path = args.archive or archive_path_for(args.folder)
+        count = pack_folder(args.folder, archive_path, compress=args.compress, level=args.level)
+        print(f"📦 Packed {count} chapters into {archive_path} ({os.path.getsize(archive_path) / 1024:.0f} KB)")
+    elif args.command == 'unpack':
+        count = unpack_archive(args.archive, args.folder)
+        print(f"📁 Wrote {count} chapters to {os.path.abspath(args.folder)}")
+    elif args.command == 'compact':
+        print(f"🧹 Reclaimed {compact_archive(args.archive) / 1024:.0f} KB")
+    elif args.command == 'cat':
+        with ChapterArchive(args.archive) as archive:
+            for _, text in archive.range(args.start, args.end if args.end is not None else args.start):
+                sys.stdout.write(text + '\n')
+    else:
+        with ChapterArchive(args.archive) as archive:
+            if args.command == 'verify':
+                corrupt = archive.check()
+                print(f"✅ All {len(archive)} chapters intact" if not corrupt
+                      else f"❌ {len(corrupt)} corrupt chapters: {', '.join(map(str, corrupt))}")
+                return
+            numbers = archive.chapter_numbers()
+            stored = sum(entry.length for entry in archive.entries())
+            raw = sum(entry.raw_length for entry in archive.entries())
+            print(f"📚 {len(numbers)} chapters" + (f" ({numbers[0]}-{numbers[-1]})" if numbers else ''))
+            print(f"💾 {raw / 1024:.0f} KB of text stored in {stored / 1024:.0f} KB, "
+                  f"{archive.dead_bytes / 1024:.0f} KB dead space")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import json
+import os
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup
+
+from html_cache import HtmlCache
+
+NEXT_PAGE_TEXT = {'next', 'next page', 'next >', 'next »', '>', '»', '>>'}
+
+
+def catalogue_url_for(base_url: str) -> str:
+    """Table-of-contents URL of a novel: https://novelhi.com/s/<slug> -> https://novelhi.com/s/index/<slug>"""
+    parsed = urlparse(base_url.rstrip('/'))
+    head, _, slug = parsed.path.rpartition('/')
+    return parsed._replace(path=f'{head}/index/{slug}').geturl()
+
+
+def parse_catalogue(html: bytes, page_url: str, base_url: str) -> Tuple[List[Tuple[int, str, Optional[str]]], List[str]]:
+    """Chapter links ``(number, url, title)`` and further catalogue pages linked from one catalogue page"""
+    base = urlparse(base_url.rstrip('/'))
+    chapter_path = re.compile(re.escape(base.path) + r'/(\d+)/?$')
+    page = urlparse(page_url)
+
+    soup = BeautifulSoup(html, 'html.parser')
+    chapters = []
+    next_pages = []
+    for link in soup.find_all('a', href=True):
+        url = urljoin(page_url, link['href']).split('#')[0]
+        parsed = urlparse(url)
+        text = ' '.join(link.get_text().split())
+
+        match = chapter_path.match(parsed.path)
+        if match and parsed.netloc == base.netloc:
+            chapters.append((int(match.group(1)), url, text or None))
+        elif parsed.netloc == page.netloc and parsed.path == page.path and parsed.query != page.query:
+            # Paginated catalogue: same page, different query string
+            next_pages.append(url)
+        elif 'next' in (link.get('rel') or []) or text.lower() in NEXT_PAGE_TEXT:
+            next_pages.append(url)
+    return chapters, next_pages
+
+
+class ChapterIndex:
+    """Cached chapter number -> URL -> title index built from the novel's table of contents.
+
+    Lets the extractors target chapters that are actually published instead of
+    probing a guessed range, tell a missing chapter from one that does not
+    exist, and fetch only the chapters listed since the last discovery.
+    """
+
+    def __init__(self, index_path: str, base_url: str, catalogue_url: Optional[str] = None):
+        self.index_path = index_path
+        self.base_url = base_url
+        self.catalogue_url = catalogue_url or catalogue_url_for(base_url)
+        self.chapters: Dict[int, dict] = {}
+        self.discovered_at: Optional[float] = None
+        self.load()
+
+    @classmethod
+    def beside(cls, output_folder: str, base_url: str, **kwargs) -> 'ChapterIndex':
+        """Index stored next to a chapter output folder"""
+        parent = os.path.dirname(os.path.abspath(output_folder))
+        return cls(os.path.join(parent, 'chapter_index.json'), base_url, **kwargs)
+
+    def load(self):
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('base_url') != self.base_url:
+            return
+        self.chapters = {int(num): entry for num, entry in data.get('chapters', {}).items()}
+        self.discovered_at = data.get('discovered_at')
+
+    def save(self):
+        data = {
+            'base_url': self.base_url,
+            'catalogue_url': self.catalogue_url,
+            'discovered_at': self.discovered_at,
+            'chapters': {str(num): self.chapters[num] for num in sorted(self.chapters)},
+        }
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+    def __bool__(self) -> bool:
+        return bool(self.chapters)
+
+    def __contains__(self, chapter_num: int) -> bool:
+        return chapter_num in self.chapters
+
+    def url_for(self, chapter_num: int) -> str:
+        entry = self.chapters.get(chapter_num)
+        return entry['url'] if entry else f'{self.base_url}/{chapter_num}'
+
+    def title_for(self, chapter_num: int) -> Optional[str]:
+        entry = self.chapters.get(chapter_num)
+        return entry['title'] if entry else None
+
+    def chapter_numbers(self, start: Optional[int] = None, end: Optional[int] = None) -> List[int]:
+        """Sorted indexed chapter numbers, optionally limited to ``start``-``end``"""
+        return [num for num in sorted(self.chapters)
+                if (start is None or num >= start) and (end is None or num <= end)]
+
+    def discover(self, session, cache: Optional[HtmlCache] = None, max_pages: int = 100,
+                 timeout: float = 20) -> List[int]:
+        """Fetch the catalogue (following its pagination) and merge it into the index.
+
+        Returns the chapter numbers that were not indexed before. With a cache,
+        unchanged catalogue pages are revalidated with a conditional GET.
+        """
+        queue = [self.catalogue_url]
+        visited = set()
+        found: Dict[int, Tuple[str, Optional[str]]] = {}
+
+        while queue and len(visited) < max_pages:
+            page_url = queue.pop(0)
+            if page_url in visited:
+                continue
+            visited.add(page_url)
+
+            if cache:
+                html, _ = cache.fetch(session, page_url, timeout=timeout)
+            else:
+                response = session.get(page_url, verify=False, timeout=timeout)
+                response.raise_for_status()
+                html = response.content
+
+            chapters, next_pages = parse_catalogue(html, page_url, self.base_url)
+            for chapter_num, url, title in chapters:
+                # A chapter can be linked twice (e.g. "latest chapters" box); keep the titled link
+                if chapter_num not in found or (title and not found[chapter_num][1]):
+                    found[chapter_num] = (url, title)
+            queue.extend(url for url in next_pages if url not in visited)
+
+        now = time.time()
+        new_chapters = sorted(num for num in found if num not in self.chapters)
+        for chapter_num, (url, title) in found.items():
+            entry = self.chapters.setdefault(chapter_num, {'first_seen': now})
+            entry['url'] = url
+            entry['title'] = title
+        self.discovered_at = now
+        if found:
+            self.save()
+        return new_chapters
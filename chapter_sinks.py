@@ -0,0 +1,108 @@
+"""
+Chapter records produced by FixedChapterExtractor.iter_chapters, and sinks that persist them.
+
+A sink is any object with ``write(chapter)`` and ``flush()``. The extractor
+hands every successfully extracted chapter to each of its sinks (by default a
+FolderSink on the output folder, or an ArchiveSink when archiving), so other
+tools can plug in their own or consume ``iter_chapters`` directly without
+going through the disk.
+"""
+
+import os
+from typing import List, Optional, Tuple
+
+from chapter_archive import ArchiveWriter, chapter_filename
+from extraction_metrics import ChapterTiming
+
+
+class Chapter:
+    """One extracted chapter: paragraphs and how they were obtained.
+
+    ``timings`` is the chapter's ChapterTiming (phase seconds, HTTP status,
+    bytes); ``error`` is set and ``paragraphs`` empty when extraction failed.
+    """
+
+    __slots__ = ('number', 'title', 'paragraphs', 'method', 'error', 'timings')
+
+    def __init__(self, number: int, title: Optional[str], paragraphs: Tuple[str, ...], method: Optional[str] = None,
+                 error: Optional[str] = None, timings: Optional[ChapterTiming] = None):
+        self.number = number
+        self.title = title
+        self.paragraphs = paragraphs
+        self.method = method
+        self.error = error
+        self.timings = timings
+
+    @classmethod
+    def from_content(cls, number: int, title: Optional[str], content: Optional[str], method: Optional[str] = None,
+                     error: Optional[str] = None, timings: Optional[ChapterTiming] = None) -> 'Chapter':
+        """Record for rendered content, whose paragraphs are separated by blank lines"""
+        return cls(number, title, tuple(content.split('\n\n')) if content else (), method, error, timings)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def content(self) -> str:
+        return '\n\n'.join(self.paragraphs)
+
+    @property
+    def http_status(self) -> Optional[int]:
+        return self.timings.http_status if self.timings else None
+
+    def __repr__(self) -> str:
+        state = f'{len(self.paragraphs)} paragraphs' if self.ok else f'failed: {self.error}'
+        return f'<Chapter {self.number} {state}>'
+
+
+class FolderSink:
+    """Writes Chapter_NNN.txt files (title, underline, content) into a folder"""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def write(self, chapter: Chapter):
+        with open(os.path.join(self.folder, chapter_filename(chapter.number)), 'w', encoding='utf-8') as f:
+            f.write(f'{chapter.title}\n')
+            f.write('=' * len(chapter.title) + '\n\n')
+            f.write(chapter.content)
+
+    def flush(self):
+        pass
+
+    def describe(self) -> str:
+        return f'Files saved in: {os.path.abspath(self.folder)}'
+
+
+class ArchiveSink:
+    """Appends chapters to a packed archive, committing its index on ``flush``"""
+
+    def __init__(self, writer: ArchiveWriter):
+        self.writer = writer
+
+    def write(self, chapter: Chapter):
+        self.writer.add_chapter(chapter.number, chapter.title, chapter.content)
+
+    def flush(self):
+        self.writer.commit()
+
+    def describe(self) -> str:
+        return f'Chapters saved in: {self.writer.archive_path}'
+
+
+class CollectSink:
+    """Keeps chapters in memory, for small in-process runs that consume the chapters directly"""
+
+    def __init__(self):
+        self.chapters: List[Chapter] = []
+
+    def write(self, chapter: Chapter):
+        self.chapters.append(chapter)
+
+    def flush(self):
+        pass
+
+    def describe(self) -> str:
+        return f'Chapters kept in memory: {len(self.chapters)}'
@@ -0,0 +1,119 @@
+import re
+from typing import List, Tuple
+
+FLAGS = re.DOTALL | re.IGNORECASE
+
+NEWLINE_RUNS = re.compile(r'\n\s*\n\s*\n+')
+# Runs of spaces/tabs become a single space. Tabs are turned into spaces first,
+# and a lone space already is one, so only runs of two or more are matched.
+SPACE_RUNS = re.compile(r'  +')
+
+# Non-ASCII characters that re.IGNORECASE matches against ASCII letters, or that
+# lower-case into ASCII (and change length doing so). Without them, str.lower()
+# keeps offsets and a substring search finds exactly the ASCII literals the
+# regex engine would.
+CASE_FOLDING_SPECIALS = '\u0130\u0131\u017f\u212a'
+
+
+class ContentCleaner:
+    """Precompiled ad/boilerplate removal shared by the extractors.
+
+    Each pattern is paired with the lower-case ASCII literals that any match
+    must contain, the first of which is the pattern's own prefix. Literals are
+    located with plain substring searches on one lower-cased copy: patterns
+    whose literals are absent are skipped, and the others are only tried at
+    the offsets where their prefix occurs. A clean page therefore costs a few
+    ``in`` checks plus the whitespace pass instead of a full case-insensitive
+    ``re.sub`` scan per pattern, and the output is identical to applying every
+    pattern in turn.
+    """
+
+    def __init__(self, name: str, patterns: List[Tuple[str, Tuple[str, ...]]]):
+        self.name = name
+        self.patterns = []
+        self.anchors = []
+        for pattern, anchors in patterns:
+            for anchor in anchors:
+                if not anchor.isascii() or anchor != anchor.lower():
+                    raise ValueError(f'Anchor must be lower-case ASCII: {anchor!r}')
+                if anchor not in self.anchors:
+                    self.anchors.append(anchor)
+            self.patterns.append((re.compile(pattern, FLAGS), anchors))
+
+    @staticmethod
+    def _matches(pattern, prefix: str, content: str, lowered: str) -> List[Tuple[int, int]]:
+        """Non-overlapping match spans, trying the pattern only where its prefix occurs"""
+        spans = []
+        position = lowered.find(prefix)
+        while position != -1:
+            match = pattern.match(content, position)
+            if match:
+                spans.append(match.span())
+                position = lowered.find(prefix, match.end())
+            else:
+                position = lowered.find(prefix, position + 1)
+        return spans
+
+    def _remove_patterns(self, content: str) -> str:
+        lowered = content.lower()
+        present = {anchor for anchor in self.anchors if anchor in lowered}
+
+        for pattern, anchors in self.patterns:
+            if not all(anchor in present for anchor in anchors):
+                continue
+            spans = self._matches(pattern, anchors[0], content, lowered)
+            if not spans:
+                continue
+
+            kept = []
+            last = 0
+            for start, end in spans:
+                kept.append((last, start))
+                last = end
+            kept.append((last, len(content)))
+            content = ''.join(content[start:end] for start, end in kept)
+            lowered = ''.join(lowered[start:end] for start, end in kept)
+            # Removing text can join new occurrences of literals that were absent
+            present.update(anchor for anchor in self.anchors if anchor not in present and anchor in lowered)
+
+        return content
+
+    def clean(self, content: str) -> str:
+        if any(special in content for special in CASE_FOLDING_SPECIALS):
+            for pattern, _ in self.patterns:
+                content = pattern.sub('', content)
+        else:
+            content = self._remove_patterns(content)
+
+        content = NEWLINE_RUNS.sub('\n\n', content)
+        if '\t' in content:
+            content = content.replace('\t', ' ')
+        if '  ' in content:
+            content = SPACE_RUNS.sub(' ', content)
+        return content.strip()
+
+
+# Patterns used by fixed_extractor.py, with the literals each one requires
+FIXED_CLEANER = ContentCleaner('fixed', [
+    (r'Remember the mobile version:.*', ('remember the mobile version:',)),
+    (r'<script.*?</script>', ('<script', '</script>')),
+    (r'<ins.*?</ins>', ('<ins', '</ins>')),
+    (r'adsbygoogle', ('adsbygoogle',)),
+    (r'googlesyndication', ('googlesyndication',)),
+    (r'data-ad-.*?=".*?"', ('data-ad-', '="')),
+    (r'crossorigin="anonymous"', ('crossorigin="anonymous"',)),
+])
+
+# Patterns used by single_chapter_missing_extract.py
+MISSING_CLEANER = ContentCleaner('missing', [
+    (r'<script[^>]*>.*?</script>', ('<script', '</script>')),
+    (r'<ins[^>]*>.*?</ins>', ('<ins', '</ins>')),
+    (r'adsbygoogle.*?push\(\{\}\);', ('adsbygoogle', 'push({});')),
+    (r'pagead2\.googlesyndication\.com.*', ('pagead2.googlesyndication.com',)),
+    (r'data-ad-[^=]*="[^"]*"', ('data-ad-', '="')),
+    (r'crossorigin="anonymous"', ('crossorigin="anonymous"',)),
+    (r'async=""', ('async=""',)),
+    (r'Report.*?bad translation', ('report', 'bad translation')),
+    (r'Select text and click.*Report.*', ('select text and click', 'report')),
+    (r'Words:\d+.*?Update:\d+/\d+/\d+.*?\d+:\d+:\d+', ('words:', 'update:')),
+])
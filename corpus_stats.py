@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Corpus statistics for raw and refined chapters, and a refinement-priority report.
+
+For every chapter in Extracted_Chapters_Fixed and True_Refining this counts
+words, sentences, paragraphs and words inside quotes, buckets paragraph
+lengths (the raw paragraphs are the ones the extractors assembled from <sent>
+tags), and counts machine-translation artifacts: dialogue of two speakers
+merged into one paragraph, stray quotes, spaced ellipses, garbled fragments,
+broken contractions, doubled words and run-on sentences. The MT score is the
+weighted artifact count per 1000 words; refined chapters score well under 1.
+
+Per-chapter counts are computed in a process pool and cached by content hash
+(corpus_stats_cache.json), so after a few edits only those chapters are read
+again. Aggregation works on columns, with numpy when it is installed.
+
+The report compares both corpora, lists the next chapters to refine with the
+ones that need the most work marked, the unrefined chapters with the most
+artifacts, and the refined chapters with the most artifacts left.
+
+Usage: python corpus_stats.py [--raw Extracted_Chapters_Fixed] [--refined True_Refining] [--next 20] [--json report.json]
+"""
+
+import argparse
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+from adaptive_concurrency import percentile
+from book_builder import read_chapter_file
+from cache_files import scan_cached
+from chapter_alignment import RESULT_FILE as ALIGNMENT_FILE, format_span, load_raw_mapping, raw_chapters_for
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional
+    np = None
+
+CACHE_FILE = 'corpus_stats_cache.json'
+STATS_VERSION = 1
+
+WORD = re.compile(r"[A-Za-z0-9]+(?:['’][A-Za-z]+)?")
+SENTENCE_BREAK = re.compile(r'(?<=[.!?…])["”’)]*\s+')
+QUOTED = re.compile(r'"[^"\n]*"|“[^”\n]*”')
+LONG_SENTENCE_WORDS = 40
+# Upper bounds (in words) of the paragraph length buckets; the last bucket is everything longer
+PARAGRAPH_BUCKETS = (10, 25, 50, 100, 200)
+
+# name -> (pattern, weight per occurrence)
+ARTIFACTS = {
+    'merged_dialogue': (re.compile(r'["”][ \t]+["“]'), 2.0),
+    'stray_quote': (re.compile(r'\s"(?=\s|$)'), 1.0),
+    'spaced_ellipsis': (re.compile(r'\s(?:…|\.\.\.)'), 1.0),
+    'fragment': (re.compile(r"(?<=[.!?] )[a-z][\w']{0,5}[.!?](?=\s|$)"), 5.0),
+    'broken_contraction': (re.compile(r"(?:[^\w\s]|\s)'(?:t|s|re|ll|ve|d|m)\b"), 5.0),
+    'doubled_word': (re.compile(r'\b(\w+)\s+\1\b', re.IGNORECASE), 1.0),
+    'long_sentence': (None, 0.5),
+}
+ARTIFACT_NAMES = list(ARTIFACTS)
+ARTIFACT_WEIGHTS = [weight for _, weight in ARTIFACTS.values()]
+
+COLUMNS = ('words', 'sentences', 'paragraphs', 'dialogue_words')
+
+
+def chapter_stats(path: str) -> dict:
+    """Counts of one chapter file (its title and underline are skipped)"""
+    _, body = read_chapter_file(path) or ('', '')
+    paragraphs = [paragraph for paragraph in body.split('\n\n') if paragraph.strip()]
+
+    words = sentences = dialogue_words = 0
+    histogram = [0] * (len(PARAGRAPH_BUCKETS) + 1)
+    artifacts = dict.fromkeys(ARTIFACT_NAMES, 0)
+    for paragraph in paragraphs:
+        paragraph_words = len(WORD.findall(paragraph))
+        words += paragraph_words
+        histogram[sum(paragraph_words > bound for bound in PARAGRAPH_BUCKETS)] += 1
+        dialogue_words += sum(len(WORD.findall(quote)) for quote in QUOTED.findall(paragraph))
+        for sentence in SENTENCE_BREAK.split(paragraph):
+            sentence_words = len(WORD.findall(sentence))
+            sentences += sentence_words > 0
+            artifacts['long_sentence'] += sentence_words > LONG_SENTENCE_WORDS
+        for name, (pattern, _) in ARTIFACTS.items():
+            if pattern is not None:
+                artifacts[name] += len(pattern.findall(paragraph))
+
+    return {
+        'words': words,
+        'sentences': sentences,
+        'paragraphs': len(paragraphs),
+        'dialogue_words': dialogue_words,
+        'paragraph_histogram': histogram,
+        'artifacts': artifacts,
+    }
+
+
+def collect_stats(folders: List[str], cache_path: Optional[str] = CACHE_FILE,
+                  workers: Optional[int] = None) -> Tuple[List[Dict[int, dict]], int]:
+    """Counts per chapter number for each folder, and how many chapters had to be read"""
+    return scan_cached(folders, chapter_stats, cache_path, STATS_VERSION, workers)
+
+
+def _percentiles(values: List[float], pcts: Tuple[float, ...]) -> List[float]:
+    if not values:
+        return [0.0] * len(pcts)
+    if np is not None:
+        # inverted_cdf is the nearest-rank percentile, as in the stdlib path
+        return [float(value) for value in np.percentile(np.asarray(values, dtype=float), pcts, method='inverted_cdf')]
+    return [float(percentile(values, pct)) for pct in pcts]
+
+
+def _column_sums(rows: List[List[float]]) -> List[float]:
+    if not rows:
+        return []
+    if np is not None:
+        return np.asarray(rows, dtype=float).sum(axis=0).tolist()
+    return [float(sum(column)) for column in zip(*rows)]
+
+
+def _weighted_rates(rows: List[List[float]], weights: List[float], per: List[float]) -> List[float]:
+    """Weighted sum of each row per 1000 units of ``per``"""
+    if not rows:
+        return []
+    if np is not None:
+        totals = np.asarray(rows, dtype=float) @ np.asarray(weights, dtype=float)
+        return (totals * 1000 / np.maximum(np.asarray(per, dtype=float), 1)).tolist()
+    return [sum(count * weight for count, weight in zip(row, weights)) * 1000 / max(units, 1)
+            for row, units in zip(rows, per)]
+
+
+class CorpusTable:
+    """Per-chapter counts of one folder as columns, with the derived rates"""
+
+    def __init__(self, name: str, stats: Dict[int, dict]):
+        self.name = name
+        self.numbers = sorted(stats)
+        self.columns = {column: [stats[num][column] for num in self.numbers] for column in COLUMNS}
+        self.histograms = [stats[num]['paragraph_histogram'] for num in self.numbers]
+        self.artifacts = [[stats[num]['artifacts'].get(name, 0) for name in ARTIFACT_NAMES] for num in self.numbers]
+        self.scores = _weighted_rates(self.artifacts, ARTIFACT_WEIGHTS, self.columns['words'])
+        self.dialogue = [dialogue / max(words, 1) for dialogue, words in
+                         zip(self.columns['dialogue_words'], self.columns['words'])]
+        self.sentence_words = [words / max(sentences, 1) for words, sentences in
+                               zip(self.columns['words'], self.columns['sentences'])]
+        self.row = {num: i for i, num in enumerate(self.numbers)}
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def __contains__(self, chapter_num: int) -> bool:
+        return chapter_num in self.row
+
+    def score(self, chapter_nums: List[int]) -> float:
+        """MT score of several chapters read as one"""
+        rows = [self.row[num] for num in chapter_nums if num in self.row]
+        words = sum(self.columns['words'][row] for row in rows)
+        return sum(self.scores[row] * self.columns['words'][row] for row in rows) / max(words, 1)
+
+    def words(self, chapter_nums: List[int]) -> int:
+        return sum(self.columns['words'][self.row[num]] for num in chapter_nums if num in self.row)
+
+    def summary(self) -> dict:
+        words = self.columns['words']
+        return {
+            'chapters': len(self),
+            'words': int(sum(words)),
+            'words_per_chapter': _percentiles(words, (10, 50, 90)),
+            'words_per_sentence': _percentiles(self.sentence_words, (10, 50, 90)),
+            'dialogue_ratio': _percentiles(self.dialogue, (10, 50, 90)),
+            'mt_score': _percentiles(self.scores, (10, 50, 90)),
+            'paragraph_histogram': [int(count) for count in _column_sums(self.histograms)],
+            'artifacts': dict(zip(ARTIFACT_NAMES, (int(count) for count in _column_sums(self.artifacts)))),
+        }
+
+    def rows(self) -> List[dict]:
+        return [{
+            'chapter': num,
+            'words': self.columns['words'][i],
+            'sentences': self.columns['sentences'][i],
+            'paragraphs': self.columns['paragraphs'][i],
+            'dialogue_ratio': round(self.dialogue[i], 4),
+            'mt_score': round(self.scores[i], 3),
+            'paragraph_histogram': self.histograms[i],
+            'artifacts': dict(zip(ARTIFACT_NAMES, self.artifacts[i])),
+        } for i, num in enumerate(self.numbers)]
+
+
+def refinement_priority(raw: CorpusTable, refined: CorpusTable, mapping: Dict[int, List[int]], offset: int,
+                        count: int) -> Tuple[List[dict], List[dict], List[dict]]:
+    """Next chapters to refine, unrefined chapters with the most artifacts, and refined ones with the most left"""
+    done_raw = {raw_num for num in refined.numbers for raw_num in raw_chapters_for(num, mapping, offset)}
+    frontier = max(refined.numbers, default=0)
+
+    def entry(refined_num, sources):
+        return {'refined': refined_num, 'raw': sources, 'words': raw.words(sources),
+                'mt_score': round(raw.score(sources), 3)}
+
+    upcoming = []
+    refined_num = frontier
+    while len(upcoming) < count:
+        refined_num += 1
+        sources = raw_chapters_for(refined_num, mapping, offset)
+        if not all(raw_num in raw for raw_num in sources):
+            break
+        upcoming.append(entry(refined_num, sources))
+
+    # Raw chapters past the frontier, numbered as the refined chapters they would become
+    unrefined = [entry(raw_num - offset, [raw_num]) for raw_num in raw.numbers
+                 if raw_num not in done_raw and raw_num - offset > frontier]
+    worst = sorted(unrefined, key=lambda item: -item['mt_score'])[:count]
+
+    leftover = [{'refined': num, 'raw': raw_chapters_for(num, mapping, offset),
+                 'mt_score': round(refined.score([num]), 3),
+                 'raw_mt_score': round(raw.score(raw_chapters_for(num, mapping, offset)), 3)}
+                for num in refined.numbers]
+    leftover = sorted(leftover, key=lambda item: -item['mt_score'])[:count]
+    return upcoming, worst, leftover
+
+
+def bar(value: float, scale: float, width: int = 30) -> str:
+    return '█' * int(round(width * value / scale)) if scale else ''
+
+
+def bucket_labels() -> List[str]:
+    bounds = (0,) + PARAGRAPH_BUCKETS
+    return [f'{low + 1}-{high}' for low, high in zip(bounds, PARAGRAPH_BUCKETS)] + [f'>{PARAGRAPH_BUCKETS[-1]}']
+
+
+def print_summaries(tables: List[CorpusTable], summaries: List[dict]):
+    def row(label, key, fmt):
+        cells = ''.join(f'{" / ".join(fmt(value) for value in summary[key]):>28}' for summary in summaries)
+        print(f'   {label:<22}{cells}')
+
+    print(f'   {"":<22}' + ''.join(f'{table.name:>28}' for table in tables))
+    print(f'   {"chapters":<22}' + ''.join(f'{summary["chapters"]:>28}' for summary in summaries))
+    print(f'   {"words":<22}' + ''.join(f'{summary["words"]:>28,}' for summary in summaries))
+    print('   p10 / p50 / p90:')
+    row('words per chapter', 'words_per_chapter', lambda value: f'{value:.0f}')
+    row('words per sentence', 'words_per_sentence', lambda value: f'{value:.1f}')
+    row('dialogue', 'dialogue_ratio', lambda value: f'{value:.0%}')
+    row('MT score', 'mt_score', lambda value: f'{value:.2f}')
+
+    print('\n   Paragraph length (words):')
+    shares = [[count / max(sum(summary['paragraph_histogram']), 1) for count in summary['paragraph_histogram']]
+              for summary in summaries]
+    for i, label in enumerate(bucket_labels()):
+        cells = '  '.join(f'{table.name} {share[i]:4.0%} {bar(share[i], 1.0, 20):<20}'
+                          for table, share in zip(tables, shares))
+        print(f'   {label:>8}  {cells}')
+
+    print('\n   MT artifacts per 1000 words:')
+    for name in ARTIFACT_NAMES:
+        cells = ''.join(f'{summary["artifacts"][name] * 1000 / max(summary["words"], 1):>28.2f}'
+                        for summary in summaries)
+        print(f'   {name:<22}{cells}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Corpus statistics and the chapters that need refining most')
+    parser.add_argument('--raw', default='Extracted_Chapters_Fixed')
+    parser.add_argument('--refined', default='True_Refining')
+    parser.add_argument('--next', type=int, default=20, help='chapters per list (default: 20)')
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--no-cache', action='store_true', help='recount every chapter')
+    parser.add_argument('--json', help='also write the full per-chapter report to this file')
+    args = parser.parse_args()
+
+    print("🐉 Dragon Talisman - Corpus Statistics")
+    print("=" * 60)
+
+    (raw_stats, refined_stats), scanned = collect_stats([args.raw, args.refined],
+                                                        None if args.no_cache else CACHE_FILE, args.workers)
+    raw, refined = CorpusTable('raw', raw_stats), CorpusTable('refined', refined_stats)
+    print(f"📄 {len(raw)} raw and {len(refined)} refined chapters ({scanned} counted, "
+          f"{len(raw) + len(refined) - scanned} unchanged){'' if np is not None else ' - numpy not installed'}\n")
+
+    tables = [table for table in (raw, refined) if len(table)]
+    summaries = [table.summary() for table in tables]
+    print_summaries(tables, summaries)
+
+    mapping, offset = load_raw_mapping(ALIGNMENT_FILE)
+    upcoming, worst, leftover = refinement_priority(raw, refined, mapping, offset, args.next)
+    heavy = _percentiles(raw.scores, (90,))[0]
+
+    if upcoming:
+        first, last = upcoming[0]['refined'], upcoming[-1]['refined']
+        print(f"\n📌 Next to refine (⚠️ = MT score above the raw p90 of {heavy:.2f}):")
+        for item in upcoming:
+            mark = ' ⚠️' if item['mt_score'] > heavy else ''
+            print(f"   Refined {item['refined']:>4} ← raw {format_span(item['raw']):<10} {item['words']:>6} words  "
+                  f"MT {item['mt_score']:5.2f} {bar(item['mt_score'], max(heavy * 1.5, 1e-9), 20)}{mark}")
+        print(f"   python refinement_batch.py generate {first} {last}")
+
+    if worst:
+        print("\n🔥 Unrefined chapters with the most MT artifacts:")
+        for item in worst:
+            print(f"   Refined {item['refined']:>4} ← raw {format_span(item['raw']):<10} {item['words']:>6} words  "
+                  f"MT {item['mt_score']:5.2f}")
+
+    if leftover:
+        print("\n✨ Refined chapters with the most artifacts left:")
+        for item in leftover:
+            print(f"   Refined {item['refined']:>4}  MT {item['mt_score']:5.2f}  "
+                  f"(raw {format_span(item['raw'])}: {item['raw_mt_score']:.2f})")
+
+    if args.json:
+        report = {
+            'summary': {table.name: summary for table, summary in zip(tables, summaries)},
+            'paragraph_buckets': bucket_labels(),
+            'artifact_weights': dict(zip(ARTIFACT_NAMES, ARTIFACT_WEIGHTS)),
+            'next_to_refine': upcoming,
+            'most_artifacts_unrefined': worst,
+            'most_artifacts_refined': leftover,
+            'raw': raw.rows(),
+            'refined': refined.rows(),
+        }
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1)
+        print(f"\n💾 Report saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import bisect
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import requests
+
+# Phases timed for every chapter, in pipeline order. ttfb runs from sending the
+# request to parsed response headers (so it includes connecting); download is
+# the rest of the fetch, including any cache read.
+PHASES = ('ttfb', 'download', 'parse', 'assemble', 'clean', 'write')
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Finer bounds the summary's percentiles are estimated from: 20 per decade (about 12% apart), 0.1ms to 100s
+QUANTILE_BUCKETS = tuple(10 ** (k / 20) for k in range(-80, 41))
+
+
+def classify_error(error: BaseException) -> str:
+    """Short, aggregatable failure kind for an exception raised while fetching"""
+    if isinstance(error, requests.HTTPError):
+        response = error.response
+        return f'http_{response.status_code}' if response is not None else 'http'
+    if isinstance(error, requests.Timeout):
+        return 'timeout'
+    if isinstance(error, requests.ConnectionError):
+        return 'connection'
+    if isinstance(error, requests.RequestException):
+        return 'network'
+    if isinstance(error, LookupError):
+        return 'not_cached'
+    return type(error).__name__
+
+
+class ChapterTiming:
+    """Phase timings, size and outcome of one chapter"""
+
+    def __init__(self, chapter_num: int):
+        self.chapter_num = chapter_num
+        self.phases: Dict[str, float] = {}
+        self.bytes = 0
+        self.method: Optional[str] = None
+        self.http_status: Optional[int] = None
+        # Site the page came from when mirrors are configured
+        self.source: Optional[str] = None
+        self.ok: Optional[bool] = None
+        self.error_kind: Optional[str] = None
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def fail(self, kind: str, error: str):
+        self.ok = False
+        self.error_kind = kind
+        self.error = error
+
+    def to_dict(self) -> dict:
+        return {
+            'chapter': self.chapter_num,
+            'ok': self.ok,
+            'http_status': self.http_status,
+            'source': self.source,
+            'bytes': self.bytes,
+            'method': self.method,
+            'error_kind': self.error_kind,
+            'error': self.error,
+            'started_at': round(self.started_at, 3),
+            'seconds': {phase: round(self.phases[phase], 6) for phase in PHASES if phase in self.phases},
+        }
+
+
+class Histogram:
+    """Bucketed distribution in the Prometheus style"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        # Observations per bucket; the last one holds those above every bound
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+
+    def cumulative(self) -> List[int]:
+        """Observations at or below each bound, as Prometheus buckets count them"""
+        return list(itertools.accumulate(self.counts[:-1]))
+
+    def quantile(self, pct: float) -> float:
+        """Nearest-rank percentile, interpolated within the bucket it falls in"""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(pct / 100 * self.count))
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+
+def ttfb_hook(timings: Dict[str, float]):
+    """``requests`` response hook adding each response's time to first byte to ``timings``"""
+    def hook(response, *args, **kwargs):
+        timings['ttfb'] = timings.get('ttfb', 0.0) + response.elapsed.total_seconds()
+    return hook
+
+
+class MetricsRecorder:
+    """Times every chapter and keeps running aggregates of the finished ones.
+
+    ``start()`` makes the record current for the calling thread. Times to first
+    byte are attached by ``ttfb_hook``, given the record's phases explicitly,
+    because hedged downloads run in other threads. ``finish()`` folds a record
+    into per-phase histograms and counters and appends it as one JSON line to
+    the run's .jsonl file, so memory stays flat however many chapters a run
+    has; ``save()`` completes the file and writes a Prometheus text file next
+    to it.
+    """
+
+    def __init__(self, metrics_folder: str = 'Extraction_Metrics'):
+        self.metrics_folder = metrics_folder
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.chapters = 0
+        self.bytes = 0
+        self.histograms = {phase: Histogram() for phase in PHASES}
+        self.quantiles = {phase: Histogram(QUANTILE_BUCKETS) for phase in PHASES}
+        self.errors: Dict[str, int] = {}
+        self.outcomes: Dict[tuple, int] = {}
+        # JSON lines of the chapters finished since the last save
+        self.jsonl = None
+        self.stem: Optional[str] = None
+
+    @classmethod
+    def beside(cls, output_folder: str) -> 'MetricsRecorder':
+        """Metrics stored next to a chapter output folder"""
+        parent = os.path.dirname(os.path.abspath(output_folder))
+        return cls(os.path.join(parent, 'Extraction_Metrics'))
+
+    def start(self, chapter_num: int) -> ChapterTiming:
+        record = ChapterTiming(chapter_num)
+        self.local.current = record
+        return record
+
+    def current(self) -> Optional[ChapterTiming]:
+        """Record started most recently in the calling thread"""
+        return getattr(self.local, 'current', None)
+
+    def finish(self, record: ChapterTiming):
+        if self.current() is record:
+            self.local.current = None
+        with self.lock:
+            self.chapters += 1
+            self.bytes += record.bytes
+            for phase, seconds in record.phases.items():
+                self.histograms[phase].observe(seconds)
+                self.quantiles[phase].observe(seconds)
+            if record.error_kind:
+                self.errors[record.error_kind] = self.errors.get(record.error_kind, 0) + 1
+            outcome = ('ok' if record.ok else 'error', record.method or '', record.error_kind or '')
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+            if self.jsonl is None:
+                os.makedirs(self.metrics_folder, exist_ok=True)
+                self.stem = os.path.join(self.metrics_folder, time.strftime('run_%Y%m%d_%H%M%S'))
+                self.jsonl = open(self.stem + '.jsonl', 'w', encoding='utf-8')
+            self.jsonl.write(json.dumps(record.to_dict()) + '\n')
+
+    def summary_lines(self) -> List[str]:
+        """Per-phase p50/p95 and share of total time, for the end-of-run summary"""
+        with self.lock:
+            grand_total = sum(histogram.sum for histogram in self.histograms.values()) or 1.0
+            lines = []
+            for phase, histogram in self.quantiles.items():
+                if not histogram.count:
+                    continue
+                lines.append(f'{phase:<9} p50 {histogram.quantile(50) * 1000:8.1f}ms  '
+                             f'p95 {histogram.quantile(95) * 1000:8.1f}ms  '
+                             f'{histogram.sum / grand_total * 100:5.1f}% of time')
+            if self.errors:
+                errors = ', '.join(f'{kind}: {count}' for kind, count in sorted(self.errors.items()))
+                lines.append(f'errors    {errors}')
+        return lines
+
+    def write_prometheus(self, path: str):
+        lines = ['# HELP chapter_phase_seconds Time spent per chapter in each extraction phase',
+                 '# TYPE chapter_phase_seconds histogram']
+        with self.lock:
+            for phase, histogram in self.histograms.items():
+                for bound, count in zip(histogram.buckets, histogram.cumulative()):
+                    lines.append(f'chapter_phase_seconds_bucket{{phase="{phase}",le="{bound:g}"}} {count}')
+                lines.append(f'chapter_phase_seconds_bucket{{phase="{phase}",le="+Inf"}} {histogram.count}')
+                lines.append(f'chapter_phase_seconds_sum{{phase="{phase}"}} {histogram.sum:.6f}')
+                lines.append(f'chapter_phase_seconds_count{{phase="{phase}"}} {histogram.count}')
+
+            lines += ['# HELP chapter_bytes_total Response bytes transferred for chapter pages',
+                      '# TYPE chapter_bytes_total counter',
+                      f'chapter_bytes_total {self.bytes}']
+
+            lines += ['# HELP chapters_total Chapters processed by outcome, extraction method and error kind',
+                      '# TYPE chapters_total counter']
+            for (status, method, kind), count in sorted(self.outcomes.items()):
+                lines.append(f'chapters_total{{status="{status}",method="{method}",error_kind="{kind}"}} {count}')
+
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def save(self) -> Optional[str]:
+        """Complete this run's JSON lines and write the Prometheus file next to them; returns the JSONL path.
+
+        Chapters finished after a save go to a new pair of files; the
+        aggregates (and so the summary and the Prometheus counters) cover
+        every chapter since the recorder was created.
+        """
+        with self.lock:
+            if self.jsonl is None:
+                return None
+            self.jsonl.close()
+            self.jsonl = None
+            stem = self.stem
+        self.write_prometheus(stem + '.prom')
+        return stem + '.jsonl'
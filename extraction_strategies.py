@@ -0,0 +1,282 @@
+"""
+Content-container strategies shared by the extractors, ordered by what has worked.
+
+A strategy is one content container (a name from parser_backends.CONTAINERS or
+a ``#id`` / ``.class`` selector) plus what it has to contain to count: <sent>
+tags, plain text, or either. Each strategy is resolved once, and before its
+container is searched for, the page markup is checked for the id or class
+value. Pages that cannot contain the container skip the tree search.
+
+A StrategyRegistry records hits, misses and time spent per strategy, and which
+strategies last matched in each range of chapters. Chapters try the latest of
+their own strategies to win their range (or the nearest range with one) first,
+then the rest by hit rate per second spent. When the site layout changes from
+some chapter on, chapters in that range go straight to the new container
+instead of falling through searches that fail. The primary site's registry is
+saved next to the output folder in extraction_strategies.json, so both
+extractors learn from each other's runs. Statistics are kept per container and
+mode: a showReading hit on plain text says nothing about whether the page had
+<sent> tags.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from cache_files import locked, read_json, write_json
+from parser_backends import CONTAINERS, ParsedContainer, ParsedPage, register_container
+
+# What a container must hold for a strategy to match
+SENTENCES = 'sent'
+TEXT = 'text'
+EITHER = 'sent-or-text'
+
+STRATEGIES_FILE = 'extraction_strategies.json'
+RANGE_SIZE = 50
+
+
+class Strategy:
+    """One content container and what it has to contain"""
+
+    __slots__ = ('name', 'mode', 'key', 'needle', 'byte_needle')
+
+    def __init__(self, container: str, mode: str = EITHER):
+        if mode not in (SENTENCES, TEXT, EITHER):
+            raise ValueError(f'Unknown strategy mode {mode!r}')
+        self.name = register_container(container)
+        self.mode = mode
+        # What the registry keys statistics by
+        self.key = f'{self.name}/{mode}'
+        self.needle = CONTAINERS[self.name][1]
+        self.byte_needle = self.needle.encode('utf-8')
+
+    def present(self, markup) -> bool:
+        """False only when the markup cannot contain the container"""
+        if markup is None:
+            return True
+        if isinstance(markup, str):
+            return self.needle in markup
+        # UTF-16 pages do not contain the value as plain bytes
+        return markup[:2] in (b'\xff\xfe', b'\xfe\xff') or self.byte_needle in markup
+
+    def accepts(self, container: ParsedContainer) -> bool:
+        if self.mode != TEXT and any(container.sentences):
+            return True
+        return self.mode != SENTENCES and bool(container.text.strip())
+
+    def locate(self, page: ParsedPage) -> Optional[ParsedContainer]:
+        """The page's container if it holds what this strategy needs"""
+        if not self.present(page.markup):
+            return None
+        container = page.container(self.name)
+        return container if container is not None and self.accepts(container) else None
+
+    def __reduce__(self):
+        # Rebuilt through __init__, so worker processes (spawn start method) register the selector too
+        return Strategy, (self.name, self.mode)
+
+    def __repr__(self) -> str:
+        return f'<Strategy {self.name} {self.mode}>'
+
+
+def site_strategies(text_fallback: bool = False) -> List[Strategy]:
+    """The primary site's containers, in the order the extractors used to try them.
+
+    The missing-chapter extractor counts showReading and readBox only with <sent>
+    tags; the fixed extractor (``text_fallback``) falls back to their plain text.
+    """
+    first = EITHER if text_fallback else SENTENCES
+    return [Strategy('showReading', first), Strategy('readBox', first),
+            Strategy('readcontent', EITHER), Strategy('textbox', TEXT)]
+
+
+def locate(page: ParsedPage, strategies: List[Strategy],
+           attempts: Optional[list] = None) -> Tuple[Optional[Strategy], Optional[ParsedContainer]]:
+    """First strategy in order that matches the page, and its container.
+
+    Every strategy tried is appended to ``attempts`` as ``(key, hit, seconds)``,
+    for StrategyRegistry.record (the pipelined mode locates in worker processes).
+    """
+    attempts = [] if attempts is None else attempts
+    for strategy in strategies:
+        start = time.perf_counter()
+        container = strategy.locate(page)
+        attempts.append((strategy.key, container is not None, time.perf_counter() - start))
+        if container is not None:
+            return strategy, container
+    return None, None
+
+
+class StrategyStats:
+    __slots__ = ('attempts', 'hits', 'seconds')
+
+    def __init__(self, attempts: int = 0, hits: int = 0, seconds: float = 0.0):
+        self.attempts = attempts
+        self.hits = hits
+        self.seconds = seconds
+
+    def copy(self) -> 'StrategyStats':
+        return StrategyStats(self.attempts, self.hits, self.seconds)
+
+    def score(self) -> float:
+        # Chance of a hit per second spent trying; the best order for a sequence of independent searches.
+        # Untried strategies start at an even chance and 1ms.
+        hit_rate = (self.hits + 1) / (self.attempts + 2)
+        cost = self.seconds / self.attempts if self.attempts else 0.001
+        return hit_rate / max(cost, 1e-6)
+
+
+class StrategyRegistry:
+    """Strategies of one site, with their statistics and the winning strategies of each chapter range"""
+
+    def __init__(self, name: str, strategies: List[Strategy], path: Optional[str] = None,
+                 range_size: int = RANGE_SIZE):
+        self.name = name
+        self.strategies = list(strategies)
+        self.path = path
+        self.range_size = range_size
+        self.stats: Dict[str, StrategyStats] = {strategy.key: StrategyStats() for strategy in self.strategies}
+        # Strategies that matched in each range, the latest first; other extractors' strategies are kept too
+        self.range_winners: Dict[int, List[str]] = {}
+        # Statistics as last read from or written to the file, so save() only adds what this run found
+        self.saved: Dict[str, StrategyStats] = {}
+        # Range -> this run's latest winner there, not saved yet
+        self.changed_ranges: Dict[int, str] = {}
+        self.fallthroughs = 0
+        self.lock = threading.Lock()
+        if path:
+            self.load()
+
+    @classmethod
+    def beside(cls, output_folder: str, name: str = 'primary',
+               strategies: Optional[List[Strategy]] = None) -> 'StrategyRegistry':
+        """Registry stored next to a chapter output folder, by default the primary site's"""
+        parent = os.path.dirname(os.path.abspath(output_folder))
+        return cls(name, strategies or site_strategies(), os.path.join(parent, STRATEGIES_FILE))
+
+    def _read_entry(self) -> Tuple[Dict[str, StrategyStats], Dict[int, List[str]]]:
+        # Files from before statistics were kept per mode hold bare container names, which are dropped
+        entry = read_json(self.path).get(self.name, {})
+        stats = {key: StrategyStats(attempts, hits, seconds)
+                 for key, (attempts, hits, seconds) in entry.get('stats', {}).items() if '/' in key}
+        ranges = {}
+        if entry.get('range_size') == self.range_size:
+            for bucket, keys in entry.get('ranges', {}).items():
+                keys = [key for key in ([keys] if isinstance(keys, str) else keys) if '/' in key]
+                if keys:
+                    ranges[int(bucket)] = keys
+        return stats, ranges
+
+    def load(self):
+        stats, ranges = self._read_entry()
+        with self.lock:
+            for key, loaded in stats.items():
+                if key in self.stats:
+                    self.stats[key] = loaded
+                    self.saved[key] = loaded.copy()
+            self.range_winners = ranges
+            self.changed_ranges.clear()
+
+    def save(self):
+        """Merge this run's statistics and range winners into the file, keeping other runs' and sites' entries"""
+        if not self.path:
+            return
+        with locked(self.path):
+            totals, ranges = self._read_entry()
+            with self.lock:
+                for key, current in self.stats.items():
+                    base = self.saved.get(key, StrategyStats())
+                    merged = totals.setdefault(key, StrategyStats())
+                    merged.attempts += current.attempts - base.attempts
+                    merged.hits += current.hits - base.hits
+                    merged.seconds += current.seconds - base.seconds
+                    self.stats[key] = merged.copy()
+                    self.saved[key] = merged.copy()
+                for bucket, key in self.changed_ranges.items():
+                    ranges[bucket] = [key] + [other for other in ranges.get(bucket, []) if other != key]
+                self.range_winners = ranges
+                self.changed_ranges.clear()
+                entry = {
+                    'range_size': self.range_size,
+                    'stats': {key: [stats.attempts, stats.hits, round(stats.seconds, 6)]
+                              for key, stats in sorted(totals.items())},
+                    'ranges': {str(bucket): keys for bucket, keys in sorted(ranges.items())},
+                }
+            data = read_json(self.path)
+            data[self.name] = entry
+            write_json(self.path, data, indent=2)
+
+    def _own_winner(self, bucket: int) -> Optional[str]:
+        # Latest of this registry's strategies to win a range
+        return next((key for key in self.range_winners.get(bucket, ()) if key in self.stats), None)
+
+    def _range_winner(self, chapter_num: int) -> Optional[str]:
+        # Winner of the chapter's own range, else of the nearest range that has one (the lower one on a tie)
+        bucket = chapter_num // self.range_size
+        for other in sorted(self.range_winners, key=lambda other: (abs(other - bucket), other)):
+            winner = self._own_winner(other)
+            if winner:
+                return winner
+        return None
+
+    def order(self, chapter_num: int) -> List[Strategy]:
+        """Strategies in the order a chapter should try them"""
+        with self.lock:
+            winner = self._range_winner(chapter_num)
+            scores = {name: stats.score() for name, stats in self.stats.items()}
+        # sorted() is stable, so equal scores keep the declared order
+        ranked = sorted(self.strategies, key=lambda strategy: -scores[strategy.key])
+        return sorted(ranked, key=lambda strategy: strategy.key != winner)
+
+    def record(self, chapter_num: int, attempts: List[Tuple[str, bool, float]]):
+        """Add the outcome of locating one chapter's container"""
+        with self.lock:
+            for key, hit, seconds in attempts:
+                stats = self.stats.get(key)
+                if stats is None:
+                    continue
+                stats.attempts += 1
+                stats.hits += hit
+                stats.seconds += seconds
+                if hit:
+                    bucket = chapter_num // self.range_size
+                    winners = self.range_winners.setdefault(bucket, [])
+                    if winners[:1] != [key]:
+                        self.range_winners[bucket] = [key] + [other for other in winners if other != key]
+                    self.changed_ranges[bucket] = key
+            if len(attempts) > 1:
+                self.fallthroughs += 1
+
+    def select(self, page: ParsedPage, chapter_num: int) -> Tuple[Optional[Strategy], Optional[ParsedContainer]]:
+        """Locate a chapter's container in the learned order and record the outcome"""
+        attempts = []
+        found = locate(page, self.order(chapter_num), attempts)
+        self.record(chapter_num, attempts)
+        return found
+
+    def layout_ranges(self) -> List[Tuple[int, int, str]]:
+        """Consecutive chapter ranges ``(first, last, strategy)`` with the same winning strategy"""
+        with self.lock:
+            buckets = [(bucket, self._own_winner(bucket)) for bucket in sorted(self.range_winners)]
+        ranges = []
+        for bucket, name in buckets:
+            if name is None:
+                continue
+            first, last = max(1, bucket * self.range_size), (bucket + 1) * self.range_size - 1
+            if ranges and ranges[-1][2] == name and ranges[-1][1] + 1 == first:
+                ranges[-1] = (ranges[-1][0], last, name)
+            else:
+                ranges.append((first, last, name))
+        return ranges
+
+    def describe(self) -> str:
+        with self.lock:
+            used = [(name, stats) for name, stats in self.stats.items() if stats.attempts]
+            fallthroughs = self.fallthroughs
+        if not used:
+            return 'no pages located yet'
+        hits = ', '.join(f'{name} {stats.hits}/{stats.attempts} ({stats.seconds / stats.attempts * 1000:.2f}ms)'
+                         for name, stats in used)
+        layout = ', '.join(f'{first}-{last} {name}' for first, last, name in self.layout_ranges())
+        return f'{hits}; {fallthroughs} pages needed more than one search; layout: {layout}'
@@ -0,0 +1,209 @@
+import asyncio
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from adaptive_concurrency import AdaptiveConcurrency
+
+# Marks the end of the results in FetchEngine.iterate
+DONE = object()
+
+
+class TokenBucket:
+    """Token bucket that limits requests per second for a single host.
+
+    Tokens can be taken from the event loop (``acquire``) and from plain
+    threads (``wait``) at the same time.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _take(self) -> float:
+        """Take a token if there is one and return 0, else the seconds until there will be"""
+        if self.rate <= 0:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        while True:
+            delay = self._take()
+            if not delay:
+                return
+            await asyncio.sleep(delay)
+
+    def wait(self):
+        """Blocking ``acquire`` for threads outside the event loop"""
+        while True:
+            delay = self._take()
+            if not delay:
+                return
+            time.sleep(delay)
+
+
+class HostLimiter:
+    """Per-host token buckets, shared by every FetchEngine run of an extractor and
+    by requests it makes outside them (hedged mirror requests), so together they
+    keep to ``requests_per_second`` per host."""
+
+    def __init__(self, requests_per_second: float, burst: Optional[float] = None):
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.lock = threading.Lock()
+
+    def bucket_for(self, host: str) -> TokenBucket:
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.requests_per_second, self.burst)
+            return self.buckets[host]
+
+    def set_rate(self, requests_per_second: float):
+        with self.lock:
+            self.requests_per_second = requests_per_second
+            self.buckets.clear()
+
+    def wait(self, url: str):
+        """Block until a request to ``url``'s host may start"""
+        self.bucket_for(urlparse(url).netloc).wait()
+
+
+class FetchEngine:
+    """asyncio scheduler that runs blocking chapter jobs under an in-flight
+    limit and a per-host requests-per-second budget.
+
+    Jobs are plain callables (they use ``requests`` underneath), so each one is
+    handed to a worker thread once the scheduler has granted it a slot and a
+    token for its host.
+
+    With an ``AdaptiveConcurrency`` controller the in-flight limit is the
+    controller's current limit (up to its ``max_limit``) instead of
+    ``max_in_flight``, and new jobs wait out any ``Retry-After`` pause. The jobs
+    themselves report their responses to the controller.
+
+    Passing a ``limiter`` shares its per-host token buckets with requests made
+    outside the engine; its rate then replaces ``requests_per_second``.
+    """
+
+    def __init__(self, max_in_flight: int = 8, requests_per_second: float = 4.0,
+                 burst: Optional[float] = None, controller: Optional[AdaptiveConcurrency] = None,
+                 limiter: Optional[HostLimiter] = None):
+        self.controller = controller
+        self.max_in_flight = max(1, controller.max_limit if controller else max_in_flight)
+        # An extractor's own limiter (which sets the rate) outlives this run and also limits its hedged requests
+        self.limiter = limiter or HostLimiter(requests_per_second, burst)
+        self.requests_per_second = self.limiter.requests_per_second
+
+    def bucket_for(self, host: str) -> TokenBucket:
+        return self.limiter.bucket_for(host)
+
+    def run(self, items: Iterable[Any], job: Callable[[Any], Any], url_for: Callable[[Any], str],
+            on_result: Optional[Callable[[Any, Any], None]] = None) -> List[Tuple[Any, Any]]:
+        """Run ``job(item)`` for every item and return ``(item, result)`` pairs
+        in completion order. ``on_result`` is called as each job finishes."""
+        return asyncio.run(self._run(items, job, url_for, on_result))
+
+    def iterate(self, items: Iterable[Any], job: Callable[[Any], Any], url_for: Callable[[Any], str],
+                buffer: Optional[int] = None) -> Iterator[Tuple[Any, Any]]:
+        """Yield ``(item, result)`` pairs as jobs finish, without keeping them.
+
+        Items are pulled from ``items`` only as slots free up, and the scheduler
+        stops starting jobs while ``buffer`` results (default: the in-flight
+        limit) are waiting to be consumed, so at most ``max_in_flight + buffer``
+        items are held however long ``items`` is. Closing the generator early
+        stops the remaining jobs from starting.
+        """
+        finished: queue.Queue = queue.Queue(maxsize=buffer or self.max_in_flight)
+        stop = threading.Event()
+        failure: List[BaseException] = []
+
+        def deliver(item, result):
+            # Runs on the event loop: blocking it here is what holds back new jobs
+            while not stop.is_set():
+                try:
+                    finished.put((item, result), timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def produce():
+            try:
+                pending = itertools.takewhile(lambda _: not stop.is_set(), items)
+                asyncio.run(self._run(pending, job, url_for, deliver, collect=False))
+            except BaseException as e:
+                failure.append(e)
+            finally:
+                finished.put(DONE)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            while True:
+                pair = finished.get()
+                if pair is DONE:
+                    break
+                yield pair
+        finally:
+            stop.set()
+            # Unblock the producer if it is waiting for room, then let in-flight jobs finish
+            while producer.is_alive():
+                try:
+                    finished.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            producer.join()
+        if failure:
+            raise failure[0]
+
+    async def _run(self, items, job, url_for, on_result, collect=True):
+        loop = asyncio.get_running_loop()
+        pending = iter(items)
+        results = []
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            async def worker():
+                for item in pending:
+                    if self.controller:
+                        await self._acquire_slot()
+                    try:
+                        host = urlparse(url_for(item)).netloc
+                        await self.bucket_for(host).acquire()
+                        result = await loop.run_in_executor(executor, job, item)
+                    finally:
+                        if self.controller:
+                            self.controller.release()
+                    if collect:
+                        results.append((item, result))
+                    if on_result:
+                        on_result(item, result)
+
+            await asyncio.gather(*(worker() for _ in range(self.max_in_flight)))
+
+        return results
+
+    async def _acquire_slot(self):
+        """Wait for the controller to allow one more request in flight"""
+        while True:
+            pause = self.controller.pause_remaining()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            elif self.controller.try_acquire():
+                return
+            else:
+                await asyncio.sleep(0.02)
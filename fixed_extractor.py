@@ -1,20 +1,122 @@
 ﻿import requests
 import urllib3
-from bs4 import BeautifulSoup
 import os
 import time
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import re
 
+from adaptive_concurrency import AdaptiveConcurrency, retry_after_seconds
+from chapter_archive import ArchiveWriter
+from chapter_index import ChapterIndex
+from chapter_sinks import ArchiveSink, Chapter, FolderSink
+from content_cleaner import FIXED_CLEANER
+from extraction_metrics import MetricsRecorder, classify_error, ttfb_hook
+from fetch_engine import FetchEngine, HostLimiter
+from html_cache import HtmlCache
+from extraction_strategies import StrategyRegistry, locate, site_strategies
+from mirror_fetch import MIRRORS_FILE, HedgedFetcher, Source, load_mirrors
+from parser_backends import DEFAULT_BACKEND, parse_page
+from run_manifest import RunManifest
+from streaming_fetch import read_until_content
+from transport import HTTP2_AVAILABLE, build_session
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+def render_chapter(chapter_num, html, parser_backend=DEFAULT_BACKEND, timings=None, strategies=None, attempts=None):
+    # Parse, assemble and clean one page. Returns (title, content, method, error);
+    # kept at module level so the pipelined mode can run it in worker processes.
+    # Seconds spent parsing, assembling and cleaning are added to `timings` if given.
+    # `strategies` are the content strategies of the site the page came from, in the order to try them
+    # (default: the primary site's); every one tried is appended to `attempts` for its StrategyRegistry.
+    timings = {} if timings is None else timings
+    mark = time.perf_counter()
+    
+    def lap(phase):
+        nonlocal mark
+        now = time.perf_counter()
+        timings[phase] = timings.get(phase, 0.0) + now - mark
+        mark = now
+    
+    page = parse_page(html, parser_backend)
+    
+    # Get title
+    title_text = page.title or f'Chapter {chapter_num}'
+    
+    # CRITICAL FIX: Look for the correct content container
+    _, content_div = locate(page, strategies or site_strategies(text_fallback=True), attempts)
+    
+    if not content_div:
+        lap('parse')
+        return title_text, None, None, 'No content container found'
+    
+    method = f'{content_div.name} div'
+    # Text of all <sent> elements which contain the actual content
+    sent_elements = content_div.sentences
+    lap('parse')
+    
+    if sent_elements:
+        # Combine all sentences into paragraphs
+        content_parts = []
+        current_paragraph = []
+        
+        for sent_text in sent_elements:
+            if sent_text:
+                # Check if this should start a new paragraph
+                if (sent_text.startswith('"') and current_paragraph and 
+                    not current_paragraph[-1].endswith('"')):
+                    # Start new paragraph for dialogue
+                    if current_paragraph:
+                        content_parts.append(' '.join(current_paragraph))
+                        current_paragraph = [sent_text]
+                    else:
+                        current_paragraph.append(sent_text)
+                elif len(sent_text) > 100 and current_paragraph:
+                    # Long sentences often start new paragraphs
+                    content_parts.append(' '.join(current_paragraph))
+                    current_paragraph = [sent_text]
+                else:
+                    current_paragraph.append(sent_text)
+        
+        # Add the last paragraph
+        if current_paragraph:
+            content_parts.append(' '.join(current_paragraph))
+        
+        # Join paragraphs with double newlines
+        content = '\n\n'.join(content_parts)
+        method += ' with <sent> tags'
+    else:
+        # Fallback: get all text from the div
+        content = content_div.text.strip()
+        method += ' text'
+        # Remove script tags and ads
+        content = re.sub(r'<script.*?</script>', '', content, flags=re.DOTALL)
+        content = re.sub(r'<ins.*?</ins>', '', content, flags=re.DOTALL)
+    lap('assemble')
+    
+    # Clean up the content
+    content = FIXED_CLEANER.clean(content)
+    lap('clean')
+    
+    if len(content) <= 100:  # Only save if we have substantial content
+        return title_text, None, method, f'Insufficient content: {len(content)} chars'
+    
+    return title_text, content, method, None
+
 class FixedChapterExtractor:
-    def __init__(self, base_url='https://novelhi.com/s/Dragon-Talisman', output_folder='Extracted_Chapters_Fixed', max_workers=8):
+    def __init__(self, base_url='https://novelhi.com/s/Dragon-Talisman', output_folder='Extracted_Chapters_Fixed', max_workers=8, requests_per_second=4.0,
+                 use_cache=True, offline=False, parser_backend=DEFAULT_BACKEND, adaptive=True, max_concurrency=64,
+                 streaming=False, archive=False, sinks=None, mirrors=None, http2=False):
         self.base_url = base_url
         self.output_folder = output_folder
         self.max_workers = max_workers
-        self.session = requests.Session()
+        self.requests_per_second = requests_per_second
+        self.parser_backend = parser_backend
+        # Stop each download once the content container has closed, skipping the trailing ads and footer
+        self.reader = read_until_content if streaming else None
+        # One keep-alive connection per request that can be in flight (twice that while hedging to mirrors),
+        # or HTTP/2 multiplexing when httpx is installed
+        in_flight = max(max_workers, max_concurrency if adaptive else 0) * (2 if mirrors else 1)
+        self.session, self.transport = build_session(in_flight, http2=http2)
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
@@ -22,154 +124,300 @@ class FixedChapterExtractor:
         if not os.path.exists(output_folder):
             os.makedirs(output_folder)
         
+        # Raw pages are cached beside the output folder so re-runs only revalidate them
+        self.offline = offline
+        self.cache = HtmlCache.beside(output_folder) if use_cache or offline else None
+        self.manifest = RunManifest.beside(output_folder)
+        
+        # Optionally append chapters to one packed archive (<output folder>.pack) instead of separate files
+        self.archive = ArchiveWriter.beside(output_folder) if archive else None
+        # Every extracted chapter is handed to each sink (see chapter_sinks.py); pass sinks=[] to only iterate
+        if sinks is None:
+            sinks = [ArchiveSink(self.archive) if self.archive else FolderSink(output_folder)]
+        self.sinks = sinks
+        
+        # Chapters listed in the novel's table of contents (empty until discover_chapters runs)
+        self.index = ChapterIndex.beside(output_folder, base_url)
+        
+        # Per-chapter phase timings, exported to Extraction_Metrics/ at the end of a run
+        self.metrics = MetricsRecorder.beside(output_folder)
+        
+        # max_workers is only the starting point when concurrency adapts to latency and 429/503s
+        self.concurrency = AdaptiveConcurrency(initial=max_workers, max_limit=max_concurrency) if adaptive else None
+        # Per-host rate limit shared by every fetch engine run and the hedged requests to mirrors
+        self.limiter = HostLimiter(requests_per_second)
+        
+        # Content containers are tried in the order that has worked for nearby chapters (shared with the missing-chapter extractor)
+        primary_strategies = StrategyRegistry.beside(output_folder, strategies=site_strategies(text_fallback=True))
+        self.primary = Source('primary', strategies=primary_strategies)
+        self.sources = {source.name: source for source in [self.primary] + list(mirrors or [])}
+        # Mirrors (mirror_fetch.py) get a hedged request when the primary is slower than its p95, or fails
+        self.hedger = None
+        if mirrors:
+            self.hedger = HedgedFetcher(mirrors, self.download, max_workers=2 * max(max_workers, max_concurrency),
+                                        limiter=self.limiter, controller=self.concurrency)
+        
         self.success_count = 0
         self.error_count = 0
         self.lock = threading.Lock()
     
-    def extract_single_chapter(self, chapter_num):
-        url = f'{self.base_url}/{chapter_num}'
+    def chapter_url(self, chapter_num):
+        return self.index.url_for(chapter_num)
+    
+    def discover_chapters(self):
+        # Refresh the chapter index from the table of contents; returns newly listed chapters
+        print(f' Reading table of contents: {self.index.catalogue_url}')
+        try:
+            new_chapters = self.index.discover(self.session, None if self.offline else self.cache)
+        except (requests.RequestException, OSError) as e:
+            print(f' Could not read the table of contents: {e}')
+            return []
+        
+        if self.index:
+            print(f' Table of contents lists {len(self.index.chapters)} chapters '
+                  f'({min(self.index.chapters)}-{max(self.index.chapters)}), {len(new_chapters)} new since the last index')
+        else:
+            print(' No chapter links found in the table of contents')
+        return new_chapters
+    
+    def download(self, url, timings=None):
+        # One page from one site, through the HTML cache when there is one. Time to first byte is added
+        # to `timings` by a per-request hook, as hedged downloads run in the hedger's own threads.
+        hooks = {'response': [ttfb_hook(timings)]} if timings is not None else None
+        if self.cache:
+            return self.cache.fetch(self.session, url, timeout=15, offline=self.offline, reader=self.reader,
+                                    hooks=hooks)
+        response = self.session.get(url, verify=False, timeout=15, stream=self.reader is not None, hooks=hooks)
+        if not response.ok:
+            response.close()
+        response.raise_for_status()
+        html = self.reader(response)[0] if self.reader else response.content
+        return html, response.status_code
+    
+    def fetch_page(self, chapter_num, record=None):
+        url = self.chapter_url(chapter_num)
+        start = time.monotonic()
+        source = self.primary
+        record = record or self.metrics.current()
+        timings = record.phases if record else None
         
         try:
-            response = self.session.get(url, verify=False, timeout=15)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Get title
-            title = soup.find('h1')
-            title_text = title.get_text().strip() if title else f'Chapter {chapter_num}'
-            
-            # CRITICAL FIX: Look for the correct content container
-            content_div = soup.find('div', {'id': 'showReading'})
-            if not content_div:
-                content_div = soup.find('div', class_='readBox')
-            
-            if content_div:
-                # Extract all <sent> elements which contain the actual content
-                sent_elements = content_div.find_all('sent')
-                
-                if sent_elements:
-                    # Combine all sentences into paragraphs
-                    content_parts = []
-                    current_paragraph = []
-                    
-                    for sent in sent_elements:
-                        sent_text = sent.get_text().strip()
-                        if sent_text:
-                            # Check if this should start a new paragraph
-                            if (sent_text.startswith('"') and current_paragraph and 
-                                not current_paragraph[-1].endswith('"')):
-                                # Start new paragraph for dialogue
-                                if current_paragraph:
-                                    content_parts.append(' '.join(current_paragraph))
-                                    current_paragraph = [sent_text]
-                                else:
-                                    current_paragraph.append(sent_text)
-                            elif len(sent_text) > 100 and current_paragraph:
-                                # Long sentences often start new paragraphs
-                                content_parts.append(' '.join(current_paragraph))
-                                current_paragraph = [sent_text]
-                            else:
-                                current_paragraph.append(sent_text)
-                    
-                    # Add the last paragraph
-                    if current_paragraph:
-                        content_parts.append(' '.join(current_paragraph))
-                    
-                    # Join paragraphs with double newlines
-                    content = '\n\n'.join(content_parts)
-                else:
-                    # Fallback: get all text from the div
-                    content = content_div.get_text().strip()
-                    # Remove script tags and ads
-                    content = re.sub(r'<script.*?</script>', '', content, flags=re.DOTALL)
-                    content = re.sub(r'<ins.*?</ins>', '', content, flags=re.DOTALL)
-                
-                # Clean up the content
-                content = self.clean_content(content)
-                
-                if len(content) > 100:  # Only save if we have substantial content
-                    filename = f'{self.output_folder}/Chapter_{chapter_num:03d}.txt'
-                    with open(filename, 'w', encoding='utf-8') as f:
-                        f.write(f'{title_text}\n')
-                        f.write('=' * len(title_text) + '\n\n')
-                        f.write(content)
-                    
-                    with self.lock:
-                        self.success_count += 1
-                        if self.success_count % 10 == 0:
-                            print(f' Fixed extraction: {self.success_count} chapters... (Latest: Chapter {chapter_num}, {len(content)} chars)')
-                    
-                    return True, chapter_num, None
-                else:
-                    with self.lock:
-                        self.error_count += 1
-                    return False, chapter_num, f'Insufficient content: {len(content)} chars'
+            if self.hedger:
+                html, http_status, source = self.hedger.fetch(chapter_num, self.primary, url, timings)
             else:
-                with self.lock:
-                    self.error_count += 1
-                return False, chapter_num, 'No content container found'
-                
+                html, http_status = self.download(url, timings)
+        except requests.RequestException as e:
+            if self.concurrency:
+                response = getattr(e, 'response', None)
+                self.concurrency.observe(time.monotonic() - start,
+                                         status=response.status_code if response is not None else None,
+                                         timed_out=isinstance(e, requests.Timeout),
+                                         retry_after=retry_after_seconds(response.headers) if response is not None else None)
+            raise
+        
+        elapsed = time.monotonic() - start
+        # Offline reads (status None) say nothing about the server
+        if self.concurrency and http_status is not None:
+            self.concurrency.observe(elapsed, status=http_status)
+        
+        if record:
+            record.add('download', max(0.0, elapsed - record.phases.get('ttfb', 0.0)))
+            record.http_status = http_status
+            record.bytes += 0 if http_status in (None, 304) else len(html)
+            record.source = source.name
+        return html, http_status
+    
+    def strategies_for(self, record):
+        # Content strategies of the site a chapter's page was downloaded from
+        return self.sources.get(record.source, self.primary).strategies
+    
+    def fetch_chapter(self, chapter_num):
+        # Download and render one chapter into a Chapter record, without saving anything
+        http_status = None
+        record = self.metrics.start(chapter_num)
+        
+        try:
+            html, http_status = self.fetch_page(chapter_num, record)
+            strategies = self.strategies_for(record)
+            attempts = []
+            title_text, content, method, error = render_chapter(chapter_num, html, self.parser_backend, record.phases,
+                                                                strategies.order(chapter_num), attempts)
+            strategies.record(chapter_num, attempts)
         except Exception as e:
+            http_status = getattr(getattr(e, 'response', None), 'status_code', http_status)
+            title_text, content, method, error = None, None, None, str(e)
+            record.fail(classify_error(e), error)
+        
+        record.method = method
+        record.http_status = http_status
+        return Chapter.from_content(chapter_num, title_text, content, method, error, record)
+    
+    def extract_single_chapter(self, chapter_num):
+        return self.store_chapter(self.fetch_chapter(chapter_num))
+    
+    def iter_chapters(self, chapter_range, window=None):
+        # Yield Chapter records in completion order. Chapters are only started as slots free up and
+        # fetching pauses while `window` finished chapters (default: the worker count) wait to be
+        # consumed, so memory stays flat however long the range is. Nothing is saved here.
+        engine = FetchEngine(max_in_flight=self.max_workers, controller=self.fetch_controller(), limiter=self.limiter)
+        for _, chapter in engine.iterate(chapter_range, self.fetch_chapter, url_for=self.chapter_url, buffer=window):
+            yield chapter
+    
+    def finish_chapter(self, chapter_num, title_text, content, method, error, http_status, record=None):
+        # Store a chapter rendered elsewhere (the pipelined mode's parse processes)
+        record = record or self.metrics.start(chapter_num)
+        record.method = method
+        record.http_status = http_status
+        return self.store_chapter(Chapter.from_content(chapter_num, title_text, content, method, error, record))
+    
+    def store_chapter(self, chapter):
+        # Hand a chapter to the sinks (or record why it failed) and update the manifest and counters
+        chapter_num, content, error = chapter.number, chapter.content, chapter.error
+        record = chapter.timings or self.metrics.start(chapter_num)
+        
+        if error is None:
+            write_start = time.perf_counter()
+            try:
+                for sink in self.sinks:
+                    sink.write(chapter)
+            except OSError as e:
+                error = chapter.error = str(e)
+                record.fail('write', error)
+            record.add('write', time.perf_counter() - write_start)
+        elif record.ok is None:
+            record.fail('no_container' if chapter.method is None else 'insufficient_content', error)
+        
+        if error is None:
+            record.ok = True
+            self.metrics.finish(record)
+            self.manifest.record_success(chapter_num, content, chapter.method, record.http_status)
+            
             with self.lock:
-                self.error_count += 1
-            return False, chapter_num, str(e)
+                self.success_count += 1
+                if self.success_count % 10 == 0:
+                    print(f' Fixed extraction: {self.success_count} chapters... (Latest: Chapter {chapter_num}, {len(content)} chars)')
+            
+            return True, chapter_num, None
+        
+        self.metrics.finish(record)
+        self.manifest.record_failure(chapter_num, error, record.http_status, chapter.method)
+        with self.lock:
+            self.error_count += 1
+        return False, chapter_num, error
     
     def clean_content(self, content):
-        # Remove unwanted elements but preserve the story content
-        unwanted_patterns = [
-            r'Remember the mobile version:.*',
-            r'<script.*?</script>',
-            r'<ins.*?</ins>',
-            r'adsbygoogle',
-            r'googlesyndication',
-            r'data-ad-.*?=".*?"',
-            r'crossorigin="anonymous"',
-        ]
-        
-        for pattern in unwanted_patterns:
-            content = re.sub(pattern, '', content, flags=re.DOTALL | re.IGNORECASE)
-        
-        # Clean up extra spaces and line breaks
-        content = re.sub(r'\n\s*\n\s*\n+', '\n\n', content)
-        content = re.sub(r'[ \t]+', ' ', content)
-        content = content.strip()
-        
-        return content
-    
-    def extract_chapters_parallel(self, start_chapter, end_chapter):
+        # Remove unwanted elements but preserve the story content (patterns live in content_cleaner.py)
+        return FIXED_CLEANER.clean(content)
+    
+    def extract_chapters_parallel(self, start_chapter, end_chapter, resume=True, max_attempts=4, chapter_list=None):
+        unlisted = 0
+        if chapter_list is None:
+            chapter_list = list(range(start_chapter, end_chapter + 1))
+            if self.index:
+                # Only numbers the table of contents lists; the rest would just 404
+                unlisted = sum(1 for chapter_num in chapter_list if chapter_num not in self.index)
+                chapter_list = [chapter_num for chapter_num in chapter_list if chapter_num in self.index]
+        
         print(f' FIXED Chapter Extractor - Complete Content Extraction!')
         print(f' Extracting chapters {start_chapter} to {end_chapter}')
-        print(f' Using {self.max_workers} parallel workers')
-        print(f' Total chapters to extract: {end_chapter - start_chapter + 1}')
+        if self.concurrency:
+            print(f' Starting with {self.max_workers} parallel workers, adapting up to {self.concurrency.max_limit} '
+                  f'({self.requests_per_second:g} requests/sec per host)')
+        else:
+            print(f' Using {self.max_workers} parallel workers ({self.requests_per_second:g} requests/sec per host)')
+        print(f' Total chapters to extract: {len(chapter_list)}')
+        if unlisted:
+            print(f' Skipping {unlisted} numbers not listed in the table of contents')
         print(' This will extract the COMPLETE chapter content (not the truncated version)')
         print('=' * 70)
         
         start_time = time.time()
         
-        chapter_range = list(range(start_chapter, end_chapter + 1))
+        if resume:
+            done = self.manifest.completed(chapter_list)
+            if done:
+                print(f' Resuming: skipping {len(done)} chapters already completed in the manifest')
+                chapter_list = [chapter_num for chapter_num in chapter_list if chapter_num not in done]
+        
+        self.run_chapters(chapter_list)
+        self.retry_failures(chapter_list, max_attempts)
+        self.print_summary(start_time)
+    
+    def extract_new_chapters(self, resume=True, max_attempts=4):
+        # Update run: only chapters the table of contents lists for the first time
+        new_chapters = self.discover_chapters()
+        if not new_chapters:
+            print(' No new chapters listed. Nothing to extract.')
+            return
+        self.extract_chapters_parallel(new_chapters[0], new_chapters[-1], resume=resume, max_attempts=max_attempts,
+                                       chapter_list=new_chapters)
+    
+    def reparse_cached_chapters(self):
+        chapter_list = self.cache.cached_chapters(self.base_url) if self.cache else []
+        
+        print(f' FIXED Chapter Extractor - Reparse From Cache (no network)')
+        print(f' Cached chapters found: {len(chapter_list)}')
+        print('=' * 70)
+        
+        if not chapter_list:
+            print(' Nothing to reparse. Run a normal extraction first to fill the cache.')
+            return
         
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            future_to_chapter = {
-                executor.submit(self.extract_single_chapter, chapter_num): chapter_num 
-                for chapter_num in chapter_range
-            }
+        start_time = time.time()
+        self.offline = True
+        self.requests_per_second = 0
+        self.limiter.set_rate(0)
+        self.run_chapters(chapter_list)
+        self.print_summary(start_time)
+    
+    def retry_failures(self, chapter_list, max_attempts=4):
+        # Failed chapters come back after the manifest's exponential backoff delay
+        wanted = set(chapter_list)
+        
+        while True:
+            schedule = [(chapter_num, due) for chapter_num, due in self.manifest.retry_schedule(max_attempts)
+                        if chapter_num in wanted]
+            if not schedule:
+                return
+            
+            wait = min(due for _, due in schedule) - time.time()
+            if wait > 0:
+                print(f' Retrying {len(schedule)} failed chapters in {wait:.0f}s (exponential backoff)...')
+                time.sleep(wait)
             
-            completed = 0
-            total = len(chapter_range)
+            due_now = [chapter_num for chapter_num, due in schedule if due <= time.time()]
+            with self.lock:
+                self.error_count -= len(due_now)
+            self.run_chapters(due_now)
+    
+    def run_chapters(self, chapter_range):
+        start_time = time.time()
+        
+        total = len(chapter_range)
+        completed = 0
+        
+        def report(chapter_num, result):
+            nonlocal completed
+            completed += 1
             
-            for future in as_completed(future_to_chapter):
-                completed += 1
-                success, chapter_num, error = future.result()
+            if completed % 50 == 0 or completed == total:
+                elapsed = time.time() - start_time
+                rate = completed / elapsed if elapsed > 0 else 0
+                eta = (total - completed) / rate if rate > 0 else 0
                 
-                if completed % 50 == 0 or completed == total:
-                    elapsed = time.time() - start_time
-                    rate = completed / elapsed if elapsed > 0 else 0
-                    eta = (total - completed) / rate if rate > 0 else 0
-                    
-                    print(f' Progress: {completed}/{total} ({completed/total*100:.1f}%) | '
-                          f'Rate: {rate:.1f} ch/sec | ETA: {eta/60:.1f} min')
+                workers = f' | Workers: {self.concurrency.current_limit}' if self.concurrency else ''
+                print(f' Progress: {completed}/{total} ({completed/total*100:.1f}%) | '
+                      f'Rate: {rate:.1f} ch/sec | ETA: {eta/60:.1f} min{workers}')
         
+        # Chapters are saved here, one at a time, as the fetch workers finish them
+        for chapter in self.iter_chapters(chapter_range):
+            report(chapter.number, self.store_chapter(chapter))
+    
+    def fetch_controller(self):
+        # Cache-only runs make no requests, so there is nothing to adapt to
+        return None if self.offline else self.concurrency
+    
+    def print_summary(self, start_time):
         end_time = time.time()
         total_time = end_time - start_time
         
@@ -179,11 +427,30 @@ class FixedChapterExtractor:
         print(f' Failed extractions: {self.error_count} chapters')
         print(f'  Total time: {total_time/60:.2f} minutes')
         print(f' Average speed: {(self.success_count)/total_time:.2f} chapters/second')
-        print(f' Files saved in: {os.path.abspath(self.output_folder)}')
+        for sink in self.sinks:
+            sink.flush()
+            print(f' {sink.describe()}')
+        if self.concurrency and not self.offline:
+            print(f' Concurrency: {self.concurrency.describe()}')
+        if self.hedger:
+            print(f' Mirrors: {self.hedger.describe()}')
+        if not self.offline:
+            print(f' Connections: {self.transport.describe()}')
+        for source in self.sources.values():
+            print(f' Containers ({source.name}): {source.strategies.describe()}')
+        self.primary.strategies.save()
         print(f' This extraction includes ALL content from <sent> tags!')
         
+        metrics_path = self.metrics.save()
+        if metrics_path:
+            print(' Time per phase (per chapter):')
+            for line in self.metrics.summary_lines():
+                print(f'   {line}')
+            print(f' Metrics saved to: {metrics_path} (.prom alongside)')
+        
         if self.error_count > 0:
-            print(f'\\n  Note: {self.error_count} chapters failed to extract. You may want to retry those manually.')
+            print(f'\\n  Note: {self.error_count} chapters failed after all retries. '
+                  f'Run the extractor again to resume; failures are tracked in {self.manifest.db_path}')
 
 def main():
     print(' Dragon Talisman FIXED Chapter Extractor')
@@ -191,23 +458,67 @@ def main():
     print('=' * 70)
     
     try:
-        start = int(input('Enter starting chapter number: '))
-        end = int(input('Enter ending chapter number: '))
-        
-        if end < start:
-            print(' End chapter must be greater than start chapter!')
+        mode = input('Mode: [e]xtract a range, [u]pdate chapters newly listed in the table of contents, '
+                     '[r]eparse cached HTML without network access (default: e): ').strip().lower()
+        if mode == 'r':
+            FixedChapterExtractor(offline=True).reparse_cached_chapters()
             return
+        update = mode == 'u'
         
-        workers = input('Enter number of parallel workers (default: 8, max recommended: 12): ')
+        if not update:
+            start = int(input('Enter starting chapter number: '))
+            end = input('Enter ending chapter number (default: last chapter in the table of contents): ').strip()
+            end = int(end) if end else None
+            
+            if end is not None and end < start:
+                print(' End chapter must be greater than start chapter!')
+                return
+        
+        workers = input('Enter starting number of parallel workers (default: 8, adjusted automatically): ')
         workers = int(workers) if workers else 8
-        workers = min(workers, 12)
         
-        print(f'\\n Starting FIXED extraction with {workers} workers...')
+        rate = input('Enter requests per second per host (default: 4): ')
+        rate = float(rate) if rate else 4.0
+        
+        resume = input('Skip chapters already completed in earlier runs? (y/n, default: y): ').strip().lower() != 'n'
+        
+        pipelined = input('Parse in a separate process pool (pipelined mode)? (y/n, default: n): ').strip().lower() == 'y'
+        
+        streaming = input('Stop each download once the chapter text has arrived (streaming)? (y/n, default: n): ').strip().lower() == 'y'
+        
+        archive = input('Write chapters into one packed archive instead of separate files? (y/n, default: n): ').strip().lower() == 'y'
+        
+        http2 = HTTP2_AVAILABLE and input('Multiplex requests over HTTP/2? (y/n, default: n): ').strip().lower() == 'y'
+        
+        print(f'\\n Starting FIXED extraction with {workers} workers (adapting to server load)...')
         print(' This will extract the COMPLETE chapter content!')
         time.sleep(2)
         
-        extractor = FixedChapterExtractor(max_workers=workers)
-        extractor.extract_chapters_parallel(start, end)
+        mirrors = load_mirrors()
+        if mirrors:
+            print(f' Hedging slow or failed downloads to {len(mirrors)} mirrors from {MIRRORS_FILE}')
+        
+        if pipelined:
+            from pipeline_extractor import PipelinedExtractor
+            extractor = PipelinedExtractor(max_workers=workers, requests_per_second=rate, streaming=streaming,
+                                           archive=archive, mirrors=mirrors, http2=http2)
+        else:
+            extractor = FixedChapterExtractor(max_workers=workers, requests_per_second=rate, streaming=streaming,
+                                              archive=archive, mirrors=mirrors, http2=http2)
+        
+        if update:
+            extractor.extract_new_chapters(resume=resume)
+            return
+        
+        # The table of contents is read once and cached; update mode refreshes it
+        if not extractor.index:
+            extractor.discover_chapters()
+        if end is None:
+            if not extractor.index:
+                print(' No table of contents available - please enter an ending chapter number.')
+                return
+            end = max(extractor.index.chapters)
+        extractor.extract_chapters_parallel(start, end, resume=resume)
         
     except KeyboardInterrupt:
         print('\\n  Extraction interrupted by user')
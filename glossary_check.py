@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Glossary consistency checker for refined chapters.
+
+Every rule in glossary.txt is compiled into one Aho-Corasick automaton, so a
+chapter is scanned once no matter how many terms the glossary holds. Chapters
+are checked in a process pool and the violations of each file are cached by
+content hash (glossary_check_cache.json), so a re-run only rescans chapters
+that were edited, or everything when the glossary itself changes.
+
+Usage:
+    python glossary_check.py                           # check True_Refining
+    python glossary_check.py --folder Extracted_Chapters_Fixed --glossary glossary.txt
+"""
+
+import argparse
+import bisect
+import hashlib
+import json
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from cache_files import scan_cached
+
+CACHE_FILE = 'glossary_check_cache.json'
+
+
+class GlossaryRule:
+    """``term``: write exactly as ``canonical``; ``replace``: ``phrase`` must become ``replacement``"""
+
+    __slots__ = ('kind', 'phrase', 'replacement')
+
+    def __init__(self, kind: str, phrase: str, replacement: Optional[str] = None):
+        self.kind = kind
+        self.phrase = phrase
+        self.replacement = replacement
+
+    def violation(self, found: str) -> Optional[str]:
+        """Expected text if ``found`` breaks the rule, else None"""
+        if self.kind == 'replace':
+            return self.replacement
+        return self.phrase if found != self.phrase else None
+
+
+def load_glossary(path: str) -> List[GlossaryRule]:
+    rules = []
+    with open(path, encoding='utf-8') as f:
+        for line_num, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            kind, _, value = line.partition(':')
+            kind, value = kind.strip().lower(), value.strip()
+            if kind == 'term' and value:
+                rules.append(GlossaryRule('term', value))
+            elif kind == 'replace' and '=>' in value:
+                phrase, _, replacement = value.partition('=>')
+                rules.append(GlossaryRule('replace', phrase.strip(), replacement.strip()))
+            else:
+                raise ValueError(f'{path}:{line_num}: expected "term: X" or "replace: X => Y", got {line!r}')
+    return rules
+
+
+def glossary_digest(rules: List[GlossaryRule]) -> str:
+    data = json.dumps([[rule.kind, rule.phrase, rule.replacement] for rule in rules])
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+class PhraseAutomaton:
+    """Aho-Corasick automaton over lower-cased phrases.
+
+    ``scan`` walks the text once and yields every (possibly overlapping)
+    occurrence of every phrase as ``(start, end, phrase index)``.
+    """
+
+    def __init__(self, phrases: List[str]):
+        self.lengths = [len(phrase) for phrase in phrases]
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail = [0]
+        self.outputs: List[List[int]] = [[]]
+
+        for index, phrase in enumerate(phrases):
+            state = 0
+            for char in phrase.lower():
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.outputs.append([])
+                state = next_state
+            self.outputs[state].append(index)
+
+        # Breadth-first, so every failure link points at an already finished shallower state
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.outputs[next_state] = self.outputs[next_state] + self.outputs[self.fail[next_state]]
+
+    def scan(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        goto, fail, outputs = self.goto, self.fail, self.outputs
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in outputs[state]:
+                yield position + 1 - self.lengths[index], position + 1, index
+
+
+def _lower_same_length(text: str) -> str:
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    # A few characters (e.g. 'İ') grow when lower-cased; keep offsets aligned with the original
+    return ''.join(char if len(char.lower()) != 1 else char.lower() for char in text)
+
+
+class GlossaryChecker:
+    def __init__(self, rules: List[GlossaryRule]):
+        self.rules = rules
+        self.automaton = PhraseAutomaton([rule.phrase for rule in rules])
+
+    def check_text(self, text: str) -> List[dict]:
+        """Violations as dicts with line, column, rule kind, found text and expected text"""
+        line_starts = [0] + [i + 1 for i, char in enumerate(text) if char == '\n']
+        violations = []
+        rule_ends = [0] * len(self.rules)
+        for start, end, index in self.automaton.scan(_lower_same_length(text)):
+            # Whole words only, so "Grandmasters" is not read as a misspelt "Grandmaster"
+            if (start > 0 and text[start - 1].isalnum()) or (end < len(text) and text[end].isalnum()):
+                continue
+            # "Bam bam bam bam" is one violation, not two overlapping ones
+            if start < rule_ends[index]:
+                continue
+            rule_ends[index] = end
+            rule = self.rules[index]
+            found = text[start:end]
+            expected = rule.violation(found)
+            if expected is None:
+                continue
+            line = bisect.bisect_right(line_starts, start)
+            violations.append({'line': line, 'column': start - line_starts[line - 1] + 1, 'kind': rule.kind,
+                               'found': found, 'expected': expected})
+        return violations
+
+    def check_file(self, path: str) -> List[dict]:
+        with open(path, encoding='utf-8') as f:
+            return self.check_text(f.read())
+
+
+_worker_checker: Optional[GlossaryChecker] = None
+
+
+def _init_worker(rules: List[GlossaryRule]):
+    global _worker_checker
+    _worker_checker = GlossaryChecker(rules)
+
+
+def _check_in_worker(path: str) -> List[dict]:
+    return _worker_checker.check_file(path)
+
+
+def check_folder(folder: str, rules: List[GlossaryRule], cache_path: Optional[str] = CACHE_FILE,
+                 workers: Optional[int] = None) -> Tuple[Dict[int, List[dict]], int]:
+    """Violations per chapter number for a chapter folder, and how many chapters had to be scanned"""
+    # Cached violations only hold for the glossary they were found with
+    (results,), scanned = scan_cached([folder], _check_in_worker, cache_path, glossary_digest(rules), workers,
+                                      initializer=_init_worker, initargs=(rules,), chunksize=4)
+    return results, scanned
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check chapters against the glossary in a single pass each')
+    parser.add_argument('--folder', default='True_Refining', help='chapter folder to check (default: True_Refining)')
+    parser.add_argument('--glossary', default='glossary.txt')
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--no-cache', action='store_true', help='rescan every chapter')
+    args = parser.parse_args()
+
+    print("🐉 Dragon Talisman - Glossary Check")
+    print("=" * 50)
+
+    rules = load_glossary(args.glossary)
+    results, scanned = check_folder(args.folder, rules, None if args.no_cache else CACHE_FILE, args.workers)
+    print(f"📖 {len(rules)} glossary rules, {len(results)} chapters in {args.folder} "
+          f"({scanned} scanned, {len(results) - scanned} unchanged)")
+
+    totals: Dict[str, int] = {}
+    for chapter_num, violations in results.items():
+        for violation in violations:
+            print(f"   Chapter {chapter_num:>4} line {violation['line']:>4}: \"{violation['found']}\" "
+                  f"→ \"{violation['expected']}\"")
+            key = violation['expected']
+            totals[key] = totals.get(key, 0) + 1
+
+    if not totals:
+        print("✅ No glossary violations")
+        return
+    print(f"\n⚠️ {sum(totals.values())} violations in {sum(1 for v in results.values() if v)} chapters:")
+    for expected, count in sorted(totals.items(), key=lambda item: -item[1]):
+        print(f"   {count:>5}  should be \"{expected}\"")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+
+class HtmlCache:
+    """Content-addressed on-disk cache of raw chapter pages.
+
+    Page bodies are stored once under ``objects/`` keyed by their SHA-256, and
+    each URL has a small JSON entry under ``entries/`` that points at its body
+    and keeps the ``ETag`` / ``Last-Modified`` validators for conditional GETs.
+    """
+
+    def __init__(self, cache_folder: str = 'Html_Cache'):
+        self.cache_folder = cache_folder
+        self.objects_folder = os.path.join(cache_folder, 'objects')
+        self.entries_folder = os.path.join(cache_folder, 'entries')
+        os.makedirs(self.objects_folder, exist_ok=True)
+        os.makedirs(self.entries_folder, exist_ok=True)
+
+    @classmethod
+    def beside(cls, output_folder: str) -> 'HtmlCache':
+        """Cache stored next to a chapter output folder"""
+        parent = os.path.dirname(os.path.abspath(output_folder))
+        return cls(os.path.join(parent, 'Html_Cache'))
+
+    def _entry_path(self, url: str) -> str:
+        return os.path.join(self.entries_folder, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.json')
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_folder, digest[:2], digest + '.html')
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def lookup(self, url: str) -> Optional[Dict]:
+        """Return the cache entry for a URL, or None"""
+        try:
+            with open(self._entry_path(url), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """If-None-Match / If-Modified-Since headers for a cached URL"""
+        entry = self.lookup(url)
+        if not entry or not os.path.exists(self._object_path(entry['sha256'])):
+            return {}
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def load(self, url: str) -> Optional[bytes]:
+        """Cached page body for a URL, or None if it was never stored"""
+        entry = self.lookup(url)
+        if not entry:
+            return None
+        try:
+            with open(self._object_path(entry['sha256']), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def store(self, url: str, content: bytes, headers=None, partial: bool = False) -> str:
+        """Save a page body and its validators, returning the body hash.
+
+        ``partial`` marks a body that was cut off after its content container
+        (streaming downloads); it is still served on a 304.
+        """
+        headers = headers or {}
+        digest = hashlib.sha256(content).hexdigest()
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            self._write_atomic(object_path, content)
+
+        now = time.time()
+        entry = {
+            'url': url,
+            'sha256': digest,
+            'size': len(content),
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'partial': partial,
+            'fetched_at': now,
+            'checked_at': now,
+        }
+        self._write_atomic(self._entry_path(url), json.dumps(entry).encode('utf-8'))
+        return digest
+
+    def mark_not_modified(self, url: str):
+        """Record a successful 304 revalidation"""
+        entry = self.lookup(url)
+        if entry:
+            entry['checked_at'] = time.time()
+            self._write_atomic(self._entry_path(url), json.dumps(entry).encode('utf-8'))
+
+    def fetch(self, session, url: str, timeout: float = 15, offline: bool = False,
+              reader: Optional[Callable] = None, hooks: Optional[dict] = None) -> Tuple[bytes, Optional[int]]:
+        """Page body and HTTP status for a URL, revalidating the cached copy with a conditional GET.
+
+        On a 304 the cached body is returned; in offline mode no request is made
+        at all (the status is None) and a missing entry raises ``LookupError``.
+        With a ``reader`` the response is streamed and ``reader(response)``
+        returns ``(body, partial)``, e.g. ``streaming_fetch.read_until_content``.
+        ``hooks`` are per-request ``requests`` hooks.
+        """
+        if offline:
+            content = self.load(url)
+            if content is None:
+                raise LookupError(f'Not in HTML cache: {url}')
+            return content, None
+
+        stream = reader is not None
+        headers = self.conditional_headers(url)
+        response = session.get(url, headers=headers, verify=False, timeout=timeout, stream=stream, hooks=hooks)
+        if response.status_code == 304:
+            response.close()
+            content = self.load(url)
+            if content is not None:
+                self.mark_not_modified(url)
+                return content, 304
+            response = session.get(url, verify=False, timeout=timeout, stream=stream, hooks=hooks)
+        if not response.ok:
+            response.close()
+        response.raise_for_status()
+
+        content, partial = reader(response) if stream else (response.content, False)
+        self.store(url, content, response.headers, partial=partial)
+        return content, response.status_code
+
+    def urls(self, prefix: str = '') -> Iterator[str]:
+        """All cached URLs starting with ``prefix``"""
+        for name in os.listdir(self.entries_folder):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.entries_folder, name), encoding='utf-8') as f:
+                    url = json.load(f)['url']
+            except (OSError, ValueError, KeyError):
+                continue
+            if url.startswith(prefix):
+                yield url
+
+    def cached_chapters(self, base_url: str):
+        """Sorted chapter numbers cached under ``base_url``"""
+        chapters = []
+        for url in self.urls(base_url.rstrip('/') + '/'):
+            tail = url.rsplit('/', 1)[-1]
+            if tail.isdigit():
+                chapters.append(int(tail))
+        return sorted(chapters)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Corpus integrity scanner for extracted chapters.
+
+Flags chapters that are probably bad extractions:
+- size outliers: much shorter (truncated) or longer (two chapters in one) than their neighbours
+- near-duplicates: sharing most of their text with a nearby chapter, found with
+  rolling-hash fingerprints of 8-word windows
+- leftover boilerplate: ad markup, "Report bad translation" and similar site text
+- title mismatches: a title or leading chapter heading whose number does not fit
+
+Per-chapter features are computed in a process pool and cached by content hash
+(integrity_scan_cache.json), so a re-run only reads edited chapters. Flagged
+chapters are marked suspect in the run manifest, which puts them in the queue
+that bulk_chapter_missing_extract.py re-extracts.
+
+Usage: python integrity_scan.py [--folder Extracted_Chapters_Fixed] [--dry-run] [--ignore 1 2]
+"""
+
+import argparse
+import base64
+import re
+import statistics
+import zlib
+from array import array
+from typing import Dict, List, Optional
+
+from cache_files import scan_cached
+from run_manifest import SUSPECT_MIN_LENGTH, RunManifest
+
+CACHE_FILE = 'integrity_scan_cache.json'
+FEATURES_VERSION = 1
+
+# Neighbours on each side that size outliers and duplicates are judged against
+NEIGHBOURS = 10
+DUPLICATE_DISTANCE = 3
+TRUNCATED_RATIO = 0.5
+OVERSIZED_RATIO = 1.8
+# Share of the smaller chapter's fingerprints found in the other one
+DUPLICATE_SHARE = 0.5
+# A leading heading may drift from the file number as the site renumbers, but not jump
+HEADING_DRIFT = 2
+
+WINDOW_WORDS = 8
+FINGERPRINT_SAMPLE = 8
+HASH_BASE = 1000003
+HASH_MOD = (1 << 61) - 1
+
+WORD = re.compile(r'\w+')
+TITLE_NUMBER = re.compile(r'chapter\s+(\d+)', re.IGNORECASE)
+LEADING_HEADING = re.compile(r'^\W*chapter\s+(\d+)', re.IGNORECASE)
+LEFTOVERS = re.compile('|'.join([
+    r'report\W+(?:a\s+)?bad\s+translation',
+    r'select text and click',
+    r'if you find any errors',
+    r'remember the mobile version',
+    r'adsbygoogle|googlesyndication|data-ad-',
+    r'<\s*/?\s*(?:script|ins|div|span|p)\b[^>]*>',
+    r'words:\s*\d+.{0,40}?update:',
+    r'https?://|www\.',
+    r'\bnovel\s*(?:hi|bin|full)\b',
+    r'\bread (?:novel )?online\b',
+]), re.IGNORECASE)
+
+
+def fingerprints(text: str) -> List[int]:
+    """Rabin-Karp hashes of every 8-word window, keeping the 1 in 8 whose value is divisible by 8.
+
+    Sampling by value rather than by position means two chapters sharing a
+    passage keep the same fingerprints for it wherever it sits.
+    """
+    words = [zlib.crc32(word.encode('utf-8')) for word in WORD.findall(text.lower())]
+    if len(words) < WINDOW_WORDS:
+        return []
+    top = pow(HASH_BASE, WINDOW_WORDS - 1, HASH_MOD)
+    value = 0
+    for word in words[:WINDOW_WORDS]:
+        value = (value * HASH_BASE + word) % HASH_MOD
+    kept = set()
+    for i in range(WINDOW_WORDS, len(words) + 1):
+        if value % FINGERPRINT_SAMPLE == 0:
+            kept.add(value & 0xFFFFFFFF)
+        if i < len(words):
+            value = ((value - words[i - WINDOW_WORDS] * top) * HASH_BASE + words[i]) % HASH_MOD
+    return sorted(kept)
+
+
+def chapter_features(path: str) -> dict:
+    """Everything the scan needs from one chapter file"""
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    title, _, rest = text.partition('\n')
+    # Skip the title and its underline, matching what the manifest measures
+    body = rest.split('\n', 1)[-1].strip() if rest.startswith('=') else text.strip()
+
+    title_match = TITLE_NUMBER.search(title)
+    heading_match = LEADING_HEADING.match(body.split('\n', 1)[0])
+    leftovers = []
+    for match in LEFTOVERS.finditer(body):
+        line = body.count('\n', 0, match.start()) + 4
+        leftovers.append([line, match.group(0)[:60]])
+
+    packed = array('I', fingerprints(body))
+    return {
+        'length': len(body),
+        'title_number': int(title_match.group(1)) if title_match else None,
+        'heading_number': int(heading_match.group(1)) if heading_match else None,
+        'leftovers': leftovers[:20],
+        'fingerprints': base64.b64encode(packed.tobytes()).decode('ascii'),
+    }
+
+
+def _unpack_fingerprints(encoded: str) -> set:
+    packed = array('I')
+    packed.frombytes(base64.b64decode(encoded))
+    return set(packed)
+
+
+def collect_features(folder: str, cache_path: Optional[str] = CACHE_FILE,
+                     workers: Optional[int] = None) -> Dict[int, dict]:
+    """Features per chapter number, computing only those of new or edited files"""
+    (features,), _ = scan_cached([folder], chapter_features, cache_path, FEATURES_VERSION, workers)
+    return features
+
+
+def find_problems(features: Dict[int, dict]) -> Dict[int, List[str]]:
+    """Chapter number -> reasons it looks like a bad extraction"""
+    problems: Dict[int, List[str]] = {}
+    numbers = sorted(features)
+
+    def flag(chapter_num, reason):
+        problems.setdefault(chapter_num, []).append(reason)
+
+    for i, chapter_num in enumerate(numbers):
+        length = features[chapter_num]['length']
+        neighbours = [features[n]['length'] for n in numbers[max(0, i - NEIGHBOURS):i + NEIGHBOURS + 1]
+                      if n != chapter_num]
+        typical = statistics.median(neighbours) if neighbours else length
+        if length < SUSPECT_MIN_LENGTH:
+            flag(chapter_num, f'only {length} chars')
+        elif typical and length < typical * TRUNCATED_RATIO:
+            flag(chapter_num, f'truncated? {length} chars vs {typical:.0f} typical')
+        elif typical and length > typical * OVERSIZED_RATIO:
+            flag(chapter_num, f'oversized? {length} chars vs {typical:.0f} typical')
+
+    prints = {n: _unpack_fingerprints(features[n]['fingerprints']) for n in numbers}
+    for i, chapter_num in enumerate(numbers):
+        for other in numbers[i + 1:i + 1 + DUPLICATE_DISTANCE]:
+            a, b = prints[chapter_num], prints[other]
+            if not a or not b:
+                continue
+            share = len(a & b) / min(len(a), len(b))
+            if share >= DUPLICATE_SHARE:
+                flag(other, f'repeats {share:.0%} of Chapter {chapter_num}')
+
+    for chapter_num in numbers:
+        for line, text in features[chapter_num]['leftovers'][:3]:
+            flag(chapter_num, f'leftover site text on line {line}: "{text}"')
+        title_number = features[chapter_num]['title_number']
+        if title_number is not None and title_number != chapter_num:
+            flag(chapter_num, f'title says Chapter {title_number}')
+
+    # Leading "Chapter N" headings follow the site's numbering at a slowly drifting offset;
+    # one that jumps away from both neighbouring headings is probably the wrong chapter
+    headings = [(n, n - features[n]['heading_number']) for n in numbers if features[n]['heading_number'] is not None]
+    for i, (chapter_num, offset) in enumerate(headings):
+        around = [headings[j][1] for j in (i - 1, i + 1) if 0 <= j < len(headings)]
+        if around and all(abs(offset - other) > HEADING_DRIFT for other in around):
+            flag(chapter_num, f'starts with the heading of Chapter {chapter_num - offset}')
+
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Flag truncated, duplicated and boilerplate-polluted chapters')
+    parser.add_argument('--folder', default='Extracted_Chapters_Fixed')
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--ignore', type=int, nargs='*', default=[],
+                        help='chapters that are known to be fine (e.g. an author\'s note)')
+    parser.add_argument('--dry-run', action='store_true', help='report only, do not queue re-extraction')
+    args = parser.parse_args()
+
+    print("🐉 Dragon Talisman - Corpus Integrity Scan")
+    print("=" * 60)
+
+    features = collect_features(args.folder, CACHE_FILE, args.workers)
+    problems = {num: reasons for num, reasons in find_problems(features).items() if num not in args.ignore}
+    print(f"📄 Scanned {len(features)} chapters in {args.folder}\n")
+
+    for chapter_num, reasons in sorted(problems.items()):
+        print(f"   Chapter {chapter_num:>4}: {'; '.join(reasons)}")
+
+    if not problems:
+        print("✅ No suspect chapters found")
+        return
+    print(f"\n⚠️ {len(problems)} suspect chapters")
+
+    if args.dry_run:
+        return
+    manifest = RunManifest.beside(args.folder)
+    manifest.sync_folder(args.folder)
+    queued = manifest.flag_suspect({num: '; '.join(reasons) for num, reasons in problems.items()})
+    manifest.close()
+    print(f"🔄 {queued} chapters queued for re-extraction in {manifest.db_path}")
+    print("   Run: python bulk_chapter_missing_extract.py")
+
+
+if __name__ == "__main__":
+    main()
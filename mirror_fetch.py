@@ -0,0 +1,214 @@
+"""
+Hedged chapter downloads across the primary site and its mirrors.
+
+The primary is asked first. If it has not answered by the p95 of its recent
+response times, the same chapter is requested from the next source as well
+and whichever page arrives first is used; a source that fails outright hands
+over to the next one at once. Mirrors have their own URL template and content
+containers, and are listed in mirrors.json:
+
+    [
+        {"name": "mirror", "url": "https://mirror.example/dragon-talisman/{chapter}",
+         "containers": ["#chapter-content", ".text-left"]}
+    ]
+
+Containers are names from parser_backends.CONTAINERS or ``#id`` / ``.class``
+selectors for a div. Each source locates them through its own StrategyRegistry
+(extraction_strategies.py); the primary site's is the one the extractors share.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from adaptive_concurrency import AdaptiveConcurrency, percentile
+from extraction_strategies import Strategy, StrategyRegistry, site_strategies
+from fetch_engine import HostLimiter
+
+MIRRORS_FILE = 'mirrors.json'
+
+
+class Source:
+    """A site a chapter can be downloaded from"""
+
+    __slots__ = ('name', 'url_template', 'strategies')
+
+    def __init__(self, name: str, url_template: Optional[str] = None, containers: Optional[List[str]] = None,
+                 strategies: Optional[StrategyRegistry] = None):
+        self.name = name
+        self.url_template = url_template
+        if strategies is None:
+            strategies = StrategyRegistry(name, [Strategy(selector) for selector in containers]
+                                          if containers else site_strategies(text_fallback=True))
+        self.strategies = strategies
+
+    def url_for(self, chapter_num: int) -> str:
+        return self.url_template.format(chapter=chapter_num)
+
+    def __repr__(self) -> str:
+        return f'<Source {self.name}>'
+
+
+def load_mirrors(path: str = MIRRORS_FILE) -> List[Source]:
+    """Mirror sources from a JSON file; none if the file does not exist"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            entries = json.load(f)
+    except FileNotFoundError:
+        return []
+    mirrors = []
+    for position, entry in enumerate(entries, 1):
+        if '{chapter}' not in entry.get('url', ''):
+            raise ValueError(f'{path}: mirror {position} needs a "url" containing {{chapter}}')
+        mirrors.append(Source(entry.get('name') or f'mirror{position}', entry['url'], entry.get('containers')))
+    return mirrors
+
+
+class HedgedFetcher:
+    """Runs one download per chapter, adding a hedged request to the next source when the current one is slow.
+
+    ``download(url, timings)`` returns ``(html, http_status)``, adds phase
+    seconds (time to first byte) to the ``timings`` dict and raises on failure.
+    Requests run in this fetcher's own thread pool, so the caller gets the
+    first good page back while a stalled request keeps only a pool thread busy
+    until it times out. The hedge delay is the ``hedge_percentile`` of the
+    primary's last ``window`` response times (``initial_delay`` until
+    ``min_samples`` have been seen), never less than ``min_delay``.
+
+    The first request of a chapter was already admitted by the caller's
+    FetchEngine; hedged ones wait for a token from ``limiter`` (the engine's
+    per-host buckets) and, when they go to the primary's host, for a slot from
+    ``controller`` as well.
+    """
+
+    def __init__(self, mirrors: List[Source], download: Callable[[str, dict], Tuple[bytes, Optional[int]]],
+                 max_workers: int = 32, hedge_percentile: float = 95, initial_delay: float = 3.0,
+                 min_delay: float = 0.05, min_samples: int = 20, window: int = 200,
+                 limiter: Optional[HostLimiter] = None, controller: Optional[AdaptiveConcurrency] = None):
+        self.mirrors = mirrors
+        self.download = download
+        self.limiter = limiter
+        self.controller = controller
+        self.hedge_percentile = hedge_percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.latencies: deque = deque(maxlen=window)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedged-fetch')
+        self.lock = threading.Lock()
+        self.hedges = 0
+        self.fallbacks = 0
+        self.wins: Dict[str, int] = {}
+
+    def hedge_delay(self) -> float:
+        with self.lock:
+            if len(self.latencies) < self.min_samples:
+                return self.initial_delay
+            return max(self.min_delay, percentile(list(self.latencies), self.hedge_percentile))
+
+    def _timed(self, url: str, primary: bool, timings: dict):
+        start = time.monotonic()
+        result = self.download(url, timings)
+        # Slow primary answers count even when a hedge already won, or the p95 would only ever shrink
+        if primary:
+            with self.lock:
+                self.latencies.append(time.monotonic() - start)
+        return result
+
+    def _hedged(self, url: str, primary_host: str, timings: dict, finished: threading.Event):
+        # Gives up without a request when the chapter was settled while this one waited for its turn
+        if self.limiter:
+            self.limiter.wait(url)
+        if self.controller is None or urlparse(url).netloc != primary_host:
+            if finished.is_set():
+                raise RuntimeError('chapter already downloaded')
+            return self._timed(url, False, timings)
+        if not self.controller.acquire(finished):
+            raise RuntimeError('chapter already downloaded')
+        try:
+            return self._timed(url, False, timings)
+        finally:
+            self.controller.release()
+
+    def fetch(self, chapter_num: int, primary: Source, primary_url: str,
+              timings: Optional[dict] = None) -> Tuple[bytes, Optional[int], Source]:
+        """Page, HTTP status and source of the first successful download of a chapter.
+
+        The winning request's phase seconds are added to ``timings``.
+        """
+        candidates = [(primary, primary_url)] + [(mirror, mirror.url_for(chapter_num)) for mirror in self.mirrors]
+        primary_host = urlparse(primary_url).netloc
+        finished = threading.Event()
+        try:
+            return self._fetch(candidates, primary, primary_host, finished, timings)
+        finally:
+            finished.set()
+
+    def _fetch(self, candidates, primary, primary_host, finished, timings):
+        running = {}
+        errors = []
+        delay = self.hedge_delay()
+
+        def launch():
+            source, url = candidates[len(running) + len(errors)]
+            # Each request gets its own timings, so a losing request's late response is not counted
+            own = {}
+            if source is primary:
+                future = self.pool.submit(self._timed, url, True, own)
+            else:
+                future = self.pool.submit(self._hedged, url, primary_host, own, finished)
+            running[future] = (source, own)
+            return time.monotonic()
+
+        launched_at = launch()
+        while running:
+            waiting = len(running) + len(errors) < len(candidates)
+            timeout = max(0.0, launched_at + delay - time.monotonic()) if waiting else None
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                with self.lock:
+                    self.hedges += 1
+                launched_at = launch()
+                continue
+
+            failed = False
+            for future in done:
+                source, own = running.pop(future)
+                try:
+                    html, http_status = future.result()
+                except Exception as e:
+                    errors.append((source, e))
+                    failed = True
+                    continue
+                with self.lock:
+                    self.wins[source.name] = self.wins.get(source.name, 0) + 1
+                if timings is not None:
+                    for phase, seconds in own.items():
+                        timings[phase] = timings.get(phase, 0.0) + seconds
+                # Requests that are still running finish in the background and are ignored
+                for other in running:
+                    other.cancel()
+                return html, http_status, source
+
+            # A failed source hands over straight away instead of after the hedge delay
+            if failed and len(running) + len(errors) < len(candidates):
+                with self.lock:
+                    self.fallbacks += 1
+                launched_at = launch()
+
+        # Report the primary's failure: it is the one the retry logic and metrics understand
+        raise next((error for source, error in errors if source is primary), errors[0][1])
+
+    def describe(self) -> str:
+        with self.lock:
+            wins = ', '.join(f'{name} {count}' for name, count in sorted(self.wins.items(), key=lambda item: -item[1]))
+            delay = (f'{percentile(list(self.latencies), self.hedge_percentile) * 1000:.0f}ms'
+                     if len(self.latencies) >= self.min_samples else f'{self.initial_delay:g}s (warming up)')
+            return f'{self.hedges} hedged, {self.fallbacks} fell back after an error, hedge delay {delay}; wins: {wins}'
+
+    def close(self):
+        self.pool.shutdown(wait=False)
@@ -0,0 +1,313 @@
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bs4 import BeautifulSoup, SoupStrainer, UnicodeDammit
+import lxml.html
+
+try:
+    from bs4.filter import ElementFilter
+except ImportError:  # beautifulsoup4 < 4.13
+    ElementFilter = None
+
+try:
+    from selectolax.parser import HTMLParser as SelectolaxParser
+except ImportError:  # selectolax is optional
+    SelectolaxParser = None
+
+# Content containers the extractors know about: name -> (attribute, value)
+CONTAINERS = {
+    'showReading': ('id', 'showReading'),
+    'readBox': ('class', 'readBox'),
+    'readcontent': ('id', 'readcontent'),
+    'textbox': ('class', 'textbox'),
+}
+
+DEFAULT_BACKEND = 'html.parser'
+
+
+def register_container(selector: str) -> str:
+    """Container name for a known name or a ``#id`` / ``.class`` div selector, adding new selectors to CONTAINERS"""
+    if selector in CONTAINERS:
+        return selector
+    if len(selector) > 1 and selector[0] in '#.':
+        CONTAINERS[selector] = ('id' if selector[0] == '#' else 'class', selector[1:])
+        return selector
+    raise ValueError(f'Unknown content container {selector!r}; use one of {", ".join(CONTAINERS)} '
+                     f'or a "#id" / ".class" selector')
+
+
+def has_class(value, wanted: str) -> bool:
+    if not value:
+        return False
+    classes = value.split() if isinstance(value, str) else value
+    return wanted in classes
+
+
+def _is_content_tag(name: str, attrs: dict) -> bool:
+    if name == 'h1':
+        return True
+    if name != 'div':
+        return False
+    for attribute, value in CONTAINERS.values():
+        if attribute == 'id' and attrs.get('id') == value:
+            return True
+        if attribute == 'class' and has_class(attrs.get('class'), value):
+            return True
+    return False
+
+
+def _content_strainer():
+    """parse_only filter keeping just the <h1> and the content containers"""
+    if ElementFilter is None:
+        return SoupStrainer(lambda name, attrs: _is_content_tag(name, dict(attrs)))
+
+    class ContentFilter(ElementFilter):
+        def allow_tag_creation(self, nsprefix, name, attrs):
+            return _is_content_tag(name, attrs or {})
+
+        def allow_string_creation(self, string):
+            return False
+
+    return ContentFilter()
+
+
+def decode_html(html) -> str:
+    if isinstance(html, str):
+        return html
+    return UnicodeDammit(html, is_html=True).unicode_markup or ''
+
+
+class ParsedContainer:
+    """Sentences and text of one content container, independent of the parser"""
+
+    def __init__(self, name: str, sentences: List[str], text_getter: Callable[[], str]):
+        self.name = name
+        self.sentences = sentences
+        self._text_getter = text_getter
+
+    @property
+    def text(self) -> str:
+        """Full text of the container, computed on demand for the fallback paths"""
+        return self._text_getter()
+
+
+class ParsedPage:
+    """A chapter page parsed by one backend; containers are located lazily.
+
+    ``markup`` is the page as downloaded, for cheap checks before a tree search.
+    """
+
+    def __init__(self, backend: 'ParserBackend', document, markup=None):
+        self.backend = backend
+        self.document = document
+        self.markup = markup
+        self._containers: Dict[str, Optional[ParsedContainer]] = {}
+
+    @property
+    def title(self) -> Optional[str]:
+        """Stripped text of the first <h1>, or None when the page has none"""
+        return self.backend.title(self.document)
+
+    def container(self, name: str) -> Optional[ParsedContainer]:
+        if name not in self._containers:
+            node = self.backend.find(self.document, *CONTAINERS[name])
+            self._containers[name] = None if node is None else ParsedContainer(
+                name, self.backend.sentences(node), lambda node=node: self.backend.text(node))
+        return self._containers[name]
+
+    def first_container(self, names) -> Optional[ParsedContainer]:
+        for name in names:
+            found = self.container(name)
+            if found is not None:
+                return found
+        return None
+
+
+class ParserBackend:
+    name = ''
+
+    def parse(self, html):
+        raise NotImplementedError
+
+    def title(self, document) -> Optional[str]:
+        raise NotImplementedError
+
+    def find(self, document, attribute: str, value: str):
+        raise NotImplementedError
+
+    def sentences(self, node) -> List[str]:
+        raise NotImplementedError
+
+    def text(self, node) -> str:
+        raise NotImplementedError
+
+
+class SoupBackend(ParserBackend):
+    """BeautifulSoup over the whole page (the original behaviour with html.parser)"""
+
+    def __init__(self, name: str, features: str, strained: bool = False):
+        self.name = name
+        self.features = features
+        self.strained = strained
+
+    def parse(self, html):
+        if self.strained:
+            return BeautifulSoup(html, self.features, parse_only=_content_strainer())
+        return BeautifulSoup(html, self.features)
+
+    def title(self, document):
+        title = document.find('h1')
+        return title.get_text().strip() if title else None
+
+    def find(self, document, attribute, value):
+        if attribute == 'id':
+            return document.find('div', {'id': value})
+        return document.find('div', class_=value)
+
+    def sentences(self, node):
+        return [sent.get_text().strip() for sent in node.find_all('sent')]
+
+    def text(self, node):
+        return node.get_text()
+
+
+class LxmlSubtreeBackend(ParserBackend):
+    """Cuts the <h1> and the requested container out of the raw markup and
+    parses only those fragments with lxml, falling back to a full lxml parse
+    when the container cannot be located cleanly."""
+
+    name = 'lxml-subtree'
+
+    TOKEN_PATTERN = re.compile(r'<script\b.*?</script\s*>|<!--.*?-->|<div\b|</div\s*>', re.DOTALL | re.IGNORECASE)
+    TITLE_PATTERN = re.compile(r'<h1\b.*?</h1\s*>', re.DOTALL | re.IGNORECASE)
+
+    def __init__(self):
+        self.open_patterns: Dict[Tuple[str, str], re.Pattern] = {}
+
+    def _open_pattern(self, attribute, value):
+        key = (attribute, value)
+        if key not in self.open_patterns:
+            if attribute == 'id':
+                attr_pattern = rf'\bid\s*=\s*["\']?{re.escape(value)}(?=["\'\s>])'
+            else:
+                attr_pattern = rf'\bclass\s*=\s*["\'][^"\']*(?<![\w-]){re.escape(value)}(?![\w-])'
+            self.open_patterns[key] = re.compile(rf'<div\b[^>]*{attr_pattern}', re.IGNORECASE)
+        return self.open_patterns[key]
+
+    def parse(self, html):
+        return {'text': decode_html(html), 'full': None}
+
+    def _full(self, document):
+        if document['full'] is None:
+            document['full'] = lxml.html.fromstring(document['text'] or '<html></html>')
+        return document['full']
+
+    def _subtree(self, text, start):
+        depth = 0
+        for token in self.TOKEN_PATTERN.finditer(text, start):
+            tag = token.group(0)
+            if tag[1] == '/':
+                depth -= 1
+                if depth == 0:
+                    return text[start:token.end()]
+            elif tag[:4].lower() == '<div':
+                depth += 1
+        return None
+
+    def title(self, document):
+        match = self.TITLE_PATTERN.search(document['text'])
+        if match:
+            node = lxml.html.fragment_fromstring(match.group(0))
+        else:
+            found = self._full(document).xpath('//h1')
+            node = found[0] if found else None
+        return node.text_content().strip() if node is not None else None
+
+    def find(self, document, attribute, value):
+        match = self._open_pattern(attribute, value).search(document['text'])
+        if not match:
+            return None
+        fragment = self._subtree(document['text'], match.start())
+        if fragment:
+            node = lxml.html.fragment_fromstring(fragment)
+            if attribute == 'id' and node.get('id') == value:
+                return node
+            if attribute == 'class' and has_class(node.get('class'), value):
+                return node
+        return LxmlBackend.find(self, {'full': self._full(document)}, attribute, value)
+
+    def sentences(self, node):
+        return [sent.text_content().strip() for sent in node.iter('sent')]
+
+    def text(self, node):
+        return node.text_content()
+
+
+class LxmlBackend(ParserBackend):
+    """lxml.html over the whole page, queried with XPath"""
+
+    name = 'lxml-xpath'
+
+    def parse(self, html):
+        return {'full': lxml.html.fromstring(decode_html(html) or '<html></html>')}
+
+    def title(self, document):
+        found = document['full'].xpath('//h1')
+        return found[0].text_content().strip() if found else None
+
+    def find(self, document, attribute, value):
+        if attribute == 'id':
+            found = document['full'].xpath('//div[@id=$value]', value=value)
+        else:
+            found = document['full'].xpath(
+                '//div[contains(concat(" ", normalize-space(@class), " "), $value)]', value=f' {value} ')
+        return found[0] if found else None
+
+    sentences = LxmlSubtreeBackend.sentences
+    text = LxmlSubtreeBackend.text
+
+
+class SelectolaxBackend(ParserBackend):
+    """selectolax (lexbor) CSS queries, if the package is installed"""
+
+    name = 'selectolax'
+
+    def parse(self, html):
+        return SelectolaxParser(decode_html(html))
+
+    def title(self, document):
+        node = document.css_first('h1')
+        return node.text().strip() if node is not None else None
+
+    def find(self, document, attribute, value):
+        selector = f'div#{value}' if attribute == 'id' else f'div.{value}'
+        return document.css_first(selector)
+
+    def sentences(self, node):
+        return [sent.text().strip() for sent in node.css('sent')]
+
+    def text(self, node):
+        return node.text()
+
+
+BACKENDS: Dict[str, ParserBackend] = {
+    'html.parser': SoupBackend('html.parser', 'html.parser'),
+    'lxml': SoupBackend('lxml', 'lxml'),
+    'lxml-strainer': SoupBackend('lxml-strainer', 'lxml', strained=True),
+    'lxml-xpath': LxmlBackend(),
+    'lxml-subtree': LxmlSubtreeBackend(),
+}
+if SelectolaxParser is not None:
+    BACKENDS['selectolax'] = SelectolaxBackend()
+
+
+def available_backends() -> List[str]:
+    return list(BACKENDS)
+
+
+def parse_page(html, backend: str = DEFAULT_BACKEND) -> ParsedPage:
+    """Parse a chapter page with the named backend"""
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown parser backend {backend!r}; available: {", ".join(BACKENDS)}')
+    parser = BACKENDS[backend]
+    return ParsedPage(parser, parser.parse(html), html)
@@ -0,0 +1,191 @@
+import itertools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict
+
+from fetch_engine import FetchEngine
+from extraction_metrics import classify_error
+from fixed_extractor import FixedChapterExtractor, render_chapter
+
+# Marks the end of a stage's input
+DONE = object()
+
+
+def timed_render(chapter_num, html, parser_backend, strategies):
+    """render_chapter plus its phase timings and container searches, for the worker processes"""
+    timings = {}
+    attempts = []
+    result = render_chapter(chapter_num, html, parser_backend, timings, strategies, attempts)
+    return result, timings, attempts
+
+
+class StageStats:
+    """Items processed and time spent busy in one pipeline stage"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.processed = 0
+        self.busy_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self.lock:
+            self.processed += 1
+            self.busy_seconds += seconds
+
+
+class PipelinedExtractor(FixedChapterExtractor):
+    """FixedChapterExtractor that runs as fetch -> parse/clean -> write stages.
+
+    Fetching stays concurrent and rate limited through FetchEngine, parsing and
+    cleaning run in a ProcessPoolExecutor so they are not serialised by the GIL,
+    and a single writer thread owns the output folder and the run manifest.
+    Stages are joined by bounded queues, so a slow stage applies backpressure
+    instead of letting pages pile up in memory.
+    """
+
+    def __init__(self, *args, parse_workers: int = None, queue_size: int = 32, report_interval: float = 5.0,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.parse_workers = parse_workers or os.cpu_count() or 2
+        self.queue_size = queue_size
+        self.report_interval = report_interval
+        self.stats: Dict[str, StageStats] = {}
+
+    def run_chapters(self, chapter_range):
+        chapter_list = list(chapter_range)
+        self.stats = {name: StageStats(name) for name in ('fetch', 'parse', 'write')}
+        parse_queue = queue.Queue(maxsize=self.queue_size)
+        write_queue = queue.Queue(maxsize=self.queue_size)
+        start_time = time.time()
+
+        fetchers = self.concurrency.current_limit if self.fetch_controller() else self.max_workers
+        print(f' Pipeline: {fetchers} fetchers -> {self.parse_workers} parse processes -> 1 writer')
+
+        # Set when the parse stage fails, so no further chapters are fetched
+        stop = threading.Event()
+        failure = []
+        fetcher = threading.Thread(target=self._fetch_stage, args=(chapter_list, parse_queue, stop), daemon=True)
+        parser = threading.Thread(target=self._parse_stage, args=(parse_queue, write_queue, stop, failure), daemon=True)
+        fetcher.start()
+        parser.start()
+
+        self._write_stage(write_queue, parse_queue, len(chapter_list), start_time)
+        fetcher.join()
+        parser.join()
+        if failure:
+            raise failure[0]
+
+        if chapter_list:
+            print(f' Slowest stage per worker: {self.bottleneck()}')
+
+    def _fetch_stage(self, chapter_list, parse_queue, stop):
+        stats = self.stats['fetch']
+
+        def fetch(chapter_num):
+            start = time.perf_counter()
+            http_status = None
+            record = self.metrics.start(chapter_num)
+            try:
+                html, http_status = self.fetch_page(chapter_num, record)
+                item = (chapter_num, html, http_status, None, record)
+            except Exception as e:
+                http_status = getattr(getattr(e, 'response', None), 'status_code', http_status)
+                record.fail(classify_error(e), str(e))
+                item = (chapter_num, None, http_status, str(e), record)
+            stats.add(time.perf_counter() - start)
+            # Blocks while the parse stage is behind
+            parse_queue.put(item)
+
+        engine = FetchEngine(max_in_flight=self.max_workers, controller=self.fetch_controller(), limiter=self.limiter)
+        try:
+            engine.run(itertools.takewhile(lambda _: not stop.is_set(), chapter_list), fetch, url_for=self.chapter_url)
+        finally:
+            parse_queue.put(DONE)
+
+    def _parse_stage(self, parse_queue, write_queue, stop, failure):
+        stats = self.stats['parse']
+        # At most two pages per worker are held by the pool at any time
+        slots = threading.BoundedSemaphore(self.parse_workers * 2)
+
+        def deliver(future, chapter_num, http_status, record):
+            try:
+                result, timings, attempts = future.result()
+                stats.add(sum(timings.values()))
+                # The registry lives in this process; workers only report what they tried
+                self.strategies_for(record).record(chapter_num, attempts)
+                for phase, seconds in timings.items():
+                    record.add(phase, seconds)
+            except Exception as e:
+                result = (None, None, None, f'Parse error: {e}')
+                record.fail(classify_error(e), result[3])
+            write_queue.put((chapter_num, result, http_status, record))
+            slots.release()
+
+        item = None
+        try:
+            with ProcessPoolExecutor(max_workers=self.parse_workers) as pool:
+                while True:
+                    item = parse_queue.get()
+                    if item is DONE:
+                        break
+                    chapter_num, html, http_status, error, record = item
+                    if error is not None:
+                        write_queue.put((chapter_num, (None, None, None, error), http_status, record))
+                        continue
+                    slots.acquire()
+                    future = pool.submit(timed_render, chapter_num, html, self.parser_backend,
+                                         self.strategies_for(record).order(chapter_num))
+                    future.add_done_callback(
+                        lambda f, chapter_num=chapter_num, http_status=http_status, record=record:
+                            deliver(f, chapter_num, http_status, record))
+                    item = None
+        except Exception as e:
+            # e.g. BrokenProcessPool: stop fetching, and fail the chapter being submitted and every
+            # one still queued, so fetch jobs blocked on the full queue can finish
+            failure.append(e)
+            stop.set()
+            message = f'Parse stage stopped: {e}'
+            while item is not DONE:
+                if item is not None:
+                    chapter_num, _, http_status, error, record = item
+                    if error is None:
+                        record.fail(classify_error(e), message)
+                    write_queue.put((chapter_num, (None, None, None, error or message), http_status, record))
+                item = parse_queue.get()
+        finally:
+            write_queue.put(DONE)
+
+    def _write_stage(self, write_queue, parse_queue, total, start_time):
+        stats = self.stats['write']
+        last_report = time.time()
+
+        while True:
+            item = write_queue.get()
+            if item is DONE:
+                break
+            chapter_num, (title_text, content, method, error), http_status, record = item
+            start = time.perf_counter()
+            self.finish_chapter(chapter_num, title_text, content, method, error, http_status, record)
+            stats.add(time.perf_counter() - start)
+
+            if time.time() - last_report >= self.report_interval or stats.processed == total:
+                last_report = time.time()
+                self.report_stages(total, start_time, parse_queue, write_queue)
+
+    def report_stages(self, total, start_time, parse_queue, write_queue):
+        elapsed = max(time.time() - start_time, 1e-9)
+        stages = ' | '.join(
+            f'{stats.name}: {stats.processed}/{total} ({stats.processed / elapsed:.1f}/s, busy {stats.busy_seconds:.1f}s)'
+            for stats in self.stats.values())
+        print(f' Pipeline {stages} | queued for parse: {parse_queue.qsize()}/{self.queue_size}, '
+              f'for write: {write_queue.qsize()}/{self.queue_size}')
+
+    def bottleneck(self) -> str:
+        """Stage with the most busy time per worker"""
+        fetchers = self.concurrency.current_limit if self.fetch_controller() else self.max_workers
+        workers = {'fetch': fetchers, 'parse': self.parse_workers, 'write': 1}
+        return max(self.stats.values(), key=lambda stats: stats.busy_seconds / workers[stats.name]).name
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Batch requests for LLM refinement of raw chapters, and an offline stand-in endpoint.
+
+The refinement process from PromptForQuality_2.txt (read the end of the
+previous chapter, then the raw chapter, then apply the style guide) becomes
+one chat-completion request per raw chapter, or per chunk for chapters over
+the token budget. Requests are streamed as batch-API JSON lines
+(custom_id / method / url / body) into Refinement_Batches/, rolling over to
+a new file before a file would exceed --max-bytes or --max-requests.
+
+    python refinement_batch.py generate 51 60                  # refined chapters 51-60
+    python refinement_batch.py run Refinement_Batches/batch_*.jsonl --local
+    python refinement_batch.py collect Refinement_Batches/results_*.jsonl
+
+``run`` posts each request to an OpenAI-compatible endpoint (--endpoint) or,
+with --local, to a stand-in server that returns the raw text with the
+glossary's replacements applied, so the whole loop can be tried without a
+network. ``collect`` reassembles the chunks and writes True_Refining files.
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import requests
+
+from chapter_alignment import RESULT_FILE as ALIGNMENT_FILE, load_raw_mapping, raw_chapters_for
+from glossary_check import load_glossary
+from replay_server import QuietHTTPServer
+from run_manifest import CHAPTER_FILE_PATTERN
+
+BATCH_FOLDER = 'Refinement_Batches'
+# Rough size of a token in English prose, for budgeting without a tokenizer
+CHARS_PER_TOKEN = 4
+CONTINUITY_LINES = 15
+
+ENDPOINT_PATH = '/v1/chat/completions'
+CUSTOM_ID = re.compile(r'^refine-(\d+)-(\d+)of(\d+)$')
+RAW_BLOCK = re.compile(r'<raw_chapter>\n(.*?)\n</raw_chapter>', re.DOTALL)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def read_chapter(folder: str, chapter_num: int) -> Optional[Tuple[str, str]]:
+    """``(title, body)`` of a chapter file, or None if it does not exist"""
+    path = os.path.join(folder, f'Chapter_{chapter_num:03d}.txt')
+    try:
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+    except OSError:
+        return None
+    title, _, rest = text.partition('\n')
+    body = rest.split('\n', 1)[-1] if rest.startswith('=') else rest
+    return title.strip(), body.strip()
+
+
+def tail_lines(text: str, count: int = CONTINUITY_LINES) -> str:
+    lines = [line for line in text.splitlines() if line.strip()]
+    return '\n'.join(lines[-count:])
+
+
+def split_into_chunks(body: str, max_tokens: int) -> List[str]:
+    """Paragraph-aligned chunks of at most ``max_tokens`` (estimated) each"""
+    chunks, current, current_tokens = [], [], 0
+    for paragraph in body.split('\n\n'):
+        tokens = estimate_tokens(paragraph)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append('\n\n'.join(current))
+            current, current_tokens = [], 0
+        # A single paragraph over budget is cut at the budget
+        while tokens > max_tokens:
+            cut = max_tokens * CHARS_PER_TOKEN
+            chunks.append(paragraph[:cut])
+            paragraph = paragraph[cut:]
+            tokens = estimate_tokens(paragraph)
+        current.append(paragraph)
+        current_tokens += tokens
+    if current:
+        chunks.append('\n\n'.join(current))
+    return chunks
+
+
+class RequestBuilder:
+    """Builds the chat-completion requests for refined chapters"""
+
+    def __init__(self, style_prompt: str, raw_folder: str = 'Extracted_Chapters_Fixed',
+                 refined_folder: str = 'True_Refining', model: str = 'gpt-4o', chunk_tokens: int = 6000,
+                 alignment_path: str = ALIGNMENT_FILE):
+        self.style_prompt = style_prompt
+        self.raw_folder = raw_folder
+        self.refined_folder = refined_folder
+        self.model = model
+        self.chunk_tokens = chunk_tokens
+        self.mapping, self.offset = load_raw_mapping(alignment_path)
+
+    def continuity(self, refined_num: int) -> Tuple[str, str]:
+        """Where the previous chapter ended: the refined text if it exists, else its raw source"""
+        previous = read_chapter(self.refined_folder, refined_num - 1)
+        if previous:
+            return f'refined Chapter {refined_num - 1}', tail_lines(previous[1])
+        raw_nums = raw_chapters_for(refined_num - 1, self.mapping, self.offset)
+        previous = read_chapter(self.raw_folder, raw_nums[-1])
+        if previous:
+            return f'raw Chapter_{raw_nums[-1]:03d}.txt (not refined yet)', tail_lines(previous[1])
+        return '', ''
+
+    def requests_for(self, refined_num: int) -> Iterator[dict]:
+        raw_nums = raw_chapters_for(refined_num, self.mapping, self.offset)
+        bodies = [read_chapter(self.raw_folder, raw_num) for raw_num in raw_nums]
+        if not all(bodies):
+            return
+        raw_body = '\n\n'.join(body for _, body in bodies)
+        chunks = split_into_chunks(raw_body, self.chunk_tokens)
+        source, tail = self.continuity(refined_num)
+        sources = ', '.join(f'Chapter_{raw_num:03d}.txt' for raw_num in raw_nums)
+
+        for part, chunk in enumerate(chunks, 1):
+            lines = [f'Refine raw {sources} into True_Refining Chapter {refined_num}'
+                     + (f' (part {part} of {len(chunks)})' if len(chunks) > 1 else '') + '.']
+            if part > 1:
+                source, tail = f'part {part - 1} of this chapter (raw)', tail_lines(chunks[part - 2])
+            if tail:
+                lines += ['', f'Continuity - the last lines of {source}:', '<previous_ending>', tail,
+                          '</previous_ending>']
+            lines += ['', 'Raw chapter text:', '<raw_chapter>', chunk, '</raw_chapter>', '',
+                      'Reply with the refined text only.']
+            yield {
+                'custom_id': f'refine-{refined_num:03d}-{part}of{len(chunks)}',
+                'method': 'POST',
+                'url': ENDPOINT_PATH,
+                'body': {
+                    'model': self.model,
+                    # Refined prose runs a little longer than the raw text
+                    'max_tokens': int(estimate_tokens(chunk) * 1.5) + 256,
+                    'messages': [
+                        {'role': 'system', 'content': self.style_prompt},
+                        {'role': 'user', 'content': '\n'.join(lines)},
+                    ],
+                },
+            }
+
+    def requests_for_range(self, start: int, end: int) -> Iterator[dict]:
+        for refined_num in range(start, end + 1):
+            yield from self.requests_for(refined_num)
+
+
+def write_batches(lines: Iterator[dict], folder: str = BATCH_FOLDER, max_bytes: int = 50 * 1024 * 1024,
+                  max_requests: int = 10000, prefix: str = 'batch') -> List[str]:
+    """Stream requests into numbered JSONL files, starting a new file before one would outgrow the limits"""
+    os.makedirs(folder, exist_ok=True)
+    stamp = time.strftime('%Y%m%d_%H%M%S')
+    paths: List[str] = []
+    f = None
+    size = count = 0
+    try:
+        for request in lines:
+            line = (json.dumps(request, ensure_ascii=False) + '\n').encode('utf-8')
+            if f is None or size + len(line) > max_bytes or count >= max_requests:
+                if f:
+                    f.close()
+                paths.append(os.path.join(folder, f'{prefix}_{stamp}_{len(paths) + 1:03d}.jsonl'))
+                f = open(paths[-1], 'wb')
+                size = count = 0
+            f.write(line)
+            size += len(line)
+            count += 1
+    finally:
+        if f:
+            f.close()
+    return paths
+
+
+def read_jsonl(paths: List[str]) -> Iterator[dict]:
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class StandInRefiner:
+    """Local OpenAI-compatible chat-completions endpoint for trying the batch loop offline.
+
+    The "refinement" is the raw chapter text from the request with the
+    glossary's ``replace`` rules applied.
+    """
+
+    def __init__(self, glossary_path: str = 'glossary.txt', host: str = '127.0.0.1', port: int = 0):
+        rules = load_glossary(glossary_path) if os.path.exists(glossary_path) else []
+        self.replacements = [(re.compile(r'(?<!\w)' + re.escape(rule.phrase) + r'(?!\w)', re.IGNORECASE),
+                              rule.replacement) for rule in rules if rule.kind == 'replace']
+        self.httpd = QuietHTTPServer((host, port), self._handler_class())
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def refine(self, request: dict) -> dict:
+        prompt = request['messages'][-1]['content']
+        match = RAW_BLOCK.search(prompt)
+        text = match.group(1) if match else ''
+        for pattern, replacement in self.replacements:
+            text = pattern.sub(replacement, text)
+        return {
+            'id': f'chatcmpl-local-{time.time_ns()}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'stand-in'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': estimate_tokens(prompt), 'completion_tokens': estimate_tokens(text)},
+        }
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    request = json.loads(self.rfile.read(length))
+                    status, body = (200, server.refine(request)) if self.path == ENDPOINT_PATH else (404, {})
+                except (ValueError, KeyError, IndexError) as e:
+                    status, body = 400, {'error': {'message': str(e)}}
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'StandInRefiner':
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> 'StandInRefiner':
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def run_batches(batch_paths: List[str], endpoint: str, folder: str = BATCH_FOLDER, api_key: Optional[str] = None,
+                timeout: float = 300) -> Tuple[List[str], int]:
+    """Post every request to ``endpoint`` and stream the responses out in the batch-output format"""
+    session = requests.Session()
+    if api_key:
+        session.headers['Authorization'] = f'Bearer {api_key}'
+
+    def results():
+        for request in read_jsonl(batch_paths):
+            try:
+                response = session.post(endpoint.rstrip('/') + request['url'], json=request['body'], timeout=timeout)
+                body = response.json() if response.content else None
+                yield {'id': f'batch_req_{time.time_ns()}', 'custom_id': request['custom_id'],
+                       'response': {'status_code': response.status_code, 'body': body}, 'error': None}
+            except (requests.RequestException, ValueError) as e:
+                yield {'id': f'batch_req_{time.time_ns()}', 'custom_id': request['custom_id'], 'response': None,
+                       'error': {'message': str(e)}}
+
+    paths = write_batches(results(), folder, prefix='results')
+    return paths, sum(1 for _ in read_jsonl(paths))
+
+
+def collect_results(result_paths: List[str], output_folder: str = 'True_Refining',
+                    overwrite: bool = False) -> Tuple[List[int], Dict[int, str]]:
+    """Reassemble refined chapters from batch output; returns written chapters and why others were not"""
+    parts: Dict[int, Dict[int, str]] = {}
+    totals: Dict[int, int] = {}
+    problems: Dict[int, str] = {}
+    for result in read_jsonl(result_paths):
+        match = CUSTOM_ID.match(result.get('custom_id', ''))
+        if not match:
+            continue
+        refined_num, part, total = map(int, match.groups())
+        response = result.get('response') or {}
+        if response.get('status_code') != 200:
+            problems[refined_num] = (result.get('error') or {}).get('message') or f'HTTP {response.get("status_code")}'
+            continue
+        try:
+            text = response['body']['choices'][0]['message']['content']
+        except (KeyError, IndexError, TypeError):
+            problems[refined_num] = 'malformed response'
+            continue
+        parts.setdefault(refined_num, {})[part] = text.strip()
+        totals[refined_num] = total
+
+    os.makedirs(output_folder, exist_ok=True)
+    existing = {int(m.group(1)) for m in map(CHAPTER_FILE_PATTERN.match, os.listdir(output_folder)) if m}
+    written = []
+    for refined_num, chapter_parts in sorted(parts.items()):
+        if refined_num in problems:
+            continue
+        if len(chapter_parts) != totals[refined_num]:
+            problems[refined_num] = f'{len(chapter_parts)} of {totals[refined_num]} parts'
+            continue
+        if refined_num in existing and not overwrite:
+            problems[refined_num] = 'already refined (use --overwrite)'
+            continue
+        title = f'Chapter {refined_num}'
+        with open(os.path.join(output_folder, f'Chapter_{refined_num:03d}.txt'), 'w', encoding='utf-8') as f:
+            f.write(f'{title}\n' + '=' * len(title) + '\n\n')
+            f.write('\n\n'.join(chapter_parts[part] for part in sorted(chapter_parts)))
+        written.append(refined_num)
+    return written, problems
+
+
+def expand(patterns: List[str]) -> List[str]:
+    paths = []
+    for pattern in patterns:
+        paths += sorted(glob.glob(pattern)) or [pattern]
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch LLM refinement requests for raw chapters')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help='write batch requests for a range of refined chapters')
+    generate.add_argument('start', type=int, help='first refined chapter number')
+    generate.add_argument('end', type=int, help='last refined chapter number')
+    generate.add_argument('--prompt', nargs='+', default=['PromptForQuality.txt'], help='style prompt file(s)')
+    generate.add_argument('--model', default='gpt-4o')
+    generate.add_argument('--chunk-tokens', type=int, default=6000, help='raw text per request (estimated tokens)')
+    generate.add_argument('--max-bytes', type=int, default=50 * 1024 * 1024, help='maximum size of one batch file')
+    generate.add_argument('--max-requests', type=int, default=10000, help='maximum requests in one batch file')
+    generate.add_argument('--out', default=BATCH_FOLDER)
+
+    run = commands.add_parser('run', help='send batch requests to an endpoint and save the responses')
+    run.add_argument('batches', nargs='+')
+    run.add_argument('--endpoint', help='OpenAI-compatible base URL (API key from OPENAI_API_KEY)')
+    run.add_argument('--local', action='store_true', help='use the offline stand-in endpoint')
+    run.add_argument('--out', default=BATCH_FOLDER)
+
+    collect = commands.add_parser('collect', help='write refined chapters from batch results')
+    collect.add_argument('results', nargs='+')
+    collect.add_argument('--output', default='True_Refining')
+    collect.add_argument('--overwrite', action='store_true')
+    args = parser.parse_args()
+
+    print("🐉 Dragon Talisman - Refinement Batches")
+    print("=" * 50)
+
+    if args.command == 'generate':
+        style_prompt = '\n\n'.join(open(path, encoding='utf-8').read().strip() for path in args.prompt)
+        builder = RequestBuilder(style_prompt, model=args.model, chunk_tokens=args.chunk_tokens)
+        counts = {'requests': 0, 'chapters': set()}
+
+        def counted(requests_iter):
+            for request in requests_iter:
+                counts['requests'] += 1
+                counts['chapters'].add(request['custom_id'].split('-')[1])
+                yield request
+
+        paths = write_batches(counted(builder.requests_for_range(args.start, args.end)), args.out,
+                              args.max_bytes, args.max_requests)
+        print(f"📝 {counts['requests']} requests for {len(counts['chapters'])} chapters "
+              f"(raw = refined + {builder.offset} unless aligned otherwise)")
+        for path in paths:
+            print(f"   {path} ({os.path.getsize(path) / 1024:.0f} KB)")
+
+    elif args.command == 'run':
+        if args.local:
+            with StandInRefiner() as refiner:
+                paths, count = run_batches(expand(args.batches), refiner.url, args.out)
+        elif args.endpoint:
+            paths, count = run_batches(expand(args.batches), args.endpoint, args.out, os.environ.get('OPENAI_API_KEY'))
+        else:
+            print("❌ Give --endpoint URL or --local")
+            return
+        print(f"📬 {count} responses saved to {', '.join(paths)}")
+
+    else:
+        written, problems = collect_results(expand(args.results), args.output, args.overwrite)
+        print(f"✅ Wrote {len(written)} refined chapters to {args.output}")
+        for refined_num, problem in sorted(problems.items()):
+            print(f"   ⚠️ Chapter {refined_num}: {problem}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import html
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+from html_cache import HtmlCache
+
+CHAPTER_PATH = re.compile(r'/(\d+)/?$')
+CATALOGUE_PATH = re.compile(r'^(.*)/index/([^/?]+)/?(?:\?page=(\d+))?$')
+
+
+def load_recorded_pages(cache_folder: str = 'Html_Cache') -> Dict[int, bytes]:
+    """Chapter number -> raw page for every chapter URL in an HTML cache"""
+    pages = {}
+    if not os.path.isdir(cache_folder):
+        return pages
+    cache = HtmlCache(cache_folder)
+    for url in cache.urls():
+        match = CHAPTER_PATH.search(url)
+        content = cache.load(url) if match else None
+        if content is not None:
+            pages[int(match.group(1))] = content
+    return pages
+
+
+def synthesize_pages(chapters_folder: str = 'Extracted_Chapters_Fixed', limit: Optional[int] = None,
+                     container: str = 'id="showReading"') -> Dict[int, bytes]:
+    """Rebuild site-like pages from extracted chapter files when no raw pages are recorded.
+
+    ``container`` holds the attributes of the content div, so a mirror with a
+    different layout can be imitated (e.g. ``class="chapter-text"``).
+    """
+    pages = {}
+    for name in sorted(os.listdir(chapters_folder)):
+        match = re.match(r'^Chapter_(\d+)\.txt$', name)
+        if not match:
+            continue
+        with open(os.path.join(chapters_folder, name), encoding='utf-8') as f:
+            title, _, body = f.read().partition('\n')
+        body = body.split('\n', 2)[-1]
+        sentences = ''.join(f'<p><sent>{html.escape(paragraph)}</sent></p>' for paragraph in body.split('\n\n'))
+        page = (f'<html><head><title>{html.escape(title)}</title><script>window.ads = [];</script></head><body>'
+                f'<h1>{html.escape(title)}</h1><div {container}>{sentences}</div>'
+                f'<footer>Remember the mobile version: m.example</footer>'
+                + '<script>(adsbygoogle = window.adsbygoogle || []).push({});</script>' * 20
+                + '</body></html>')
+        pages[int(match.group(1))] = page.encode('utf-8')
+        if limit and len(pages) >= limit:
+            break
+    return pages
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that stop reading early (streaming downloads) reset the connection
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class ReplayServer:
+    """Local HTTP server that replays recorded chapter pages with simulated network conditions.
+
+    Any path ending in ``/<chapter number>`` is answered with that chapter's
+    page after ``latency`` +/- ``jitter`` seconds. A fraction ``error_rate`` of
+    requests gets a 500 and ``throttle_rate`` gets a 429 with ``Retry-After``.
+    A fraction ``stall_rate`` is held for ``stall_seconds`` first, like a
+    stalled connection on a busy server.
+    Pages carry an ``ETag`` so conditional GETs are answered with 304.
+    ``<prefix>/index/<slug>`` serves a table of contents listing the pages,
+    ``catalogue_page_size`` links per page with ``?page=N`` pagination.
+    """
+
+    def __init__(self, pages: Dict[int, bytes], host: str = '127.0.0.1', port: int = 0, latency: float = 0.05,
+                 jitter: float = 0.02, error_rate: float = 0.0, throttle_rate: float = 0.0, retry_after: int = 1,
+                 seed: Optional[int] = None, catalogue_page_size: int = 100, stall_rate: float = 0.0,
+                 stall_seconds: float = 5.0):
+        self.pages = pages
+        self.catalogue_page_size = catalogue_page_size
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.random = random.Random(seed)
+        self.counts: Dict[int, int] = {}
+        self.lock = threading.Lock()
+        self.httpd = QuietHTTPServer((host, port), self._handler_class())
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                status, headers, body = server.respond(self.path, self.headers)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def _count(self, status: int):
+        with self.lock:
+            self.counts[status] = self.counts.get(status, 0) + 1
+
+    def respond(self, path: str, request_headers):
+        """Status, headers and body for one request"""
+        with self.lock:
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            if self.stall_rate and self.random.random() < self.stall_rate:
+                delay += self.stall_seconds
+            roll = self.random.random()
+        time.sleep(delay)
+
+        catalogue = CATALOGUE_PATH.match(path)
+        if catalogue:
+            self._count(200)
+            return 200, {'Content-Type': 'text/html; charset=utf-8'}, self.catalogue(*catalogue.groups())
+
+        match = CHAPTER_PATH.search(path.split('?')[0])
+        page = self.pages.get(int(match.group(1))) if match else None
+        if page is None:
+            self._count(404)
+            return 404, {}, b''
+        if roll < self.throttle_rate:
+            self._count(429)
+            return 429, {'Retry-After': str(self.retry_after)}, b''
+        if roll < self.throttle_rate + self.error_rate:
+            self._count(500)
+            return 500, {}, b''
+
+        etag = f'"{match.group(1)}-{len(page)}"'
+        if request_headers.get('If-None-Match') == etag:
+            self._count(304)
+            return 304, {'ETag': etag}, b''
+        self._count(200)
+        return 200, {'Content-Type': 'text/html; charset=utf-8', 'ETag': etag}, page
+
+    def catalogue(self, prefix: str, slug: str, page: Optional[str]) -> bytes:
+        """One page of the table of contents"""
+        chapters = sorted(self.pages)
+        page = int(page or 1)
+        pages = max(1, -(-len(chapters) // self.catalogue_page_size))
+        listed = chapters[(page - 1) * self.catalogue_page_size:page * self.catalogue_page_size]
+        links = ''.join(f'<li><a href="{prefix}/{slug}/{chapter_num}">Chapter {chapter_num}</a></li>'
+                        for chapter_num in listed)
+        pagination = ''.join(f'<a href="?page={number}">{number}</a>' for number in range(1, pages + 1))
+        return (f'<html><body><h1>{html.escape(slug)}</h1><ul>{links}</ul>'
+                f'<div class="page">{pagination}</div><a href="{prefix}/{slug}">Book page</a></body></html>').encode('utf-8')
+
+    def start(self) -> 'ReplayServer':
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> 'ReplayServer':
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
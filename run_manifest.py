@@ -0,0 +1,243 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Chapters shorter than this are kept but flagged, since real chapters run 3,000+ chars
+SUSPECT_MIN_LENGTH = 1000
+
+CHAPTER_FILE_PATTERN = re.compile(r'^Chapter_(\d+)\.txt$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chapters (
+    chapter_num INTEGER PRIMARY KEY,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    http_status INTEGER,
+    content_length INTEGER,
+    content_hash TEXT,
+    method TEXT,
+    last_error TEXT,
+    first_attempt_at REAL,
+    last_attempt_at REAL,
+    completed_at REAL,
+    next_attempt_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_chapters_status ON chapters (status, chapter_num);
+"""
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+class RunManifest:
+    """Persistent per-chapter record of extraction runs, backed by SQLite.
+
+    Status is one of ``done``, ``suspect`` (saved but too short to trust),
+    ``failed`` (retryable after ``next_attempt_at``) or ``missing`` (was done
+    but the file has since disappeared). ``attempts`` counts the failed
+    attempts since the chapter was last saved.
+    """
+
+    def __init__(self, db_path: str = 'extraction_manifest.sqlite3', backoff_base: float = 30.0,
+                 backoff_max: float = 3600.0):
+        self.db_path = db_path
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+
+    @classmethod
+    def beside(cls, output_folder: str, **kwargs) -> 'RunManifest':
+        """Manifest stored next to a chapter output folder"""
+        parent = os.path.dirname(os.path.abspath(output_folder))
+        return cls(os.path.join(parent, 'extraction_manifest.sqlite3'), **kwargs)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def record_success(self, chapter_num: int, content: str, method: str, http_status: Optional[int] = 200):
+        """Record a saved chapter; short content is recorded as suspect"""
+        now = time.time()
+        status = 'done' if len(content) >= SUSPECT_MIN_LENGTH else 'suspect'
+        with self.lock, self.conn:
+            self.conn.execute(
+                """
+                INSERT INTO chapters (chapter_num, status, attempts, http_status, content_length, content_hash,
+                                      method, last_error, first_attempt_at, last_attempt_at, completed_at,
+                                      next_attempt_at)
+                VALUES (?, ?, 0, ?, ?, ?, ?, NULL, ?, ?, ?, NULL)
+                ON CONFLICT (chapter_num) DO UPDATE SET
+                    status = excluded.status,
+                    attempts = 0,
+                    http_status = excluded.http_status,
+                    content_length = excluded.content_length,
+                    content_hash = excluded.content_hash,
+                    method = excluded.method,
+                    last_error = NULL,
+                    last_attempt_at = excluded.last_attempt_at,
+                    completed_at = excluded.completed_at,
+                    next_attempt_at = NULL
+                """,
+                (chapter_num, status, http_status, len(content), content_hash(content), method, now, now, now))
+
+    def record_failure(self, chapter_num: int, error: str, http_status: Optional[int] = None,
+                       method: Optional[str] = None):
+        """Record a failed attempt and schedule the next one with exponential backoff"""
+        now = time.time()
+        with self.lock, self.conn:
+            row = self.conn.execute('SELECT attempts FROM chapters WHERE chapter_num = ?', (chapter_num,)).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+            self.conn.execute(
+                """
+                INSERT INTO chapters (chapter_num, status, attempts, http_status, method, last_error,
+                                      first_attempt_at, last_attempt_at, next_attempt_at)
+                VALUES (?, 'failed', ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (chapter_num) DO UPDATE SET
+                    status = 'failed',
+                    attempts = excluded.attempts,
+                    http_status = excluded.http_status,
+                    method = excluded.method,
+                    last_error = excluded.last_error,
+                    last_attempt_at = excluded.last_attempt_at,
+                    next_attempt_at = excluded.next_attempt_at
+                """,
+                (chapter_num, attempts, http_status, method, error, now, now, now + delay))
+
+    def flag_suspect(self, reasons: Dict[int, str]) -> int:
+        """Mark chapters as suspect (queued for re-extraction) with the reason; failed chapters are left as they are"""
+        now = time.time()
+        with self.lock, self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                """
+                INSERT INTO chapters (chapter_num, status, last_error, last_attempt_at)
+                VALUES (?, 'suspect', ?, ?)
+                ON CONFLICT (chapter_num) DO UPDATE SET
+                    status = 'suspect',
+                    last_error = excluded.last_error
+                WHERE chapters.status != 'failed'
+                """,
+                [(chapter_num, reason, now) for chapter_num, reason in sorted(reasons.items())])
+            return self.conn.total_changes - before
+
+    def completed(self, chapter_nums: Iterable[int]) -> set:
+        """The subset of chapter_nums already recorded as done"""
+        chapter_nums = list(chapter_nums)
+        if not chapter_nums:
+            return set()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT chapter_num FROM chapters WHERE status = 'done' AND chapter_num BETWEEN ? AND ?",
+                (min(chapter_nums), max(chapter_nums))).fetchall()
+        return {row[0] for row in rows} & set(chapter_nums)
+
+    def missing_or_suspect(self, start: int, end: int) -> List[int]:
+        """Chapters in start..end that are not recorded as done"""
+        with self.lock:
+            rows = self.conn.execute(
+                """
+                WITH RECURSIVE wanted (chapter_num) AS (
+                    SELECT ? WHERE ? <= ?
+                    UNION ALL SELECT chapter_num + 1 FROM wanted WHERE chapter_num < ?
+                )
+                SELECT wanted.chapter_num FROM wanted
+                LEFT JOIN chapters ON chapters.chapter_num = wanted.chapter_num
+                WHERE chapters.status IS NULL OR chapters.status != 'done'
+                ORDER BY wanted.chapter_num
+                """,
+                (start, start, end, end)).fetchall()
+        return [row[0] for row in rows]
+
+    def retry_schedule(self, max_attempts: int = 4) -> List[Tuple[int, float]]:
+        """``(chapter_num, next_attempt_at)`` for failed chapters that still have attempts left"""
+        with self.lock:
+            rows = self.conn.execute(
+                """
+                SELECT chapter_num, next_attempt_at FROM chapters
+                WHERE status = 'failed' AND attempts < ?
+                ORDER BY chapter_num
+                """,
+                (max_attempts,)).fetchall()
+        return rows
+
+    def failures(self, chapter_nums: Optional[Iterable[int]] = None) -> dict:
+        """Last error message per failed chapter"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT chapter_num, last_error FROM chapters WHERE status = 'failed' ORDER BY chapter_num"
+            ).fetchall()
+        wanted = set(chapter_nums) if chapter_nums is not None else None
+        return {num: error for num, error in rows if wanted is None or num in wanted}
+
+    def sync_folder(self, output_folder: str) -> int:
+        """Reconcile the manifest with chapter files on disk using one directory listing.
+
+        Chapters in the packed archive next to the folder (``archive=True``
+        runs) count as on disk too. Chapters the manifest has never seen are
+        imported (and flagged suspect when short); chapters recorded as done
+        that are in neither place are marked missing. Returns the number of
+        imported chapters.
+        """
+        # Imported here because chapter_archive imports this module
+        from chapter_archive import ChapterArchive, archive_path_for
+
+        on_disk = {}
+        for name in os.listdir(output_folder):
+            match = CHAPTER_FILE_PATTERN.match(name)
+            if match:
+                on_disk[int(match.group(1))] = os.path.join(output_folder, name)
+
+        archive_path = archive_path_for(output_folder)
+        archive = ChapterArchive(archive_path) if os.path.exists(archive_path) and os.path.getsize(archive_path) else None
+        archived = set(archive.chapter_numbers()) if archive else set()
+
+        with self.lock:
+            known = dict(self.conn.execute('SELECT chapter_num, status FROM chapters').fetchall())
+
+        now = time.time()
+        imported = []
+        try:
+            for chapter_num in sorted(on_disk.keys() | archived):
+                if known.get(chapter_num, 'missing') != 'missing':
+                    continue
+                if chapter_num in on_disk:
+                    with open(on_disk[chapter_num], encoding='utf-8') as f:
+                        text, method = f.read(), 'imported from disk'
+                else:
+                    text, method = archive[chapter_num], 'imported from archive'
+                # Skip the title and its underline, matching what the extractors measure
+                body = text.split('\n', 2)[-1].strip() if text.count('\n') >= 2 else text
+                status = 'done' if len(body) >= SUSPECT_MIN_LENGTH else 'suspect'
+                imported.append((chapter_num, status, len(body), content_hash(body), method, now))
+        finally:
+            if archive:
+                archive.close()
+
+        vanished = [(num,) for num, status in known.items()
+                    if status == 'done' and num not in on_disk and num not in archived]
+
+        with self.lock, self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO chapters (chapter_num, status, content_length, content_hash, method, completed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (chapter_num) DO UPDATE SET
+                    status = excluded.status,
+                    content_length = excluded.content_length,
+                    content_hash = excluded.content_hash,
+                    method = excluded.method,
+                    completed_at = excluded.completed_at
+                """,
+                imported)
+            self.conn.executemany("UPDATE chapters SET status = 'missing' WHERE chapter_num = ?", vanished)
+
+        return len(imported)
@@ -1,17 +1,31 @@
 import requests
 import urllib3
-from bs4 import BeautifulSoup
 import os
 import time
-import re
 from typing import List, Tuple, Optional
 
+from chapter_archive import ArchiveWriter
+from chapter_index import ChapterIndex
+from chapter_sinks import ArchiveSink, Chapter, FolderSink
+from content_cleaner import MISSING_CLEANER
+from extraction_strategies import SENTENCES, TEXT, StrategyRegistry
+from fetch_engine import FetchEngine
+from html_cache import HtmlCache
+from parser_backends import DEFAULT_BACKEND, ParsedContainer, parse_page
+from run_manifest import RunManifest
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 class MissingChapterExtractor:
-    def __init__(self, base_url='https://novelhi.com/s/Dragon-Talisman', output_folder='Extracted_Chapters_Fixed'):
+    def __init__(self, base_url='https://novelhi.com/s/Dragon-Talisman', output_folder='Extracted_Chapters_Fixed',
+                 max_in_flight: int = 4, requests_per_second: float = 2.0,
+                 use_cache: bool = True, offline: bool = False, parser_backend: str = DEFAULT_BACKEND,
+                 archive: bool = False, sinks: Optional[list] = None):
         self.base_url = base_url
         self.output_folder = output_folder
+        self.max_in_flight = max_in_flight
+        self.requests_per_second = requests_per_second
+        self.parser_backend = parser_backend
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -24,10 +38,59 @@ class MissingChapterExtractor:
         
         if not os.path.exists(output_folder):
             os.makedirs(output_folder)
+        
+        # Raw pages are cached beside the output folder so re-runs only revalidate them
+        self.offline = offline
+        self.cache = HtmlCache.beside(output_folder) if use_cache or offline else None
+        self.manifest = RunManifest.beside(output_folder)
+        
+        # Like fixed_extractor.py: chapters go to the packed archive (<output folder>.pack) in archive mode,
+        # otherwise to Chapter_NNN.txt files; pass sinks (chapter_sinks.py) to save them elsewhere
+        self.archive = ArchiveWriter.beside(output_folder) if archive else None
+        if sinks is None:
+            sinks = [ArchiveSink(self.archive) if self.archive else FolderSink(output_folder)]
+        self.sinks = sinks
+        
+        # Chapters listed in the novel's table of contents (empty until discover_chapters runs)
+        self.index = ChapterIndex.beside(output_folder, base_url)
+        
+        # Content containers in the order that has worked for nearby chapters (shared with fixed_extractor.py)
+        self.strategies = StrategyRegistry.beside(output_folder)
+    
+    def chapter_url(self, chapter_num: int) -> str:
+        """Chapter URL from the table of contents, or the base URL pattern for unlisted chapters"""
+        return self.index.url_for(chapter_num)
     
-    def extract_content_from_sent_tags(self, content_div) -> str:
+    def discover_chapters(self) -> List[int]:
+        """Refresh the chapter index from the table of contents and return newly listed chapters"""
+        print(f'📚 Reading table of contents: {self.index.catalogue_url}')
+        try:
+            new_chapters = self.index.discover(self.session, None if self.offline else self.cache)
+        except (requests.RequestException, OSError) as e:
+            print(f'⚠️  Could not read the table of contents: {e}')
+            return []
+        
+        if self.index:
+            print(f'📚 {len(self.index.chapters)} chapters listed '
+                  f'({min(self.index.chapters)}-{max(self.index.chapters)}), {len(new_chapters)} new since the last index')
+        else:
+            print('⚠️  No chapter links found in the table of contents')
+        return new_chapters
+    
+    def fetch_page(self, chapter_num: int) -> Tuple[bytes, Optional[int]]:
+        """Download a chapter page and its HTTP status, revalidating the cached copy when there is one"""
+        url = self.chapter_url(chapter_num)
+        
+        if self.cache:
+            return self.cache.fetch(self.session, url, timeout=20, offline=self.offline)
+        
+        response = self.session.get(url, verify=False, timeout=20)
+        response.raise_for_status()
+        return response.content, response.status_code
+    
+    def extract_content_from_sent_tags(self, content_div: ParsedContainer) -> str:
         """Extract content from <sent> tags and format properly"""
-        sent_elements = content_div.find_all('sent')
+        sent_elements = content_div.sentences
         
         if not sent_elements:
             return ""
@@ -35,8 +98,7 @@ class MissingChapterExtractor:
         content_parts = []
         current_paragraph = []
         
-        for sent in sent_elements:
-            sent_text = sent.get_text().strip()
+        for sent_text in sent_elements:
             if not sent_text:
                 continue
             
@@ -66,157 +128,157 @@ class MissingChapterExtractor:
         return '\n\n'.join(content_parts)
     
     def clean_content(self, content: str) -> str:
-        """Clean up extracted content"""
-        # Remove script tags and ads
-        content = re.sub(r'<script[^>]*>.*?</script>', '', content, flags=re.DOTALL | re.IGNORECASE)
-        content = re.sub(r'<ins[^>]*>.*?</ins>', '', content, flags=re.DOTALL | re.IGNORECASE)
-        
-        # Remove ad-related content
-        unwanted_patterns = [
-            r'adsbygoogle.*?push\(\{\}\);',
-            r'pagead2\.googlesyndication\.com.*',
-            r'data-ad-[^=]*="[^"]*"',
-            r'crossorigin="anonymous"',
-            r'async=""',
-            r'Report.*?bad translation',
-            r'Select text and click.*Report.*',
-            r'Words:\d+.*?Update:\d+/\d+/\d+.*?\d+:\d+:\d+',
-        ]
-        
-        for pattern in unwanted_patterns:
-            content = re.sub(pattern, '', content, flags=re.DOTALL | re.IGNORECASE)
-        
-        # Clean up extra whitespace
-        content = re.sub(r'\n\s*\n\s*\n+', '\n\n', content)
-        content = re.sub(r'[ \t]+', ' ', content)
-        content = content.strip()
-        
-        return content
+        """Clean up extracted content (patterns live in content_cleaner.py)"""
+        return MISSING_CLEANER.clean(content)
     
     def extract_single_chapter(self, chapter_num: int) -> Tuple[bool, str]:
         """Extract a single chapter with enhanced content extraction"""
-        url = f'{self.base_url}/{chapter_num}'
+        url = self.chapter_url(chapter_num)
         print(f'🔍 Extracting Chapter {chapter_num} from: {url}')
+        http_status = None
+        content_source = None
         
         try:
-            response = self.session.get(url, verify=False, timeout=20)
-            response.raise_for_status()
+            html, http_status = self.fetch_page(chapter_num)
             
-            soup = BeautifulSoup(response.content, 'html.parser')
+            page = parse_page(html, self.parser_backend)
             
             # Extract title
-            title = soup.find('h1')
-            title_text = title.get_text().strip() if title else f'Chapter {chapter_num}'
+            title_text = page.title or f'Chapter {chapter_num}'
             print(f'📖 Title: {title_text}')
             
-            # Look for content in order of preference
+            # showReading and readBox count only with <sent> tags, readcontent with <sent> tags or text,
+            # textbox with text; they are tried in the order that has worked for nearby chapters
             content = ""
             content_source = ""
+            strategy, container = self.strategies.select(page, chapter_num)
+            if strategy:
+                if strategy.mode != TEXT:
+                    content = self.extract_content_from_sent_tags(container)
+                if not content and strategy.mode != SENTENCES:
+                    # Fallback to text extraction
+                    content = container.text
+                content_source = f"{strategy.name} div" + (" with <sent> tags" if strategy.mode == SENTENCES else "")
             
-            # Method 1: Look for showReading div with sent tags (most reliable)
-            show_reading_div = soup.find('div', {'id': 'showReading'})
-            if show_reading_div:
-                content = self.extract_content_from_sent_tags(show_reading_div)
-                content_source = "showReading div with <sent> tags"
-            
-            # Method 2: Look for readBox class
-            if not content:
-                read_box_div = soup.find('div', class_='readBox')
-                if read_box_div:
-                    content = self.extract_content_from_sent_tags(read_box_div)
-                    content_source = "readBox div with <sent> tags"
-            
-            # Method 3: Look for readcontent div
             if not content:
-                readcontent_div = soup.find('div', {'id': 'readcontent'})
-                if readcontent_div:
-                    # Try to find sent tags within
-                    content = self.extract_content_from_sent_tags(readcontent_div)
-                    if not content:
-                        # Fallback to text extraction
-                        content = readcontent_div.get_text()
-                    content_source = "readcontent div"
-            
-            # Method 4: Look for textbox class (fallback)
-            if not content:
-                textbox_div = soup.find('div', class_='textbox')
-                if textbox_div:
-                    content = textbox_div.get_text()
-                    content_source = "textbox div"
-            
-            if not content:
-                return False, "No content found in any known container"
+                error_msg = "No content found in any known container"
+                self.manifest.record_failure(chapter_num, error_msg, http_status)
+                return False, error_msg
             
             # Clean the content
             content = self.clean_content(content)
             
             if len(content) < 100:
-                return False, f"Content too short: {len(content)} characters"
+                error_msg = f"Content too short: {len(content)} characters"
+                self.manifest.record_failure(chapter_num, error_msg, http_status, content_source)
+                return False, error_msg
             
             # Save the chapter
-            filename = f'{self.output_folder}/Chapter_{chapter_num:03d}.txt'
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(f'{title_text}\n')
-                f.write('=' * len(title_text) + '\n\n')
-                f.write(content)
+            chapter = Chapter.from_content(chapter_num, title_text, content, content_source)
+            for sink in self.sinks:
+                sink.write(chapter)
+            
+            self.manifest.record_success(chapter_num, content, content_source, http_status)
             
             print(f'✅ Successfully extracted Chapter {chapter_num}')
             print(f'📊 Content length: {len(content)} characters')
             print(f'🔧 Extraction method: {content_source}')
-            print(f'💾 Saved to: {filename}')
+            for sink in self.sinks:
+                print(f'💾 {sink.describe()}')
             
             return True, f"Success: {len(content)} chars from {content_source}"
             
         except Exception as e:
             error_msg = f"Error extracting Chapter {chapter_num}: {str(e)}"
+            http_status = getattr(getattr(e, 'response', None), 'status_code', http_status)
+            self.manifest.record_failure(chapter_num, error_msg, http_status, content_source)
             print(f'❌ {error_msg}')
             return False, error_msg
     
-    def extract_missing_chapters(self, chapter_list: List[int]) -> dict:
-        """Extract multiple missing chapters"""
+    def extract_missing_chapters(self, chapter_list: List[int], max_attempts: int = 4) -> dict:
+        """Extract multiple missing chapters, retrying failures with exponential backoff"""
         print(f'🚀 Missing Chapter Extractor Started!')
         print(f'📋 Chapters to extract: {chapter_list}')
         print(f'📁 Output folder: {os.path.abspath(self.output_folder)}')
+        print(f'⚙️  {self.max_in_flight} in flight, {self.requests_per_second:g} requests/sec per host')
         print('=' * 60)
         
         results = {}
-        successful = 0
-        failed = 0
         
-        for chapter_num in chapter_list:
-            print(f'\n[{chapter_num}/{len(chapter_list)}] Processing Chapter {chapter_num}...')
-            
-            success, message = self.extract_single_chapter(chapter_num)
+        def record(chapter_num, result):
+            success, message = result
             results[chapter_num] = {'success': success, 'message': message}
+            print(f'[{len(results)}/{len(chapter_list)}] Finished Chapter {chapter_num}')
+        
+        self.run_chapters(chapter_list, record)
+        
+        # Failed chapters come back after the manifest's exponential backoff delay
+        wanted = set(chapter_list)
+        while True:
+            schedule = [(chapter_num, due) for chapter_num, due in self.manifest.retry_schedule(max_attempts)
+                        if chapter_num in wanted]
+            if not schedule:
+                break
             
-            if success:
-                successful += 1
-            else:
-                failed += 1
+            wait = min(due for _, due in schedule) - time.time()
+            if wait > 0:
+                print(f'\n⏳ Retrying {len(schedule)} failed chapters in {wait:.0f}s...')
+                time.sleep(wait)
             
-            # Small delay to be respectful to the server
-            time.sleep(1)
+            self.run_chapters([chapter_num for chapter_num, due in schedule if due <= time.time()], record)
+        
+        successful = sum(1 for result in results.values() if result['success'])
+        failed = len(results) - successful
+        self.flush()
         
         print('\n' + '=' * 60)
         print(f'🎉 Extraction Complete!')
         print(f'✅ Successfully extracted: {successful} chapters')
         print(f'❌ Failed extractions: {failed} chapters')
+        print(f'🧭 Containers: {self.strategies.describe()}')
         
         if failed > 0:
             print('\n❌ Failed chapters:')
-            for chapter_num, result in results.items():
+            for chapter_num, result in sorted(results.items()):
                 if not result['success']:
                     print(f'   Chapter {chapter_num}: {result["message"]}')
         
         return results
     
+    def flush(self):
+        """Commit what the sinks hold and save the learned container order"""
+        for sink in self.sinks:
+            sink.flush()
+        self.strategies.save()
+    
+    def run_chapters(self, chapter_list: List[int], on_result) -> None:
+        """Extract chapters concurrently through the rate-limited fetch engine"""
+        # The engine keeps requests within the per-host rate limit instead of sleeping between chapters
+        engine = FetchEngine(max_in_flight=self.max_in_flight, requests_per_second=self.requests_per_second)
+        engine.run(chapter_list, self.extract_single_chapter,
+                   url_for=self.chapter_url,
+                   on_result=on_result)
+    
+    def reparse_cached_chapters(self) -> dict:
+        """Rebuild every cached chapter file from stored HTML with no network traffic"""
+        self.offline = True
+        self.requests_per_second = 0
+        chapter_list = self.cache.cached_chapters(self.base_url) if self.cache else []
+        
+        if not chapter_list:
+            print('📭 No cached chapters to reparse.')
+            return {}
+        
+        return self.extract_missing_chapters(chapter_list)
+    
     def find_missing_chapters(self, start: int = 1, end: int = 100) -> List[int]:
-        """Find missing chapters in the specified range"""
-        missing = []
-        for i in range(start, end + 1):
-            filename = f'{self.output_folder}/Chapter_{i:03d}.txt'
-            if not os.path.exists(filename):
-                missing.append(i)
+        """Find missing, failed or suspect chapters in the specified range"""
+        # One directory listing brings the manifest up to date, then a single query answers
+        self.manifest.sync_folder(self.output_folder)
+        missing = self.manifest.missing_or_suspect(start, end)
+        # With a table of contents, numbers it does not list do not exist rather than being missing
+        if self.index:
+            missing = [chapter_num for chapter_num in missing if chapter_num in self.index]
         return missing
 
 def main():
@@ -233,6 +295,7 @@ def main():
             chapter_num = int(chapter_input)
             print(f'\n🚀 Extracting Chapter {chapter_num}...')
             success, message = extractor.extract_single_chapter(chapter_num)
+            extractor.flush()
             
             if success:
                 print(f'\n✅ Success! {message}')
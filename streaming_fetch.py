@@ -0,0 +1,97 @@
+from typing import Iterable, Tuple
+
+import lxml.etree
+
+from parser_backends import CONTAINERS, has_class
+
+# Container names in the order the extractors prefer them
+CONTAINER_ORDER = ('showReading', 'readBox', 'readcontent', 'textbox')
+
+
+class ContainerWatcher:
+    """Incrementally parses a page and reports when its content has fully arrived.
+
+    Chunks are fed to lxml's push parser, which emits start/end events as soon
+    as the markup is available. The page is complete once the preferred
+    container (the first name in ``containers``) has closed and the title
+    ``<h1>`` has been seen. A fallback container only ends the page when
+    ``stop_on_fallback`` is set: otherwise a preferred container further down
+    the page could be missed, and the extracted text would differ from a full
+    download.
+    """
+
+    def __init__(self, containers: Iterable[str] = CONTAINER_ORDER, stop_on_fallback: bool = False):
+        self.containers = list(containers)
+        self.stop_on_fallback = stop_on_fallback
+        self.parser = lxml.etree.HTMLPullParser(events=('start', 'end'))
+        self.watched = {}
+        self.title_seen = False
+        self.closed = []
+        self.done = False
+
+    def _container_name(self, element):
+        if element.tag != 'div':
+            return None
+        for name in self.containers:
+            attribute, value = CONTAINERS[name]
+            if attribute == 'id' and element.get('id') == value:
+                return name
+            if attribute == 'class' and has_class(element.get('class'), value):
+                return name
+        return None
+
+    def feed(self, chunk: bytes) -> bool:
+        """Feed the next chunk; True once the page content is complete"""
+        if self.done:
+            return True
+        self.parser.feed(chunk)
+        for event, element in self.parser.read_events():
+            if event == 'start':
+                name = self._container_name(element)
+                if name:
+                    self.watched[element] = name
+            elif element.tag == 'h1':
+                self.title_seen = True
+            elif element in self.watched:
+                self.closed.append(self.watched.pop(element))
+
+        if self.title_seen and self.closed:
+            if self.containers[0] in self.closed or self.stop_on_fallback:
+                self.done = True
+        return self.done
+
+
+def read_until_content(response, containers: Iterable[str] = CONTAINER_ORDER, chunk_size: int = 16384,
+                       drain_limit: int = 16384, stop_on_fallback: bool = False) -> Tuple[bytes, bool]:
+    """Body of a ``stream=True`` response, read only until its content container has closed.
+
+    Returns ``(content, partial)``. When the rest of the body is known to be at
+    most ``drain_limit`` bytes it is read too, so the connection can go back to
+    the pool instead of being dropped; otherwise the response is closed early.
+    """
+    watcher = ContainerWatcher(containers, stop_on_fallback)
+    chunks = []
+    received = 0
+    partial = False
+
+    try:
+        body = response.iter_content(chunk_size)
+        for chunk in body:
+            chunks.append(chunk)
+            received += len(chunk)
+            if watcher.feed(chunk):
+                # Content-Length counts wire bytes, which differ from decoded ones when compressed
+                length = response.headers.get('Content-Length')
+                wire_received = response.raw.tell() if hasattr(response.raw, 'tell') else received
+                remaining = int(length) - wire_received if length and length.isdigit() else None
+                if remaining is not None and remaining <= drain_limit:
+                    # Cheaper to finish than to reconnect
+                    for rest in body:
+                        chunks.append(rest)
+                else:
+                    partial = True
+                break
+    finally:
+        response.close()
+
+    return b''.join(chunks), partial
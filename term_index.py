@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Positional inverted index over the raw and refined chapters, for term searches.
+
+Checking that cultivation terms ("Dao Realm", "Accept Fasting", ...) and
+characters stay consistent used to mean grepping every chapter file. The
+index keeps, for every word, the chapters it occurs in and its word positions
+there, in term_index.sqlite3. Updates are incremental: only files whose size
+or mtime changed are re-read, and only those whose content hash changed are
+re-indexed.
+
+Usage:
+    python term_index.py "Dao Realm"                      # chapters containing the phrase
+    python term_index.py "Dao Realm" --first              # first chapter it appears in
+    python term_index.py "Gu Chensha" "Dao Realm"         # chapters where both occur
+    python term_index.py "Gu Chensha" "Dao Realm" --within 30 --corpus raw
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from run_manifest import CHAPTER_FILE_PATTERN
+
+# Corpus name -> chapter folder
+CORPORA = {
+    'raw': 'Extracted_Chapters_Fixed',
+    'refined': 'True_Refining',
+}
+
+WORD = re.compile(r'\w+')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id INTEGER PRIMARY KEY,
+    corpus TEXT NOT NULL,
+    chapter_num INTEGER NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    tokens INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_documents_chapter ON documents (corpus, chapter_num);
+CREATE TABLE IF NOT EXISTS terms (
+    term_id INTEGER PRIMARY KEY,
+    term TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term_id INTEGER NOT NULL,
+    doc_id INTEGER NOT NULL,
+    positions BLOB NOT NULL,
+    PRIMARY KEY (term_id, doc_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings (doc_id);
+"""
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased words; queries and chapters go through the same tokenizer"""
+    return WORD.findall(text.lower())
+
+
+def _pack_positions(positions: List[int]) -> bytes:
+    packed = array('I', positions)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack_positions(blob: bytes) -> array:
+    positions = array('I')
+    positions.frombytes(blob)
+    if sys.byteorder == 'big':
+        positions.byteswap()
+    return positions
+
+
+def _covering_span(occurrences: List[List[int]]) -> int:
+    """Smallest word span containing one occurrence of every phrase (sliding window over merged positions)"""
+    merged = sorted((position, phrase) for phrase, positions in enumerate(occurrences) for position in positions)
+    needed = len(occurrences)
+    counts = [0] * needed
+    covered = 0
+    best = merged[-1][0] - merged[0][0]
+    left = 0
+    for position, phrase in merged:
+        if counts[phrase] == 0:
+            covered += 1
+        counts[phrase] += 1
+        while covered == needed:
+            left_position, left_phrase = merged[left]
+            span = position - left_position
+            best = min(best, span)
+            counts[left_phrase] -= 1
+            if counts[left_phrase] == 0:
+                covered -= 1
+            left += 1
+    return best
+
+
+class Match:
+    """One chapter matching a query"""
+
+    __slots__ = ('corpus', 'chapter_num', 'path', 'positions')
+
+    def __init__(self, corpus: str, chapter_num: int, path: str, positions: List[int]):
+        self.corpus = corpus
+        self.chapter_num = chapter_num
+        self.path = path
+        # Word positions where the first phrase of the query starts
+        self.positions = positions
+
+    def snippet(self, width: int = 8) -> str:
+        """Words around the first occurrence, read back from the chapter file"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                text = f.read()
+        except OSError:
+            return ''
+        spans = [m.span() for m in WORD.finditer(text.lower())]
+        first = self.positions[0]
+        if first >= len(spans):
+            return ''
+        start = spans[max(0, first - width)][0]
+        end = spans[min(len(spans) - 1, first + width)][1]
+        return ' '.join(text[start:end].split())
+
+
+class TermIndex:
+    """Incrementally updated positional inverted index backed by SQLite"""
+
+    def __init__(self, db_path: str = 'term_index.sqlite3', corpora: Optional[Dict[str, str]] = None):
+        self.db_path = db_path
+        root = os.path.dirname(os.path.abspath(db_path))
+        self.corpora = {name: folder if os.path.isabs(folder) else os.path.join(root, folder)
+                        for name, folder in (corpora or CORPORA).items()}
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+        self.term_ids: Optional[Dict[str, int]] = None
+
+    def close(self):
+        self.conn.close()
+
+    def _chapter_files(self) -> Dict[str, Tuple[str, int, os.stat_result]]:
+        files = {}
+        for corpus, folder in self.corpora.items():
+            if not os.path.isdir(folder):
+                continue
+            for entry in os.scandir(folder):
+                match = CHAPTER_FILE_PATTERN.match(entry.name)
+                if match:
+                    files[os.path.abspath(entry.path)] = (corpus, int(match.group(1)), entry.stat())
+        return files
+
+    def _term_id(self, term: str) -> int:
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            term_id = self.conn.execute('INSERT INTO terms (term) VALUES (?)', (term,)).lastrowid
+            self.term_ids[term] = term_id
+        return term_id
+
+    def _index_document(self, doc_id: Optional[int], corpus: str, chapter_num: int, path: str,
+                        stat: os.stat_result, digest: str, text: str) -> int:
+        words = tokenize(text)
+        positions: Dict[str, List[int]] = {}
+        for position, word in enumerate(words):
+            positions.setdefault(word, []).append(position)
+
+        if doc_id is None:
+            doc_id = self.conn.execute(
+                'INSERT INTO documents (corpus, chapter_num, path, mtime, size, sha256, tokens) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (corpus, chapter_num, path, stat.st_mtime, stat.st_size, digest, len(words))).lastrowid
+        else:
+            self.conn.execute('DELETE FROM postings WHERE doc_id = ?', (doc_id,))
+            self.conn.execute('UPDATE documents SET mtime = ?, size = ?, sha256 = ?, tokens = ? WHERE doc_id = ?',
+                              (stat.st_mtime, stat.st_size, digest, len(words), doc_id))
+        self.conn.executemany('INSERT INTO postings (term_id, doc_id, positions) VALUES (?, ?, ?)',
+                              [(self._term_id(word), doc_id, _pack_positions(word_positions))
+                               for word, word_positions in positions.items()])
+        return doc_id
+
+    def update(self) -> Dict[str, int]:
+        """Bring the index up to date with the chapter folders; returns counts per outcome"""
+        if self.term_ids is None:
+            self.term_ids = dict(self.conn.execute('SELECT term, term_id FROM terms'))
+        known = {path: (doc_id, mtime, size, sha256) for doc_id, path, mtime, size, sha256
+                 in self.conn.execute('SELECT doc_id, path, mtime, size, sha256 FROM documents')}
+        counts = {'indexed': 0, 'unchanged': 0, 'touched': 0, 'removed': 0}
+
+        with self.conn:
+            for path, (corpus, chapter_num, stat) in sorted(self._chapter_files().items()):
+                doc_id, mtime, size, sha256 = known.pop(path, (None, None, None, None))
+                if mtime == stat.st_mtime and size == stat.st_size:
+                    counts['unchanged'] += 1
+                    continue
+
+                with open(path, 'rb') as f:
+                    data = f.read()
+                digest = hashlib.sha256(data).hexdigest()
+                if digest == sha256:
+                    # Rewritten with the same content: only the stat changed
+                    self.conn.execute('UPDATE documents SET mtime = ?, size = ? WHERE doc_id = ?',
+                                      (stat.st_mtime, stat.st_size, doc_id))
+                    counts['touched'] += 1
+                    continue
+
+                self._index_document(doc_id, corpus, chapter_num, path, stat, digest,
+                                     data.decode('utf-8', errors='replace'))
+                counts['indexed'] += 1
+
+            for doc_id, *_ in known.values():
+                self.conn.execute('DELETE FROM postings WHERE doc_id = ?', (doc_id,))
+                self.conn.execute('DELETE FROM documents WHERE doc_id = ?', (doc_id,))
+                counts['removed'] += 1
+        return counts
+
+    def _postings(self, term: str, corpus: Optional[str]) -> Dict[int, array]:
+        query = """
+            SELECT postings.doc_id, postings.positions FROM postings
+            JOIN terms ON terms.term_id = postings.term_id
+            JOIN documents ON documents.doc_id = postings.doc_id
+            WHERE terms.term = ?
+        """
+        params: Tuple = (term,)
+        if corpus:
+            query += ' AND documents.corpus = ?'
+            params += (corpus,)
+        return {doc_id: _unpack_positions(blob) for doc_id, blob in self.conn.execute(query, params)}
+
+    def phrase_positions(self, phrase: str, corpus: Optional[str] = None) -> Dict[int, List[int]]:
+        """doc_id -> word positions where the whole phrase starts"""
+        words = tokenize(phrase)
+        if not words:
+            return {}
+        postings = {}
+        for word in set(words):
+            postings[word] = self._postings(word, corpus)
+            if not postings[word]:
+                return {}
+
+        docs = set.intersection(*(set(p) for p in postings.values()))
+        found = {}
+        for doc_id in docs:
+            starts = postings[words[0]][doc_id]
+            if len(words) > 1:
+                following = [(offset, set(postings[word][doc_id])) for offset, word in enumerate(words) if offset]
+                starts = [start for start in starts
+                          if all(start + offset in positions for offset, positions in following)]
+            if starts:
+                found[doc_id] = list(starts)
+        return found
+
+    def search(self, *phrases: str, within: Optional[int] = None, corpus: Optional[str] = None) -> List[Match]:
+        """Chapters containing every phrase, optionally all within ``within`` words of each other"""
+        found = [self.phrase_positions(phrase, corpus) for phrase in phrases]
+        if not found:
+            return []
+        docs = set.intersection(*(set(f) for f in found))
+        if within is not None and len(found) > 1:
+            docs = {doc_id for doc_id in docs
+                    if _covering_span([f[doc_id] for f in found]) <= within}
+        if not docs:
+            return []
+
+        placeholders = ','.join('?' * len(docs))
+        rows = self.conn.execute(
+            f'SELECT doc_id, corpus, chapter_num, path FROM documents WHERE doc_id IN ({placeholders})',
+            list(docs)).fetchall()
+        matches = [Match(corpus_name, chapter_num, path, found[0][doc_id])
+                   for doc_id, corpus_name, chapter_num, path in rows]
+        return sorted(matches, key=lambda match: (match.corpus, match.chapter_num))
+
+    def first_appearance(self, *phrases: str, corpus: str = 'raw', within: Optional[int] = None) -> Optional[Match]:
+        """Earliest chapter of a corpus in which every phrase appears"""
+        matches = self.search(*phrases, within=within, corpus=corpus)
+        return matches[0] if matches else None
+
+    def stats(self) -> Dict[str, int]:
+        documents = self.conn.execute('SELECT COUNT(*), COALESCE(SUM(tokens), 0) FROM documents').fetchone()
+        terms = self.conn.execute('SELECT COUNT(*) FROM terms').fetchone()[0]
+        return {'documents': documents[0], 'words': documents[1], 'terms': terms}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search the raw and refined chapters through a term index')
+    parser.add_argument('phrases', nargs='+', help='phrases that must all appear in a chapter')
+    parser.add_argument('--within', type=int, help='phrases must occur within this many words of each other')
+    parser.add_argument('--corpus', choices=sorted(CORPORA), help='only search one corpus')
+    parser.add_argument('--first', action='store_true', help='only show the first matching chapter')
+    parser.add_argument('--index', default='term_index.sqlite3', help='index database path')
+    args = parser.parse_args()
+
+    index = TermIndex(args.index)
+    start = time.perf_counter()
+    counts = index.update()
+    if counts['indexed'] or counts['removed']:
+        stats = index.stats()
+        print(f"🗂️ Indexed {counts['indexed']} changed chapters, removed {counts['removed']} "
+              f"({stats['documents']} chapters, {stats['words']:,} words, {stats['terms']:,} distinct) "
+              f"in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    if args.first:
+        corpora = [args.corpus] if args.corpus else sorted(CORPORA)
+        matches = [match for match in (index.first_appearance(*args.phrases, corpus=corpus, within=args.within)
+                                       for corpus in corpora) if match]
+    else:
+        matches = index.search(*args.phrases, within=args.within, corpus=args.corpus)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    query = ' + '.join(f'"{phrase}"' for phrase in args.phrases)
+    if args.within is not None:
+        query += f' within {args.within} words'
+    print(f"🔍 {query}: {len(matches)} chapters ({elapsed:.1f}ms)")
+    for match in matches:
+        print(f"   {match.corpus:<8} Chapter {match.chapter_num:>4}  x{len(match.positions):<3} {match.snippet()}")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
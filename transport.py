@@ -0,0 +1,260 @@
+"""
+Shared HTTP transport for the extractors: a keep-alive pool sized to the
+worker count, optional HTTP/2, and connection statistics.
+
+``requests`` mounts an adapter with 10 pooled connections per host by default.
+With more fetch threads than that, every request beyond the tenth opens a new
+connection and closes it again afterwards, paying TCP and TLS setup each
+time. ``build_session`` sizes the pool to the number of requests that can be
+in flight and counts new connections, reused ones, connections discarded
+because the pool was full, and the time spent opening connections.
+
+With ``http2=True`` and httpx installed with HTTP/2 support
+(``pip install httpx[http2]``), requests are sent through httpx instead and
+multiplexed over one connection per host. Everything above the adapter (hooks,
+``raise_for_status``, streaming, timeouts) keeps working unchanged.
+"""
+
+import threading
+import time
+from typing import Optional, Tuple
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers, select_proxy
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+try:
+    import httpx
+except ImportError:  # httpx is optional
+    httpx = None
+
+try:
+    import h2
+except ImportError:  # httpx needs h2 for HTTP/2
+    h2 = None
+
+HTTP2_AVAILABLE = httpx is not None and h2 is not None
+
+# Connection-specific headers, which HTTP/2 forbids
+HOP_BY_HOP = {'connection', 'keep-alive', 'proxy-connection', 'transfer-encoding', 'upgrade'}
+
+
+class TransportStats:
+    """Requests, connections and connection setup time of one session"""
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.discarded = 0
+        self.connect_seconds = 0.0
+        self.http2_requests = 0
+        self.lock = threading.Lock()
+
+    def request(self, http2: bool = False):
+        with self.lock:
+            self.requests += 1
+            self.http2_requests += http2
+
+    def connected(self, seconds: float):
+        with self.lock:
+            self.new_connections += 1
+            self.connect_seconds += seconds
+
+    def discard(self):
+        with self.lock:
+            self.discarded += 1
+
+    @property
+    def reused(self) -> int:
+        return max(0, self.requests - self.new_connections)
+
+    def describe(self) -> str:
+        with self.lock:
+            if not self.requests:
+                return 'no requests sent'
+            line = (f'{self.requests} requests over {self.new_connections} new connections '
+                    f'({self.reused / self.requests:.0%} reused)')
+            if self.new_connections:
+                line += (f', {self.connect_seconds:.1f}s connecting '
+                         f'({self.connect_seconds / self.new_connections * 1000:.0f}ms each incl. TLS)')
+            if self.discarded:
+                line += f', {self.discarded} closed because the pool was full'
+            if self.http2_requests:
+                line += f', {self.http2_requests} over HTTP/2'
+            return line
+
+
+def _counting_pools(stats: TransportStats):
+    """urllib3 pool classes that report new and discarded connections to ``stats``"""
+
+    class CountingHTTPConnection(HTTPConnection):
+        def connect(self):
+            start = time.perf_counter()
+            super().connect()
+            stats.connected(time.perf_counter() - start)
+
+    class CountingHTTPSConnection(HTTPSConnection):
+        def connect(self):
+            start = time.perf_counter()
+            super().connect()
+            stats.connected(time.perf_counter() - start)
+
+    def put_conn(pool_class):
+        def _put_conn(self, conn):
+            if conn is not None and self.pool is not None and self.pool.full():
+                stats.discard()
+            pool_class._put_conn(self, conn)
+        return _put_conn
+
+    http_pool = type('CountingHTTPConnectionPool', (HTTPConnectionPool,),
+                     {'ConnectionCls': CountingHTTPConnection, '_put_conn': put_conn(HTTPConnectionPool)})
+    https_pool = type('CountingHTTPSConnectionPool', (HTTPSConnectionPool,),
+                      {'ConnectionCls': CountingHTTPSConnection, '_put_conn': put_conn(HTTPSConnectionPool)})
+    return {'http': http_pool, 'https': https_pool}
+
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter whose keep-alive pool holds ``pool_size`` connections per host, with statistics"""
+
+    def __init__(self, stats: TransportStats, pool_size: int):
+        # Set before HTTPAdapter.__init__, which builds the pool manager
+        self.stats = stats
+        super().__init__(pool_connections=4, pool_maxsize=pool_size)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        super().init_poolmanager(connections, maxsize, block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = _counting_pools(self.stats)
+
+    def send(self, request, **kwargs):
+        self.stats.request()
+        return super().send(request, **kwargs)
+
+
+def _requests_error(error: Exception, request) -> requests.RequestException:
+    """The requests exception callers expect for an httpx error"""
+    if isinstance(error, httpx.TimeoutException):
+        return requests.Timeout(error, request=request)
+    if isinstance(error, httpx.DecodingError):
+        return requests.exceptions.ContentDecodingError(error, request=request)
+    return requests.ConnectionError(error, request=request)
+
+
+class _StreamedBody:
+    """The ``raw`` of a requests.Response backed by an httpx response"""
+
+    def __init__(self, response, request):
+        self.response = response
+        self.request = request
+        self.chunks = response.iter_bytes()
+        self.buffer = b''
+
+    def _next_chunk(self) -> Optional[bytes]:
+        # The body arrives (and can time out or break off) only while it is read
+        try:
+            return next(self.chunks, None)
+        except (httpx.TransportError, httpx.DecodingError) as e:
+            raise _requests_error(e, self.request)
+
+    def read(self, amt: Optional[int] = None, decode_content: bool = True) -> bytes:
+        while amt is None or len(self.buffer) < amt:
+            chunk = self._next_chunk()
+            if chunk is None:
+                break
+            self.buffer += chunk
+        if amt is None:
+            data, self.buffer = self.buffer, b''
+        else:
+            data, self.buffer = self.buffer[:amt], self.buffer[amt:]
+        return data
+
+    def stream(self, chunk_size: int = 8192, decode_content: bool = True):
+        while True:
+            data = self.read(chunk_size)
+            if not data:
+                return
+            yield data
+
+    def close(self):
+        self.response.close()
+
+
+class Http2Adapter(BaseAdapter):
+    """Sends requests through an httpx client with HTTP/2 enabled"""
+
+    def __init__(self, stats: TransportStats, pool_size: int):
+        super().__init__()
+        self.stats = stats
+        self.limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self.clients = {}
+        self.lock = threading.Lock()
+        self.connect_started = threading.local()
+
+    def client(self, verify, cert, proxy) -> 'httpx.Client':
+        # httpx fixes certificate checking, client certificates and the proxy per client, requests per request.
+        # requests has already applied the environment's proxy settings, so httpx does not read them again.
+        key = (verify, cert, proxy)
+        with self.lock:
+            if key not in self.clients:
+                self.clients[key] = httpx.Client(http2=True, verify=verify, cert=cert, proxy=proxy,
+                                                 trust_env=False, limits=self.limits)
+            return self.clients[key]
+
+    def _trace(self, event: str, info: dict):
+        # httpcore events: a new connection runs connect_tcp (and start_tls) before its first request goes out
+        if event == 'connection.connect_tcp.started':
+            self.connect_started.value = time.perf_counter()
+        elif event.endswith(('send_connection_init.started', 'send_request_headers.started')):
+            started = getattr(self.connect_started, 'value', None)
+            if started is not None:
+                self.stats.connected(time.perf_counter() - started)
+                self.connect_started.value = None
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if isinstance(timeout, tuple):
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        try:
+            client = self.client(verify if isinstance(verify, (bool, str)) else True,
+                                 tuple(cert) if isinstance(cert, list) else cert,
+                                 select_proxy(request.url, proxies) if proxies else None)
+            headers = {name: value for name, value in request.headers.items() if name.lower() not in HOP_BY_HOP}
+            outgoing = client.build_request(request.method, request.url, headers=headers,
+                                            content=request.body, timeout=timeout,
+                                            extensions={'trace': self._trace})
+            incoming = client.send(outgoing, stream=True)
+        except (httpx.TransportError, httpx.DecodingError) as e:
+            raise _requests_error(e, request)
+
+        self.stats.request(http2=incoming.http_version == 'HTTP/2')
+        response = requests.Response()
+        response.status_code = incoming.status_code
+        response.headers = CaseInsensitiveDict(incoming.headers.items())
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.reason = incoming.reason_phrase
+        response.url = str(incoming.url)
+        response.request = request
+        response.connection = self
+        response.raw = _StreamedBody(incoming, request)
+        return response
+
+    def close(self):
+        with self.lock:
+            for client in self.clients.values():
+                client.close()
+            self.clients.clear()
+
+
+def build_session(pool_size: int, http2: bool = False) -> Tuple[requests.Session, TransportStats]:
+    """Session whose connection pool fits ``pool_size`` requests in flight, and its statistics.
+
+    ``http2`` is ignored (with HTTP/1.1 keep-alive used instead) when httpx or
+    h2 is not installed.
+    """
+    stats = TransportStats()
+    session = requests.Session()
+    adapter = Http2Adapter(stats, pool_size) if http2 and HTTP2_AVAILABLE else PooledAdapter(stats, pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session, stats